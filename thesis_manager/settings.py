@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
+import datetime
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -47,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'web.middleware.SQLInstrumentationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,8 +78,36 @@ WSGI_APPLICATION = 'thesis_manager.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend plus the pragmas and transaction options below, see web/backends/sqlite3
+        'ENGINE': 'web.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Seconds a connection is reused by the requests of a worker
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'pragmas': {
+                # Readers don't block the writer nor the other way around
+                'journal_mode': 'WAL',
+                # Safe with WAL, only the last commits can be lost on a power failure (not on a crash)
+                'synchronous': 'NORMAL',
+                # Milliseconds a statement waits for a lock before failing with "database is locked"
+                'busy_timeout': 5_000,
+                # Page cache per connection, in KiB when negative
+                'cache_size': -20_000,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+            'transaction_mode': 'IMMEDIATE',
+            'begin_retries': 3,
+        },
+    }
+}
+
+# The rows of the list views are cached ({% cache %} blocks of the templates), one entry per row
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10_000,
+        },
     }
 }
 
@@ -126,3 +156,35 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+
+# Folder where the export worker (manage.py run_export_worker) stores the rendered PDF reports
+EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
+
+# SQL query count, time and N+1 suspects of each request, in the X-SQL-* response headers and the web.sql logger.
+# True instruments every request, 'managers' only the ones of managers and administrators, False none. It costs
+# a stack walk per query, so it is off unless DEBUG is on ('managers') or the SQL_INSTRUMENTATION environment
+# variable says otherwise (true, managers or false)
+SQL_INSTRUMENTATION = {'true': True, 'managers': 'managers', 'false': False}.get(
+    os.environ.get('SQL_INSTRUMENTATION', '').lower(), 'managers' if DEBUG else False)
+
+# Time a defence takes from its date_time, a person can't be in two defences closer than this (web.conflicts)
+DEFENCE_DURATION = datetime.timedelta(hours=2)
+
+# Threads of the ASGI application that run the autocompletes and other lightweight JSON endpoints (web.handlers)
+ASYNC_LOOKUP_WORKERS = 4
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'web.sql': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
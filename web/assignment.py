@@ -0,0 +1,187 @@
+"""
+Automatic jury assignment for the pending defences of a term.
+
+Every pending defence (not graded yet and still to come) of the term gets principal judges until its jury reaches
+Defence.MAX_JUDGES, counting the academic tutor, and one backup judge if it has none. The candidates are the
+persons of the "Profesor" type other than the thesis' academic and industry tutors, the judges already in the
+defence and the ones busy in an overlapping defence (see web.conflicts). Defences are filled in date order and
+each slot goes to the candidate with the fewest juries in the term so far, kept in a heap, so the load ends up
+balanced without trying combinations: thousands of defences take well under a second.
+
+plan_jury() only computes the assignment, which is shown as a preview; commit_plan() writes it with one
+bulk_create after checking that the data is still the one the preview was computed from.
+"""
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, namedtuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import conflicts, versions
+from .models import Defence, Jury, PersonData, PersonType, Proposal, Thesis
+
+PROFESSOR_TYPE = 'Profesor'
+
+# Models whose changes can change the plan of a term
+PLAN_MODELS = (Defence, Jury, Thesis, Proposal, PersonData, PersonType)
+
+Assignment = namedtuple('Assignment', ('defence', 'person', 'is_backup'))
+
+# Proposed jury of a defence for the preview: names of the new judges and backup, and the slots left empty
+DefencePlan = namedtuple('DefencePlan', ('defence', 'judges', 'backup', 'missing'))
+
+
+class StalePlan(Exception):
+    """
+    The data changed since the plan was computed.
+    """
+
+
+class JuryPlan:
+
+    def __init__(self, term, data_versions):
+        self.term = term
+        self.versions = data_versions
+        self.assignments = []
+        self.defences = []
+        # Juries of each professor in the term, before and after the plan
+        self.loads_before = Counter()
+        self.loads_after = Counter()
+        self.names = {}
+
+    def get_loads(self):
+        """
+        (name, juries before, juries after) of every professor, the busiest first.
+        """
+        return sorted(((self.names[person], self.loads_before[person], self.loads_after[person])
+                       for person in self.names), key=lambda row: (-row[2], row[0]))
+
+    def get_changed_loads(self):
+        """
+        Like get_loads, only for the professors the plan gives a jury.
+        """
+        return [row for row in self.get_loads() if row[1] != row[2]]
+
+    def get_missing(self):
+        return sum(defence_plan.missing for defence_plan in self.defences)
+
+
+class _Calendar:
+    """
+    Start times of the defences of each person, to tell whether they can take one more.
+    """
+
+    def __init__(self, intervals):
+        self.starts = defaultdict(list)
+        for person, code, start in intervals:
+            self.starts[person].append((start, code))
+        for starts in self.starts.values():
+            starts.sort()
+        self.duration = settings.DEFENCE_DURATION
+
+    def is_free(self, person, defence):
+        starts = self.starts.get(person, ())
+        index = bisect_left(starts, (defence.date_time - self.duration, ''))
+        for start, code in starts[index:]:
+            if start >= defence.date_time + self.duration:
+                break
+            if code != defence.code and start > defence.date_time - self.duration:
+                return False
+        return True
+
+    def add(self, person, defence):
+        insort(self.starts[person], (defence.date_time, defence.code))
+
+
+def _pick(heap, count, is_eligible):
+    """
+    Pop the ``count`` least loaded eligible candidates of the heap of (load, person) and push them back with one
+    more jury. Returns their ids, fewer than ``count`` when there aren't enough candidates.
+    """
+    chosen = []
+    skipped = []
+    while heap and len(chosen) < count:
+        load, person = heapq.heappop(heap)
+        if is_eligible(person):
+            chosen.append((load, person))
+        else:
+            skipped.append((load, person))
+    for load, person in skipped:
+        heapq.heappush(heap, (load, person))
+    for load, person in chosen:
+        heapq.heappush(heap, (load + 1, person))
+    return [person for _, person in chosen]
+
+
+def plan_jury(term):
+    """
+    JuryPlan with the judges and backups for the pending defences of ``term``.
+    """
+    plan = JuryPlan(term, versions.get_versions(*PLAN_MODELS))
+    # Defences that already took place keep the jury they had
+    defences = list(Defence.objects.filter(thesis__delivery_term=term, grade__isnull=True,
+                                           date_time__gte=timezone.now()).select_related(
+        'thesis__proposal').order_by('date_time', 'code'))
+    plan.names = {pk: '%s %s' % (last_name, name) for pk, last_name, name in PersonData.objects.filter(
+        type__name=PROFESSOR_TYPE).values_list('pk', 'last_name', 'name')}
+    juries = Jury.objects.filter(defence__thesis__delivery_term=term).values_list('person').annotate(
+        juries=Count('pk')).order_by()
+    plan.loads_before.update({person: count for person, count in juries if person in plan.names})
+    plan.loads_after.update(plan.loads_before)
+    if not defences:
+        return plan
+
+    jury = defaultdict(list)
+    for defence, person, is_backup in Jury.objects.filter(defence__in=defences).values_list(
+            'defence', 'person', 'is_backup_jury'):
+        jury[defence].append((person, is_backup))
+    intervals, _ = conflicts.load_intervals_between(defences[0].date_time, defences[-1].date_time)
+    calendar = _Calendar(intervals)
+    heap = [(plan.loads_before[person], person) for person in plan.names]
+    heapq.heapify(heap)
+
+    for defence in defences:
+        proposal = defence.thesis.proposal
+        members = {person for person, _ in jury[defence.code]}
+        principal = [person for person, is_backup in jury[defence.code] if not is_backup]
+        excluded = members | {proposal.academic_tutor_id, proposal.industry_tutor_id}
+
+        def is_eligible(person):
+            return person not in excluded and calendar.is_free(person, defence)
+
+        wanted = max(0, Defence.free_judge_slots(proposal.academic_tutor_id, principal))
+        judges = _pick(heap, wanted, is_eligible)
+        excluded.update(judges)
+        has_backup = any(is_backup for _, is_backup in jury[defence.code])
+        backup = [] if has_backup else _pick(heap, 1, is_eligible)
+
+        for person in judges + backup:
+            calendar.add(person, defence)
+            plan.loads_after[person] += 1
+        plan.assignments.extend(Assignment(defence.code, person, False) for person in judges)
+        plan.assignments.extend(Assignment(defence.code, person, True) for person in backup)
+        missing = wanted - len(judges) + (0 if has_backup else 1 - len(backup))
+        if judges or backup or missing:
+            plan.defences.append(DefencePlan(defence, [plan.names[person] for person in judges],
+                                             plan.names[backup[0]] if backup else None, missing))
+    return plan
+
+
+def commit_plan(term, data_versions):
+    """
+    Compute the plan of ``term`` again and write it, if the data still has the versions the preview was
+    computed with (the plan is deterministic, so it is the same one). Raises StalePlan otherwise.
+    """
+    with transaction.atomic():
+        plan = plan_jury(term)
+        if list(plan.versions) != list(data_versions):
+            raise StalePlan()
+        Jury.objects.bulk_create([Jury(defence_id=assignment.defence, person_id=assignment.person,
+                                       is_backup_jury=assignment.is_backup) for assignment in plan.assignments])
+        if plan.assignments:
+            Defence.objects.filter(pk__in={assignment.defence for assignment in plan.assignments}).update(
+                modified=timezone.now())
+            versions.bump_version(Jury)
+    return plan
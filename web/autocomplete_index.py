@@ -0,0 +1,234 @@
+"""
+In-memory prefix index of persons for the Select2 autocomplete endpoints.
+
+Each process keeps, for every PersonType, a sorted list of (word, person pk) pairs built from the accent-folded
+names, last names and cédulas, so a keystroke is answered with a couple of binary searches instead of a
+table scan. It is kept up to date incrementally by the PersonData signals of this process, and rebuilt in the
+background when another process changes the table (detected through the web.persondata data version).
+"""
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import time
+import unicodedata
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import CharField, Func, Q, Value
+from django.db.models.functions import Concat
+from django.dispatch import receiver
+
+from . import versions
+from .models import PersonData, PersonType
+
+# How often (seconds) the index checks whether another process has written to PersonData
+VERSION_CHECK_INTERVAL = 5
+
+
+def fold(text):
+    """
+    Lowercase and strip accents, so 'Peña' and 'pena' index and search alike.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def _words(person):
+    words = set(re.findall(r'\w+', fold('%s %s' % (person.name, person.last_name))))
+    card = fold(person.id_card_number)
+    # The cédula is indexed with and without its V/E prefix
+    words.update((card, card[1:]))
+    words.discard('')
+    return words
+
+
+class Fold(Func):
+    """
+    fold() in SQL, registered on the SQLite connections by register_fold.
+    """
+    function = 'web_fold'
+    output_field = CharField()
+
+
+@receiver(connection_created)
+def register_fold(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('web_fold', 1, fold, deterministic=True)
+
+
+def search_queryset(queryset, query):
+    """
+    The persons of ``queryset`` matching ``query`` in the order of PersonIndex.search, with the same rules: every
+    term starts a word of the name or last name, or the cédula with or without its V/E prefix. Used while the
+    index is (re)building.
+    """
+    queryset = queryset.annotate(folded_name=Fold('name'), folded_last_name=Fold('last_name'),
+                                 folded_card=Fold('id_card_number'))
+    for term in re.findall(r'\w+', fold(query)):
+        word = r'(^|\W)' + re.escape(term)
+        queryset = queryset.filter(Q(folded_name__regex=word) | Q(folded_last_name__regex=word) |
+                                   Q(folded_card__regex='^.?' + re.escape(term)))
+    return queryset.order_by(Fold(Concat('last_name', Value(' '), 'name')), 'pk')
+
+
+def _discard(items, item):
+    position = bisect.bisect_left(items, item)
+    if position < len(items) and items[position] == item:
+        del items[position]
+
+
+class PersonIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._building = False
+        self._version = None
+        self._checked_at = 0
+        self._persons = {}  # pk -> (type_id, label, sort_key, words)
+        self._words_by_type = {}  # type_id -> sorted [(word, pk)]
+        self._ordered_by_type = {}  # type_id -> sorted [(sort_key, pk)]
+        self._type_ids = {}  # PersonType name -> id
+
+    @property
+    def is_warm(self):
+        return self._version is not None
+
+    def _add(self, person):
+        words = _words(person)
+        sort_key = fold('%s %s' % (person.last_name, person.name))
+        self._persons[person.pk] = (person.type_id, str(person), sort_key, words)
+        type_words = self._words_by_type.setdefault(person.type_id, [])
+        for word in words:
+            bisect.insort(type_words, (word, person.pk))
+        bisect.insort(self._ordered_by_type.setdefault(person.type_id, []), (sort_key, person.pk))
+
+    def _remove(self, pk):
+        entry = self._persons.pop(pk, None)
+        if not entry:
+            return
+        type_id, _, sort_key, words = entry
+        for word in words:
+            _discard(self._words_by_type[type_id], (word, pk))
+        _discard(self._ordered_by_type[type_id], (sort_key, pk))
+
+    def build(self):
+        """
+        Load every person and swap in a fresh index.
+        """
+        version = versions.get_version(PersonData)
+        fresh = PersonIndex()
+        fresh._type_ids = dict(PersonType.objects.values_list('name', 'id'))
+        persons = PersonData.objects.only('id_card_number', 'name', 'last_name', 'type_id')
+        for person in persons.iterator(chunk_size=2_000):
+            words = _words(person)
+            sort_key = fold('%s %s' % (person.last_name, person.name))
+            fresh._persons[person.pk] = (person.type_id, str(person), sort_key, words)
+            fresh._words_by_type.setdefault(person.type_id, []).extend((word, person.pk) for word in words)
+            fresh._ordered_by_type.setdefault(person.type_id, []).append((sort_key, person.pk))
+        for items in list(fresh._words_by_type.values()) + list(fresh._ordered_by_type.values()):
+            items.sort()
+        with self._lock:
+            self._persons = fresh._persons
+            self._words_by_type = fresh._words_by_type
+            self._ordered_by_type = fresh._ordered_by_type
+            self._type_ids = fresh._type_ids
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._building = False
+
+    def _build_in_background(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+
+        def target():
+            try:
+                self.build()
+            finally:
+                self._building = False
+                connection.close()
+        threading.Thread(target=target, daemon=True).start()
+
+    def _ensure_fresh(self):
+        """
+        Return whether the index can answer. Cold or outdated indexes are (re)built in the background.
+        """
+        if not self.is_warm:
+            self._build_in_background()
+            return False
+        if time.monotonic() - self._checked_at > VERSION_CHECK_INTERVAL:
+            self._checked_at = time.monotonic()
+            if versions.get_version(PersonData) != self._version:
+                self._version = None
+                self._build_in_background()
+                return False
+        return True
+
+    def _matches(self, type_ids, term):
+        matches = set()
+        for type_id in type_ids:
+            items = self._words_by_type.get(type_id, [])
+            position = bisect.bisect_left(items, (term,))
+            while position < len(items) and items[position][0].startswith(term):
+                matches.add(items[position][1])
+                position += 1
+        return matches
+
+    def search(self, query, person_type=None, offset=0, limit=10):
+        """
+        Persons whose words start with every term of the query, as a ([(pk, label)], has_more) tuple,
+        or None when the index can't answer yet and the caller should query the database.
+        """
+        if not self._ensure_fresh():
+            return None
+        with self._lock:
+            if person_type is None:
+                type_ids = list(self._ordered_by_type)
+            elif person_type in self._type_ids:
+                type_ids = [self._type_ids[person_type]]
+            else:
+                return None
+            terms = re.findall(r'\w+', fold(query))
+            if terms:
+                candidates = None
+                for term in sorted(terms, key=len, reverse=True):
+                    matches = self._matches(type_ids, term)
+                    candidates = matches if candidates is None else candidates & matches
+                    if not candidates:
+                        break
+                ordered = heapq.nsmallest(offset + limit + 1, candidates,
+                                          key=lambda pk: (self._persons[pk][2], pk))
+            else:
+                merged = heapq.merge(*(self._ordered_by_type[type_id] for type_id in type_ids))
+                ordered = [pk for _, pk in itertools.islice(merged, offset + limit + 1)]
+            page = [(pk, self._persons[pk][1]) for pk in ordered[offset:offset + limit]]
+            return page, len(ordered) > offset + limit
+
+    def update(self, person, version):
+        """
+        Apply a save made in this process. ``version`` is the data version after the write.
+        """
+        with self._lock:
+            if not self.is_warm:
+                return
+            self._remove(person.pk)
+            self._add(person)
+            self._advance(version)
+
+    def delete(self, pk, version):
+        with self._lock:
+            if not self.is_warm:
+                return
+            self._remove(pk)
+            self._advance(version)
+
+    def _advance(self, version):
+        # If some other process wrote in between, the next version check rebuilds the index
+        if self._version == version - 1:
+            self._version = version
+
+
+person_search_index = PersonIndex()
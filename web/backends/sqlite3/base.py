@@ -0,0 +1,59 @@
+"""
+SQLite backend with the connection settings needed to serve several worker processes.
+
+Extra OPTIONS of the database settings, removed before connecting:
+
+- ``pragmas``: PRAGMA name -> value, run on every new connection (journal_mode=WAL lets readers work while a
+  write is in progress, busy_timeout is how long a statement waits for a lock before failing).
+- ``transaction_mode``: DEFERRED, IMMEDIATE or EXCLUSIVE, how transaction.atomic() begins its transactions.
+  IMMEDIATE takes the write lock at the start, so two transactions that read and then write can't deadlock
+  and fail halfway with "database is locked".
+- ``begin_retries``: times a BEGIN that still finds the database locked after busy_timeout is retried, with an
+  exponential backoff starting at ``begin_backoff`` seconds. Nothing has run in the transaction yet, so
+  retrying it is always safe.
+"""
+import random
+import re
+import time
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+_PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+_TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.transaction_mode = options.get('transaction_mode', 'DEFERRED').upper()
+        self.begin_retries = options.get('begin_retries', 0)
+        self.begin_backoff = options.get('begin_backoff', 0.05)
+        if self.transaction_mode not in _TRANSACTION_MODES:
+            raise ValueError('transaction_mode must be one of %s' % ', '.join(_TRANSACTION_MODES))
+        for name in self.pragmas:
+            if not _PRAGMA_NAME.match(name):
+                raise ValueError('Invalid PRAGMA name %r' % name)
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in ('pragmas', 'transaction_mode', 'begin_retries', 'begin_backoff'):
+            kwargs.pop(option, None)
+        return kwargs
+
+    def init_connection_state(self):
+        super().init_connection_state()
+        for name, value in self.pragmas.items():
+            self.connection.execute('PRAGMA %s = %s' % (name, value))
+
+    def _start_transaction_under_autocommit(self):
+        for attempt in range(self.begin_retries + 1):
+            try:
+                self.cursor().execute('BEGIN %s' % self.transaction_mode)
+                return
+            except OperationalError as error:
+                if 'locked' not in str(error) or attempt == self.begin_retries:
+                    raise
+            time.sleep(self.begin_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
@@ -0,0 +1,119 @@
+"""
+View benchmarks run by the benchmark_views command.
+
+Every case is a request to one of the views with a query budget: the most SQL queries the view may run. The
+budgets don't depend on the size of the data (the streamed exports add one prefetch per chunk of rows), so a
+view that starts running one query per row (an N+1) fails the run as soon as the dataset is bigger than a page.
+"""
+import statistics
+import time
+from collections import namedtuple
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import tabular
+from .models import Defence, Proposal, Term
+
+# ``data`` is a callable returning the GET/POST parameters, evaluated once the dataset exists. ``budget`` is a
+# number or, for the exports that prefetch per chunk of rows, a callable evaluated the same way. ``args``, if given,
+# is a callable returning the URL arguments
+Case = namedtuple('Case', ('name', 'url_name', 'method', 'data', 'budget', 'args'), defaults=(None,))
+
+
+def _no_data():
+    return {}
+
+
+def _search(term):
+    return lambda: {'search': term}
+
+
+def _all_terms():
+    return {'terms': list(Term.objects.values_list('pk', flat=True))}
+
+
+def _busiest_tutor():
+    # The academic tutor with the most proposals, the heaviest person page
+    tutor = Proposal.objects.values('academic_tutor').annotate(count=Count('pk')).order_by('-count').first()
+    return (tutor['academic_tutor'],) if tutor else ('',)
+
+
+def _per_chunk(model, queries):
+    # The rows' query plus ``queries`` prefetches for every chunk
+    return lambda: 1 + queries * max(1, -(-model.objects.count() // tabular.CHUNK_SIZE))
+
+
+# The list views read the data versions once per request (web.versions.snapshot) for their ETag and cached
+# counts; the keyset pages don't count, so that read is the only one they add to the page's query
+CASES = [
+    Case('thesis_index', 'thesis_index', 'get', _no_data, 5),
+    Case('thesis_index_search', 'thesis_index', 'get', _search('de'), 5),
+    Case('thesis_index_last_page', 'thesis_index', 'get', lambda: {'page': 'last'}, 5),
+    Case('thesis_historic_index', 'thesis_historic_index', 'get', _no_data, 5),
+    Case('thesis_historic_index_keyset', 'thesis_historic_index', 'get', lambda: {'pagination': 'keyset'}, 4),
+    # Plus the double-booked judges of the listed terms (web.conflicts), cached after the first request
+    Case('defence_index', 'defence_index', 'get', _no_data, 7),
+    Case('pending_defence_index', 'pending_defence_index', 'get', _no_data, 7),
+    Case('person_index', 'person_index', 'get', _no_data, 5),
+    Case('person_index_keyset', 'person_index', 'get', lambda: {'pagination': 'keyset'}, 4),
+    Case('person_index_search', 'person_index', 'get', _search('ma'), 5),
+    Case('person_detail_tutor', 'person_detail', 'get', _no_data, 5, _busiest_tutor),
+    Case('proposal_index', 'proposal_index', 'get', _no_data, 5),
+    Case('proposal_index_search', 'proposal_index', 'get', _search('de'), 5),
+    Case('stats_view', 'stats_view', 'post', _all_terms, 10),
+    Case('teacher_autocomplete', 'teacher-autocomplete', 'get', lambda: {'q': 'ma'}, 4),
+    Case('student_autocomplete', 'student-autocomplete', 'get', lambda: {'q': 'ma'}, 4),
+    Case('proposal_autocomplete', 'proposal-autocomplete', 'get', lambda: {'q': 'de'}, 5),
+    Case('thesis_autocomplete', 'thesis-autocomplete', 'get', lambda: {'q': 'de'}, 4),
+    Case('term_autocomplete', 'term-autocomplete', 'get', lambda: {'q': '20'}, 4),
+    Case('proposal_pdf', 'proposal_pdf', 'get', _no_data, 4),
+    Case('person_pdf', 'person_pdf', 'get', _no_data, 4),
+    Case('thesis_pdf', 'thesis_pdf', 'get', _no_data, 4),
+    Case('thesis_historic_pdf', 'thesis_historic_pdf', 'get', _no_data, 4),
+    Case('person_csv', 'person_export', 'get', _no_data, 1),
+    Case('thesis_csv', 'thesis_export', 'get', _no_data, 1),
+    Case('defence_csv', 'defence_export', 'get', _no_data, _per_chunk(Defence, 1)),
+]
+
+CaseResult = namedtuple('CaseResult', ('name', 'status', 'queries', 'budget', 'cold_ms', 'median_ms', 'min_ms',
+                                       'max_ms'))
+
+
+def _request(client, case, url, data):
+    response = getattr(client, case.method)(url, data)
+    if response.streaming:
+        # Streamed responses run their queries while being consumed
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response
+
+
+def run_case(client, case, repeat):
+    """
+    Request the view ``repeat`` times after a cold first request. The query count is the highest of all the
+    requests, the times are in milliseconds.
+    """
+    if case.args:
+        args = case.args()
+    else:
+        args = ('csv',) if case.url_name.endswith('_export') else ()
+    url = reverse(case.url_name, args=args)
+    data = case.data()
+    budget = case.budget() if callable(case.budget) else case.budget
+    timings = []
+    queries = 0
+    status = None
+    for _ in range(repeat + 1):
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = _request(client, case, url, data)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = max(queries, len(context.captured_queries))
+        status = response.status_code
+    warm = timings[1:] or timings
+    return CaseResult(case.name, status, queries, budget, round(timings[0], 2),
+                      round(statistics.median(warm), 2), round(min(warm), 2), round(max(warm), 2))
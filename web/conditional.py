@@ -0,0 +1,79 @@
+"""
+Conditional GET for the list and detail views.
+
+The ETag of a page is built from what it shows: the data versions of the listed models, or the ``modified``
+timestamp of the detail row (which the signals keep current with the related rows shown with it), together with
+the URL and the logged in user. A client sending the ETag back gets a 304 Not Modified without the page being
+built. Responses are marked private and no-cache so browsers revalidate them on every visit.
+"""
+import hashlib
+from functools import wraps
+from django.contrib import messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import versions
+
+
+def _has_pending_messages(request):
+    # A 304 would hide the messages waiting to be shown (e.g. after a redirect from a form)
+    return len(messages.get_messages(request)) > 0
+
+
+def _page_etag(request, *parts):
+    key = repr((request.get_full_path(), request.user.pk, parts))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _conditional(etag_func, last_modified_func=None):
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with versions.snapshot():
+                response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('Cookie',))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def versioned(*models):
+    """
+    Decorator for views whose content only changes with the rows of ``models``.
+    """
+
+    def etag_func(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        return _page_etag(request, versions.get_versions(*models))
+
+    return _conditional(etag_func)
+
+
+def row_modified(model):
+    """
+    Decorator for the detail view of a ``model`` row, given by the ``pk`` URL argument. The row's ``modified``
+    field must change with everything the page shows.
+    """
+
+    def get_modified(request, pk):
+        if not hasattr(request, '_row_modified'):
+            request._row_modified = model.objects.filter(pk=pk).values_list('modified', flat=True).first()
+        return request._row_modified
+
+    def etag_func(request, pk):
+        modified = get_modified(request, pk)
+        if modified is None or _has_pending_messages(request):
+            return None
+        return _page_etag(request, modified.isoformat())
+
+    def last_modified_func(request, pk):
+        return None if _has_pending_messages(request) else get_modified(request, pk)
+
+    return _conditional(etag_func, last_modified_func)
@@ -0,0 +1,117 @@
+"""
+Jury double-booking: a person in two defences whose times overlap.
+
+A defence takes settings.DEFENCE_DURATION from its date_time. A person takes part in it as a principal or backup
+judge (Jury) or as the academic tutor of its thesis. find_conflicts loads the (person, defence, start) rows of
+some terms with one query and finds the overlaps by sorting each person's defences by start and sweeping them,
+instead of comparing every pair. find_busy answers the same question for a single defence being saved, with a
+range query on the indexed date_time.
+"""
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import versions
+from .caching import LRUCache
+from .models import Defence, Jury, PersonData, Proposal, Thesis
+
+# The same person (id and name) in the defences ``first`` and ``second`` (codes), ``first`` starts no later than
+# ``second``
+Conflict = namedtuple('Conflict', ('person', 'name', 'first', 'first_start', 'second', 'second_start'))
+
+_conflicts = LRUCache(maxsize=64)
+
+
+def _load_intervals(defences):
+    judges = Jury.objects.filter(defence__in=defences).values_list(
+        'person', 'defence', 'defence__date_time', 'person__last_name', 'person__name')
+    tutors = defences.values_list(
+        'thesis__proposal__academic_tutor', 'code', 'date_time', 'thesis__proposal__academic_tutor__last_name',
+        'thesis__proposal__academic_tutor__name')
+    # UNION drops the tutors that are also in the jury table
+    rows = list(judges.union(tutors))
+    names = {row[0]: '%s %s' % (row[3], row[4]) for row in rows}
+    return [row[:3] for row in rows], names
+
+
+def load_intervals(terms, since=None):
+    """
+    (person id, defence code, start) of everyone taking part in the defences of the theses of ``terms``, and
+    the names of those persons by id. ``since`` leaves out the defences that ended before it.
+    """
+    defences = Defence.objects.filter(thesis__delivery_term__in=terms)
+    if since is not None:
+        defences = defences.filter(date_time__gt=since - settings.DEFENCE_DURATION)
+    return _load_intervals(defences)
+
+
+def load_intervals_between(start, end):
+    """
+    Like load_intervals, for the defences of any term overlapping the time from ``start`` to ``end``.
+    """
+    duration = settings.DEFENCE_DURATION
+    return _load_intervals(Defence.objects.filter(date_time__gt=start - duration, date_time__lt=end + duration))
+
+
+def sweep(intervals, names=None, duration=None):
+    """
+    Conflicts of the (person, defence, start) intervals, each one ``duration`` long.
+    """
+    names = names or {}
+    duration = duration or settings.DEFENCE_DURATION
+    conflicts = []
+    active = []
+    previous_person = None
+    for person, defence, start in sorted(intervals, key=lambda interval: (interval[0], interval[2], interval[1])):
+        if person != previous_person:
+            active = []
+            previous_person = person
+        # Defences of this person still going on when this one starts
+        active = [(other, other_start) for other, other_start in active
+                  if other_start + duration > start and other != defence]
+        conflicts.extend(Conflict(person, names.get(person, person), other, other_start, defence, start)
+                         for other, other_start in active)
+        active.append((defence, start))
+    return conflicts
+
+
+def find_conflicts(terms):
+    """
+    Conflicts in the defences of ``terms`` (ids) from today on, cached until the defences or their jury change.
+    """
+    terms = tuple(sorted(set(terms)))
+    if not terms:
+        return []
+    # Past conflicts can't be fixed anymore, and leaving them out keeps the query small
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    key = (terms, today, versions.get_versions(Defence, Jury, Thesis, Proposal, PersonData))
+    conflicts = _conflicts.get(key)
+    if conflicts is None:
+        conflicts = sweep(*load_intervals(terms, since=today))
+        _conflicts.set(key, conflicts)
+    return conflicts
+
+
+def find_busy(persons, date_time, exclude=None):
+    """
+    (person id, defence code, start) of the defences overlapping one at ``date_time`` where any of ``persons``
+    (ids) is a judge or the academic tutor, other than the defence ``exclude`` (code).
+    """
+    persons = set(persons)
+    duration = settings.DEFENCE_DURATION
+    defences = Defence.objects.filter(date_time__gt=date_time - duration, date_time__lt=date_time + duration).filter(
+        Q(jury__person__in=persons) | Q(thesis__proposal__academic_tutor__in=persons))
+    if exclude:
+        defences = defences.exclude(pk=exclude)
+    busy = {}
+    for code, start, judge, tutor in defences.values_list(
+            'code', 'date_time', 'jury__person', 'thesis__proposal__academic_tutor'):
+        for person in (judge, tutor):
+            if person in persons:
+                busy[(person, code)] = start
+    return sorted(((person, code, start) for (person, code), start in busy.items()), key=lambda row: row[2])
+
+
+def clear_cache():
+    _conflicts.clear()
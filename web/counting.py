@@ -0,0 +1,87 @@
+"""
+Row counts of the list views.
+
+A count is cached per query (the SQL and parameters of the filtered queryset, so per view and filter) together
+with the data versions of the tables it reads, and reused until one of them changes. Counting stops at
+COUNT_LIMIT rows: bigger results are reported as "more than COUNT_LIMIT" instead of scanning the whole set.
+"""
+import functools
+import hashlib
+from django.apps import apps
+from django.db.models.sql import Query
+
+from . import fulltext, versions
+from .caching import LRUCache
+from .models import PersonData, Proposal, SearchDocument, Term, Thesis, ThesisStatus
+
+COUNT_LIMIT = 10_000
+
+# The search tables are written by web.fulltext from these models, their versions stand for them
+_SEARCH_MODELS = (Thesis, Proposal, PersonData, ThesisStatus, Term)
+
+_counts = LRUCache(maxsize=512)
+
+
+@functools.lru_cache(maxsize=None)
+def _models_by_table():
+    tables = {model._meta.db_table: (model,) for model in apps.get_models()}
+    tables[SearchDocument._meta.db_table] = _SEARCH_MODELS
+    tables[fulltext.FTS_TABLE] = _SEARCH_MODELS
+    return tables
+
+
+def _add_tables(node, tables):
+    """
+    Add the tables read by ``node`` (a query, a WHERE node, a lookup or an expression) and its subqueries.
+    """
+    if isinstance(node, Query):
+        tables.update(join.table_name for join in node.alias_map.values())
+        tables.update(node.extra_tables)
+        for child in [node.where] + list(node.annotations.values()):
+            _add_tables(child, tables)
+        return
+    for child in getattr(node, 'children', ()):
+        _add_tables(child, tables)
+    for side in ('lhs', 'rhs'):
+        if hasattr(node, side):
+            _add_tables(getattr(node, side), tables)
+    if hasattr(node, 'get_source_expressions'):
+        for child in node.get_source_expressions():
+            _add_tables(child, tables)
+
+
+def _query_models(query):
+    models_by_table = _models_by_table()
+    # Tables only read by subqueries (e.g. proposal_status__in=<queryset>) count as well
+    tables = set()
+    _add_tables(query, tables)
+    models = set()
+    for table in tables:
+        models.update(models_by_table.get(table, ()))
+    return sorted(models, key=lambda model: model._meta.label_lower)
+
+
+def count_queryset(queryset, limit=COUNT_LIMIT):
+    """
+    Rows of the queryset as ``(count, exact)``. When there are more than ``limit`` rows the count is ``limit``
+    and ``exact`` is False.
+    """
+    queryset = queryset.order_by()
+    query = queryset.query.chain()
+    # Compiling the query also sets up its joins, which tell the tables it reads
+    sql, params = query.sql_with_params()
+    models = _query_models(query)
+    key = hashlib.sha1(repr((sql, params, limit)).encode()).hexdigest()
+    # Read before counting: a write in between leaves an outdated version in the cache, not an outdated count
+    current_versions = versions.get_versions(*models)
+    cached = _counts.get(key)
+    if cached and cached[0] == current_versions:
+        return cached[1]
+    count = queryset[:limit + 1].count()
+    result = (min(count, limit), count <= limit)
+    _counts.set(key, (current_versions, result))
+    return result
+
+
+def clear_cache():
+    _counts.clear()
@@ -0,0 +1,166 @@
+"""
+Background rendering of the PDF reports.
+
+Views call request_export(), which returns a finished job right away when the report was already rendered for
+the same data, or queues a new ExportJob. The run_export_worker command renders queued jobs in a local pool of
+worker processes and stores the files in settings.EXPORT_ROOT, named after the report and its data key. Once a
+report is rendered, the older jobs of the same report and their files are deleted: only the latest data is
+served, so they would never be used again.
+"""
+import hashlib
+import logging
+import os
+from collections import namedtuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import versions
+from .listing import THESIS_LIST, proposals_not_approved
+from .models import (ExportJob, HistoricThesisStatus, PersonData, PersonType, Proposal, ProposalStatus, Term,
+                     Thesis, ThesisStatus)
+from .render import render_pdf_bytes
+
+logger = logging.getLogger(__name__)
+
+# ``models`` are the tables whose data versions make up the data key of the report
+Report = namedtuple('Report', ('template', 'filename', 'models', 'get_context'))
+
+_PROPOSAL_RELATED = ('student1', 'student2', 'academic_tutor', 'industry_tutor', 'term', 'proposal_status')
+_PROPOSAL_MODELS = (Proposal, PersonData, Term, ProposalStatus)
+_THESIS_MODELS = (Thesis, HistoricThesisStatus, ThesisStatus, Proposal, PersonData, Term)
+
+
+def _proposals_context():
+    return {
+        'proposal_list': Proposal.objects.select_related(*_PROPOSAL_RELATED),
+    }
+
+
+def _proposals_not_approved_context():
+    proposal_list = proposals_not_approved().select_related(*_PROPOSAL_RELATED)
+    return {
+        'proposal_list': proposal_list,
+    }
+
+
+def _persons_context():
+    return {
+        'person_list': PersonData.objects.select_related('type').order_by('id_card_number', 'name'),
+    }
+
+
+def _thesis_context():
+    thesis_list = THESIS_LIST.get_queryset().exclude(current_status__name='Aprobado')
+    return {
+        'thesis_list': THESIS_LIST.decorate_rows(thesis_list),
+    }
+
+
+def _thesis_historic_context():
+    return {
+        'thesis_list': THESIS_LIST.decorate_rows(THESIS_LIST.get_queryset()),
+    }
+
+
+REPORTS = {
+    'proposals': Report('web/proposal/proposal_pdf.html', 'Proposals.pdf', _PROPOSAL_MODELS, _proposals_context),
+    'proposals_not_approved': Report('web/proposal/proposal_not_approved_pdf.html', 'ProposalsNotApproved.pdf',
+                                     _PROPOSAL_MODELS, _proposals_not_approved_context),
+    'persons': Report('web/persons/person_list_pdf.html', 'Persons_list.pdf', (PersonData, PersonType),
+                      _persons_context),
+    'thesis': Report('web/thesis/thesis_list_pdf.html', 'Thesis_list.pdf', _THESIS_MODELS, _thesis_context),
+    'thesis_historic': Report('web/thesis/thesis_list_pdf.html', 'Thesis_list.pdf', _THESIS_MODELS,
+                              _thesis_historic_context),
+}
+
+
+def get_data_key(report_name):
+    """
+    Hash identifying the current state of the data a report is built from.
+    """
+    report = REPORTS[report_name]
+    data_versions = versions.get_versions(*report.models)
+    return hashlib.sha256(('%s:%s' % (report_name, data_versions)).encode()).hexdigest()
+
+
+def get_file_path(job):
+    return os.path.join(settings.EXPORT_ROOT, '%s-%s.pdf' % (job.report, job.data_key))
+
+
+def request_export(report_name, data_key=None):
+    """
+    Return the job that produces the report for the current data: an already rendered one if its file is still
+    around, one that is queued or running, or a newly queued one. ``data_key`` saves computing it again when the
+    caller already did.
+    """
+    data_key = data_key or get_data_key(report_name)
+    with transaction.atomic():
+        jobs = ExportJob.objects.filter(report=report_name, data_key=data_key).exclude(status=ExportJob.FAILED)
+        for job in jobs.order_by('-created_at'):
+            if job.status != ExportJob.DONE or os.path.exists(get_file_path(job)):
+                return job
+        return ExportJob.objects.create(report=report_name, data_key=data_key)
+
+
+def claim_pending_jobs(limit):
+    """
+    Mark up to ``limit`` queued jobs as running and return their ids, oldest first. A job is only claimed by
+    one worker even if several of them poll at the same time.
+    """
+    claimed = []
+    pending = ExportJob.objects.filter(status=ExportJob.PENDING).order_by('created_at')
+    for job_id in pending.values_list('pk', flat=True)[:limit]:
+        if ExportJob.objects.filter(pk=job_id, status=ExportJob.PENDING).update(status=ExportJob.RUNNING,
+                                                                                 started_at=timezone.now()):
+            claimed.append(job_id)
+    return claimed
+
+
+def requeue_stale_jobs(stale_after, exclude=()):
+    """
+    Queue again the jobs running for longer than ``stale_after``, left behind by a worker that died, other than
+    ``exclude`` (ids). Returns how many.
+    """
+    return ExportJob.objects.filter(status=ExportJob.RUNNING, started_at__lt=timezone.now() - stale_after).exclude(
+        pk__in=exclude).update(status=ExportJob.PENDING, started_at=None)
+
+
+def delete_superseded(job):
+    """
+    Delete the finished jobs of the report of ``job`` created before it, and their files.
+    """
+    superseded = ExportJob.objects.filter(report=job.report, status__in=(ExportJob.DONE, ExportJob.FAILED),
+                                          created_at__lt=job.created_at).exclude(data_key=job.data_key)
+    for old_job in superseded:
+        try:
+            os.remove(get_file_path(old_job))
+        except FileNotFoundError:
+            pass
+    superseded.delete()
+
+
+def run_job(job_id):
+    """
+    Render a claimed job into its file. Runs inside the worker processes.
+    """
+    job = ExportJob.objects.get(pk=job_id)
+    report = REPORTS[job.report]
+    try:
+        pdf = render_pdf_bytes(report.template, report.get_context())
+        if pdf is None:
+            raise ValueError('The PDF renderer reported an error')
+        path = get_file_path(job)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so a half written file is never served
+        with open(path + '.tmp', 'wb') as output:
+            output.write(pdf)
+        os.replace(path + '.tmp', path)
+    except Exception as error:
+        logger.exception('Export job %s failed', job_id)
+        ExportJob.objects.filter(pk=job_id).update(status=ExportJob.FAILED, error=str(error),
+                                                   finished_at=timezone.now())
+        return False
+    ExportJob.objects.filter(pk=job_id).update(status=ExportJob.DONE, finished_at=timezone.now())
+    delete_superseded(job)
+    return True
@@ -3,9 +3,10 @@ from dal import autocomplete
 from datetime import datetime
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
+from django.db import transaction
 from django.utils import timezone
 
-from . import models
+from . import conflicts, models, versions
 
 
 class UserLoginForm(AuthenticationForm):
@@ -157,6 +158,8 @@ class ThesisForm(forms.ModelForm):
         if instance and instance.pk:
             self.fields['proposal'].disabled = True
             self.fields['submission_date'].disabled = True
+            # The status isn't a field of the model, it is the latest entry of the history
+            self.initial.setdefault('status', instance.current_status_id)
 
     class Meta:
         model = models.Thesis
@@ -224,14 +227,17 @@ class ThesisForm(forms.ModelForm):
     )
 
     def save(self, commit=True):
-        thesis = super().save(commit)
-        print(thesis)
-        status = models.ThesisStatus.objects.get(name=self.cleaned_data['status'])
-        print(status)
-        models.HistoricThesisStatus(
-            thesis=thesis,
-            status=status
-        ).save()
+        # The thesis and its status history entry (which updates Thesis.current_status) are written together.
+        # Saving without a change of status leaves the history as it is.
+        previous_status = self.instance.current_status_id
+        with transaction.atomic():
+            thesis = super().save(commit)
+            status = self.cleaned_data['status']
+            if status.pk != previous_status:
+                models.HistoricThesisStatus(
+                    thesis=thesis,
+                    status=status
+                ).save()
         return thesis
 
 
@@ -346,6 +352,23 @@ class StatsForm(forms.Form):
         queryset=models.Term.objects.all(),
         widget=forms.SelectMultiple(attrs={'class': 'form-control m-b'})
     )
+    as_of = forms.DateField(
+        required=False,
+        label='Estados al',
+        help_text='Por defecto, hoy.',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+
+def _double_booking_errors(persons, date_time, exclude=None):
+    """
+    Messages for the defences where ``persons`` (ids) already are at ``date_time``, see web.conflicts.
+    """
+    busy = conflicts.find_busy(persons, date_time, exclude=exclude)
+    names = models.PersonData.objects.in_bulk({person for person, _, _ in busy}) if busy else {}
+    return ['%s ya participa en la defensa %s del %s.' % (
+        names[person].get_short_name(), code, timezone.localtime(start).strftime('%d/%m/%Y %H:%M'))
+        for person, code, start in busy]
 
 
 class DefenceForm(forms.ModelForm):
@@ -416,27 +439,48 @@ class DefenceForm(forms.ModelForm):
 
     def clean_jury(self):
         form_jury = self.cleaned_data['jury']
-        if len(form_jury) > models.Defence.MAX_JUDGES:
-            raise forms.ValidationError("Límite de jueces superado (Máximo %d)." % models.Defence.MAX_JUDGES)
+        judges = {judge.pk for judge in form_jury}
 
-        # If we are updating an instance
+        # If we are updating an instance, the principal judges already registered count once
         instance = getattr(self, 'instance', None)
         if instance and instance.pk:
-            registered_judges = instance.get_complete_jury()
-            if len(registered_judges) + len(form_jury) > models.Defence.MAX_JUDGES:
-                raise forms.ValidationError("Límite de jueces superado (Máximo %d)." % models.Defence.MAX_JUDGES)
-
+            judges.update(models.Jury.objects.filter(defence=instance, is_backup_jury=False).values_list(
+                'person_id', flat=True))
+
+        thesis = self.cleaned_data.get('thesis')
+        tutor = thesis.proposal.academic_tutor_id if thesis else None
+        if models.Defence.free_judge_slots(tutor, judges) < 0:
+            raise forms.ValidationError("Límite de jueces superado (Máximo %d, incluido el tutor académico)." %
+                                        models.Defence.MAX_JUDGES)
         return form_jury
 
-    def save(self, commit=True):
-        instance = super().save(commit=commit)
-        form_jury = self.cleaned_data['jury']
-        for judge in form_jury:
-            try:
-                models.Jury.objects.get(person=judge, defence=instance)
-            except:
-                models.Jury(person=judge, defence=instance).save()
+    def clean(self):
+        cleaned_data = super().clean()
+        thesis = cleaned_data.get('thesis')
+        date_time = cleaned_data.get('date_time')
+        if thesis and date_time and 'jury' in cleaned_data:
+            persons = {judge.pk for judge in cleaned_data['jury']}
+            persons.add(thesis.proposal.academic_tutor_id)
+            if self.instance.pk:
+                persons.update(models.Jury.objects.filter(defence=self.instance).values_list('person_id', flat=True))
+            errors = _double_booking_errors(persons, date_time, exclude=self.instance.pk)
+            if errors:
+                raise forms.ValidationError(errors)
+        return cleaned_data
 
+    def save(self, commit=True):
+        # The defence and its new judges are saved together, or not at all
+        with transaction.atomic():
+            instance = super().save(commit=commit)
+            registered = set(models.Jury.objects.filter(defence=instance).values_list('person_id', flat=True))
+            new_judges = [models.Jury(person=judge, defence=instance) for judge in self.cleaned_data['jury']
+                          if judge.pk not in registered]
+            if new_judges:
+                # bulk_create sends no signals: touch the defence so its cached list rows show the new jury, and
+                # bump the version
+                models.Jury.objects.bulk_create(new_judges)
+                models.Defence.objects.filter(pk=instance.pk).update(modified=timezone.now())
+                versions.bump_version(models.Jury)
         return instance
 
 
@@ -467,3 +511,54 @@ class JudgeForm(forms.ModelForm):
         required=False,
         widget=forms.CheckboxInput(attrs={'type': 'checkbox'})
     )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        person = cleaned_data.get('person')
+        defence = cleaned_data.get('defence')
+        if person and defence:
+            errors = _double_booking_errors([person.pk], defence.date_time, exclude=defence.pk)
+            if errors:
+                raise forms.ValidationError(errors)
+        return cleaned_data
+
+
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(
+        label='Tipo de registros',
+        choices=(
+            ('persons', 'Personas'),
+            ('proposals', 'Propuestas'),
+            ('theses', 'Trabajos de grado'),
+        ),
+        widget=forms.Select(attrs={'class': 'form-control m-b'})
+    )
+    file = forms.FileField(
+        label='Archivo CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control-file', 'accept': '.csv'})
+    )
+    dry_run = forms.BooleanField(
+        label='Solo validar',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'type': 'checkbox'})
+    )
+
+
+class DefenceScheduleForm(forms.Form):
+    file = forms.FileField(
+        label='Archivo CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control-file', 'accept': '.csv'})
+    )
+    dry_run = forms.BooleanField(
+        label='Solo validar',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'type': 'checkbox'})
+    )
+
+
+class JuryAssignmentForm(forms.Form):
+    term = forms.ModelChoiceField(
+        label='TERM',
+        queryset=models.Term.objects.order_by('-period'),
+        widget=forms.Select(attrs={'class': 'form-control m-b'})
+    )
@@ -0,0 +1,190 @@
+"""
+Full-text search over theses and proposals backed by an SQLite FTS5 table.
+
+Every thesis and proposal has a SearchDocument row holding its searchable text (codes, NRC, titles, thematic
+category, the current status and delivery term of theses and the names and cédulas of its students and tutors).
+The FTS5 table mirrors those rows through triggers, so keeping the documents up to date (see web.signals) is
+enough to keep the index in sync.
+"""
+import re
+from django.apps import apps as django_apps
+from django.db import connection, transaction
+
+from .models import Proposal, SearchDocument, Thesis
+
+DOCUMENT_TABLE = SearchDocument._meta.db_table
+FTS_TABLE = '%s_fts' % DOCUMENT_TABLE
+FTS_COLUMNS = ('code', 'nrc', 'title', 'thematic_category', 'proposal_title', 'people', 'status', 'term')
+BATCH_SIZE = 500
+
+_PERSON_FIELDS = ('student1', 'student2', 'academic_tutor', 'industry_tutor')
+
+
+def create_index_sql(fts_columns=FTS_COLUMNS):
+    """
+    Statements that create the FTS5 table and the triggers that mirror SearchDocument into it. Migrations pass
+    the ``fts_columns`` of the SearchDocument they run with.
+    """
+    columns = ', '.join(fts_columns)
+    new_values = ', '.join('new.%s' % column for column in fts_columns)
+    old_values = ', '.join('old.%s' % column for column in fts_columns)
+    insert = 'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});'
+    delete = "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    statements = [
+        "CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='id');",
+        'CREATE TRIGGER {table}_ai AFTER INSERT ON {table} BEGIN ' + insert + ' END;',
+        'CREATE TRIGGER {table}_ad AFTER DELETE ON {table} BEGIN ' + delete + ' END;',
+        'CREATE TRIGGER {table}_au AFTER UPDATE ON {table} BEGIN ' + delete + ' ' + insert + ' END;',
+    ]
+    return [statement.format(fts=FTS_TABLE, table=DOCUMENT_TABLE, columns=columns, new_values=new_values,
+                             old_values=old_values) for statement in statements]
+
+
+def drop_index_sql():
+    return [
+        'DROP TRIGGER IF EXISTS {table}_ai;'.format(table=DOCUMENT_TABLE),
+        'DROP TRIGGER IF EXISTS {table}_ad;'.format(table=DOCUMENT_TABLE),
+        'DROP TRIGGER IF EXISTS {table}_au;'.format(table=DOCUMENT_TABLE),
+        'DROP TABLE IF EXISTS {fts};'.format(fts=FTS_TABLE),
+    ]
+
+
+def is_available():
+    """
+    The FTS5 table only exists on SQLite, other databases fall back to the plain icontains search.
+    """
+    return connection.vendor == 'sqlite'
+
+
+def build_match_expression(search):
+    """
+    Turn the user's search into an FTS5 query: every term must match (AND), as a prefix of any indexed word.
+    """
+    terms = re.findall(r'\w+', search or '')
+    return ' '.join('"%s"*' % term for term in terms)
+
+
+def filter_queryset(queryset, search, kind):
+    """
+    Restrict a Thesis or Proposal queryset to the rows matching the search and annotate them with their
+    relevance as ``search_rank`` (lower is better), so callers can order_by('search_rank').
+    """
+    match = build_match_expression(search)
+    if not match:
+        return queryset.extra(select={'search_rank': '0'})
+    opts = queryset.model._meta
+    return queryset.extra(
+        select={'search_rank': '%s.rank' % FTS_TABLE},
+        tables=[DOCUMENT_TABLE, FTS_TABLE],
+        # The unary + keeps SQLite from using the kind index and the FTS rowid lookup, so the join starts from
+        # the MATCH (one full-text query) instead of running the MATCH once per document of the kind
+        where=[
+            '%s.key = %s.%s' % (DOCUMENT_TABLE, opts.db_table, opts.pk.column),
+            '+%s.kind = %%s' % DOCUMENT_TABLE,
+            '%s.id = +%s.rowid' % (DOCUMENT_TABLE, FTS_TABLE),
+            '%s MATCH %%s' % FTS_TABLE,
+        ],
+        params=[kind, match],
+    )
+
+
+def _people_text(proposal):
+    words = []
+    for field in _PERSON_FIELDS:
+        person = getattr(proposal, field)
+        if person:
+            # The cédula is also indexed without its V/E prefix so it can be searched by its digits
+            words.extend((person.name, person.last_name, person.id_card_number, person.id_card_number[1:]))
+    return ' '.join(words)
+
+
+def _thesis_document(thesis):
+    return {
+        'kind': SearchDocument.THESIS,
+        'key': thesis.code,
+        'code': thesis.code,
+        'nrc': thesis.NRC,
+        'title': thesis.title,
+        'thematic_category': thesis.thematic_category,
+        'proposal_title': thesis.proposal.title,
+        'people': _people_text(thesis.proposal),
+        'status': thesis.current_status.name if thesis.current_status else '',
+        'term': str(thesis.delivery_term.period),
+    }
+
+
+def _proposal_document(proposal):
+    return {
+        'kind': SearchDocument.PROPOSAL,
+        'key': proposal.code,
+        'code': proposal.code,
+        'title': proposal.title,
+        'people': _people_text(proposal),
+    }
+
+
+def _people_related(prefix=''):
+    return ['%s%s' % (prefix, field) for field in _PERSON_FIELDS]
+
+
+# Everything _thesis_document reads
+_THESIS_RELATED = ('current_status', 'delivery_term') + tuple(_people_related('proposal__'))
+
+
+def _write_documents(kind, keys, documents):
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind, key__in=keys).delete()
+        SearchDocument.objects.bulk_create([SearchDocument(**fields) for fields in documents],
+                                           batch_size=BATCH_SIZE)
+
+
+def index_theses(codes):
+    """
+    (Re)build the documents of the given theses, dropping the ones that no longer exist.
+    """
+    codes = list(codes)
+    theses = Thesis.objects.filter(code__in=codes).select_related(*_THESIS_RELATED)
+    _write_documents(SearchDocument.THESIS, codes, [_thesis_document(thesis) for thesis in theses])
+
+
+def index_proposals(codes):
+    """
+    (Re)build the documents of the given proposals and of their theses.
+    """
+    codes = list(codes)
+    proposals = Proposal.objects.filter(code__in=codes).select_related(*_people_related())
+    _write_documents(SearchDocument.PROPOSAL, codes, [_proposal_document(proposal) for proposal in proposals])
+    index_theses(Thesis.objects.filter(proposal__in=codes).values_list('code', flat=True))
+
+
+def remove_documents(kind, keys):
+    SearchDocument.objects.filter(kind=kind, key__in=list(keys)).delete()
+
+
+def rebuild(apps=django_apps):
+    """
+    Regenerate every document from scratch. ``apps`` allows running it from a migration, the fields that the
+    SearchDocument of that migration doesn't have yet are left out.
+    """
+    document_model = apps.get_model('web', 'SearchDocument')
+    thesis_model = apps.get_model('web', 'Thesis')
+    proposal_model = apps.get_model('web', 'Proposal')
+    document_fields = {field.name for field in document_model._meta.fields}
+    sources = (
+        (thesis_model.objects.select_related(*_THESIS_RELATED), _thesis_document),
+        (proposal_model.objects.select_related(*_people_related()), _proposal_document),
+    )
+    with transaction.atomic():
+        document_model.objects.all().delete()
+        for queryset, build_document in sources:
+            batch = []
+            for row in queryset.iterator(chunk_size=BATCH_SIZE):
+                batch.append(document_model(**{name: value for name, value in build_document(row).items()
+                                               if name in document_fields}))
+                if len(batch) == BATCH_SIZE:
+                    document_model.objects.bulk_create(batch)
+                    batch = []
+            document_model.objects.bulk_create(batch)
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO {fts}({fts}) VALUES ('optimize');".format(fts=FTS_TABLE))
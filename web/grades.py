@@ -0,0 +1,80 @@
+"""
+Defence grade statistics computed from the per term aggregates of TermGradeStats.
+
+Merging the aggregates of the selected terms gives the count, sum and sum of squares (mean and standard
+deviation) and the grade histogram (median and mode), so the cost depends on the number of terms and not on the
+number of defences.
+"""
+import math
+from collections import namedtuple
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count
+
+from .models import TermGradeStats
+
+GradeSummary = namedtuple('GradeSummary', ('count', 'mean', 'median', 'mode', 'stdev', 'histogram'))
+
+
+def _histogram_median(histogram, count):
+    def nth(position):
+        seen = 0
+        for grade, grade_count in enumerate(histogram):
+            seen += grade_count
+            if seen > position:
+                return grade
+
+    if count % 2:
+        return nth(count // 2)
+    return (nth(count // 2 - 1) + nth(count // 2)) / 2
+
+
+def summarize(terms):
+    """
+    Grade statistics of the defences of the theses delivered in ``terms``. The statistics that can't be
+    computed with the available grades are None, e.g. the standard deviation of a single grade.
+    """
+    count = total = total_squares = 0
+    histogram = [0] * (TermGradeStats.MAX_GRADE + 1)
+    for stats in TermGradeStats.objects.filter(term__in=terms):
+        count += stats.count
+        total += stats.total
+        total_squares += stats.total_squares
+        histogram = [merged + grade_count for merged, grade_count in zip(histogram, stats.get_histogram())]
+    if not count:
+        return GradeSummary(0, None, None, None, None, histogram)
+    # The lowest grade wins ties for the mode
+    mode = max(range(len(histogram)), key=lambda grade: (histogram[grade], -grade))
+    stdev = None
+    if count > 1:
+        # Sample standard deviation, as statistics.stdev
+        stdev = math.sqrt(max(total_squares - total * total / count, 0) / (count - 1))
+    return GradeSummary(count, total / count, _histogram_median(histogram, count), mode, stdev, histogram)
+
+
+def rebuild(apps=django_apps):
+    """
+    Recompute every aggregate from the defences. ``apps`` allows running it from a migration. Grades outside the
+    histogram are left out, as TermGradeStats.add_grade does.
+    """
+    stats_model = apps.get_model('web', 'TermGradeStats')
+    defence_model = apps.get_model('web', 'Defence')
+    grade_counts = defence_model.objects.filter(grade__isnull=False, grade__lte=TermGradeStats.MAX_GRADE).values(
+        'thesis__delivery_term', 'grade').annotate(defences=Count('pk')).order_by()
+    rows = {}
+    for row in grade_counts:
+        term_id = row['thesis__delivery_term']
+        stats = rows.setdefault(term_id, {'count': 0, 'total': 0, 'total_squares': 0,
+                                          'histogram': [0] * (TermGradeStats.MAX_GRADE + 1)})
+        stats['count'] += row['defences']
+        stats['total'] += row['grade'] * row['defences']
+        stats['total_squares'] += row['grade'] * row['grade'] * row['defences']
+        stats['histogram'][row['grade']] += row['defences']
+    with transaction.atomic():
+        stats_model.objects.all().delete()
+        stats_model.objects.bulk_create([
+            stats_model(term_id=term_id, count=stats['count'], total=stats['total'],
+                        total_squares=stats['total_squares'],
+                        histogram=','.join(str(count) for count in stats['histogram']))
+            for term_id, stats in rows.items()
+        ])
@@ -0,0 +1,137 @@
+"""
+ASGI handler that serves the lightweight JSON endpoints off the event loop.
+
+Django 3.0 runs every view synchronously. Under ASGI, LightweightASGIHandler sends the requests of the
+autocompletes and of the export job status to a small pool of threads of its own (ASYNC_LOOKUP_WORKERS) while
+the event loop keeps accepting connections, so a burst of keystrokes waits in the pool's queue instead of taking
+a worker per request. A lookup is dropped when the client disconnects (select2 aborts the previous request on
+every keystroke) or sends a newer one from the same widget: a queued lookup never runs, a running one finishes
+in its thread but its response is discarded. The widget is the one named by the X-Lookup-Id request header, or
+the client's connection when there is none, so two widgets or tabs of a session never cancel each other. Every
+other request goes through the stock handler.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from django import setup
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.http import FileResponse, JsonResponse
+from django.urls import Resolver404, resolve, set_script_prefix
+
+# Autocompletes: a newer request from the same widget supersedes the previous one
+AUTOCOMPLETE_URL_NAMES = frozenset((
+    'person-type-autocomplete',
+    'proposal-autocomplete',
+    'term-autocomplete',
+    'thesis-autocomplete',
+    'teacher-autocomplete',
+    'student-autocomplete',
+))
+
+LIGHTWEIGHT_URL_NAMES = AUTOCOMPLETE_URL_NAMES | {'export_job_status'}
+
+
+def get_asgi_application():
+    """
+    Like django.core.asgi.get_asgi_application(), with the lightweight endpoints served by the pool.
+    """
+    setup(set_prefix=False)
+    return LightweightASGIHandler()
+
+
+class LightweightASGIHandler(ASGIHandler):
+
+    def __init__(self):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_LOOKUP_WORKERS', 4),
+                                           thread_name_prefix='lookup')
+        # Lookup in progress per (session, URL name, widget), see _lookup_key
+        self.latest_lookups = {}
+
+    async def __call__(self, scope, receive, send):
+        url_name = self._url_name(scope) if scope['type'] == 'http' else None
+        if url_name not in LIGHTWEIGHT_URL_NAMES:
+            return await super().__call__(scope, receive, send)
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+        set_script_prefix(self.get_script_prefix(scope))
+        request, error_response = self.create_request(scope, body_file)
+        if request is None:
+            await self.send_response(error_response, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        lookup = loop.run_in_executor(self.executor, self._run_lookup, scope, request)
+        key = self._lookup_key(scope, url_name, request)
+        if key is not None:
+            self._supersede(key, lookup)
+        disconnect = loop.create_task(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait((lookup, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected = disconnect.done()
+            disconnect.cancel()
+            if key is not None and self.latest_lookups.get(key) is lookup:
+                del self.latest_lookups[key]
+
+        if disconnected:
+            # The client went away: drop the lookup if it is still queued
+            lookup.cancel()
+            return
+        if lookup.cancelled():
+            # Superseded by a newer keystroke, the client (if it still listens) gets no results
+            response = JsonResponse({'results': [], 'pagination': {'more': False}})
+        else:
+            response = lookup.result()
+        response._handler_class = self.__class__
+        if isinstance(response, FileResponse):
+            response.block_size = self.chunk_size
+        await self.send_response(response, send)
+
+    def _run_lookup(self, scope, request):
+        # Runs in a pool thread: the database connections are per thread, so the expired ones of this thread are
+        # closed here, before and after the request, instead of by the request_finished of the loop thread
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        try:
+            return self.get_response(request)
+        finally:
+            close_old_connections()
+
+    def _url_name(self, scope):
+        path = scope['path']
+        script_name = scope.get('root_path', '')
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name):]
+        try:
+            return resolve(path).url_name
+        except Resolver404:
+            return None
+
+    def _lookup_key(self, scope, url_name, request):
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if url_name not in AUTOCOMPLETE_URL_NAMES or not session_key:
+            return None
+        widget = request.META.get('HTTP_X_LOOKUP_ID')
+        if widget:
+            return session_key, url_name, 'id', widget
+        if scope.get('client'):
+            return session_key, url_name, 'connection', tuple(scope['client'])
+        return None
+
+    def _supersede(self, key, lookup):
+        previous = self.latest_lookups.get(key)
+        if previous is not None and not previous.done():
+            # Only cancels a lookup that hasn't started, a running one finishes in its thread
+            previous.cancel()
+        self.latest_lookups[key] = lookup
+
+    async def _wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
@@ -0,0 +1,256 @@
+"""
+Bulk import of persons, proposals and theses from CSV files.
+
+The columns of each file are the fields of the matching form (PersonDataForm, ProposalForm, ThesisForm), and
+every row is validated with that form. Related objects are written with their natural keys (the person type
+and statuses by name, terms by period, persons by cédula and proposals by code) and resolved with one query
+per column and batch. Valid rows are inserted with bulk_create, one transaction per batch, and the derived data
+that the models' save() and the signals would maintain (thesis codes and current status, status histories,
+search documents, data versions) is written for the whole batch.
+"""
+import csv
+from collections import namedtuple
+from django import forms as django_forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import forms, fulltext, versions
+from .models import HistoricProposalStatus, HistoricThesisStatus, PersonData, Proposal, Thesis
+
+BATCH_SIZE = 1_000
+
+RowError = namedtuple('RowError', ('line', 'message'))
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append(RowError(line, message))
+
+
+class ReferenceField(django_forms.Field):
+    """
+    Replaces a ModelChoiceField of the forms, looking the value up in the objects preloaded for the batch
+    instead of querying the database for every row.
+    """
+    widget = django_forms.TextInput
+
+    def __init__(self, objects, **kwargs):
+        self.objects = objects
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        value = (value or '').strip()
+        if value in self.empty_values:
+            return None
+        if value not in self.objects:
+            raise django_forms.ValidationError('No existe "%s"' % value)
+        return self.objects[value]
+
+
+class _ImportFormMixin:
+
+    def __init__(self, *args, references, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, objects in references.items():
+            field = self.fields[name]
+            self.fields[name] = ReferenceField(objects, label=field.label, required=field.required)
+
+    def validate_unique(self):
+        # Checked for the whole batch by the importer
+        pass
+
+
+class PersonDataImportForm(_ImportFormMixin, forms.PersonDataForm):
+    pass
+
+
+class ProposalImportForm(_ImportFormMixin, forms.ProposalForm):
+    pass
+
+
+class ThesisImportForm(_ImportFormMixin, forms.ThesisForm):
+
+    def save(self, commit=False):
+        # The status history is written by ThesisImporter for the whole batch
+        return super(forms.ThesisForm, self).save(commit=False)
+
+
+class Importer:
+    form_class = None
+    model = None
+    # Form field -> attribute of the related model that the CSV column holds
+    references = {}
+
+    def get_unique_values(self, instance):
+        """
+        (field, value) pairs that must not exist in the database nor be repeated in the file.
+        """
+        return [('pk', instance.pk)]
+
+    def prepare(self, instance, form):
+        """
+        Fill in what the model's save() would derive, before checking the duplicates.
+        """
+
+    def after_create(self, instances):
+        """
+        Write the data the signals and save() overrides would have maintained for the created rows.
+        """
+
+    def _load_references(self, rows):
+        references = {}
+        for name, attribute in self.references.items():
+            queryset = self.form_class.base_fields[name].queryset
+            model_field = queryset.model._meta.pk if attribute == 'pk' else queryset.model._meta.get_field(attribute)
+            values = set()
+            for row in rows:
+                try:
+                    values.add(model_field.to_python((row.get(name) or '').strip()))
+                except ValidationError:
+                    # Reported by the form as a missing reference
+                    pass
+            values.discard('')
+            references[name] = {str(getattr(instance, attribute)): instance
+                                for instance in queryset.filter(**{'%s__in' % attribute: values})}
+        return references
+
+    def _find_duplicates(self, candidates, seen):
+        """
+        Lines of the candidates that collide with a stored row or with an earlier row of the file.
+        """
+        duplicates = {}
+        by_field = {}
+        for line, instance in candidates:
+            for field, value in self.get_unique_values(instance):
+                if value:
+                    by_field.setdefault(field, {}).setdefault(value, []).append(line)
+        for field, lines_by_value in by_field.items():
+            existing = set(self.model.objects.filter(**{'%s__in' % field: list(lines_by_value)}).values_list(
+                field, flat=True))
+            column = self.model._meta.pk.name if field == 'pk' else field
+            for value, lines in lines_by_value.items():
+                for line in lines:
+                    if value in existing:
+                        duplicates[line] = 'Ya existe un registro con %s "%s"' % (column, value)
+                    elif (field, value) in seen:
+                        duplicates[line] = 'El valor "%s" de %s está repetido en el archivo' % (value, column)
+                    seen.add((field, value))
+        return duplicates
+
+    def import_batch(self, numbered_rows, result, seen, dry_run=False):
+        references = self._load_references([row for _, row in numbered_rows])
+        candidates = []
+        for line, row in numbered_rows:
+            form = self.form_class(data=row, references=references)
+            if not form.is_valid():
+                for field, messages in form.errors.items():
+                    label = form.fields[field].label if field in form.fields else field
+                    result.add_error(line, '%s: %s' % (label, ' '.join(messages)))
+                continue
+            instance = form.save(commit=False)
+            self.prepare(instance, form)
+            candidates.append((line, instance))
+        duplicates = self._find_duplicates(candidates, seen)
+        instances = []
+        for line, instance in candidates:
+            if line in duplicates:
+                result.add_error(line, duplicates[line])
+            else:
+                instances.append(instance)
+        if dry_run or not instances:
+            # A dry run counts the rows that would be created
+            result.created += len(instances) if dry_run else 0
+            return
+        with transaction.atomic():
+            self.model.objects.bulk_create(instances)
+            self.after_create(instances)
+            # Bumped with each batch, a later batch failing doesn't leave the committed rows behind the caches
+            versions.bump_version(self.model)
+        result.created += len(instances)
+
+    def run(self, lines, dry_run=False):
+        """
+        Import the rows of a CSV file given as an iterable of text lines, returns an ImportResult.
+        """
+        result = ImportResult()
+        seen = set()
+        reader = csv.DictReader(lines)
+        batch = []
+        for row in reader:
+            # Last line of the row in the file, quoted values may span several
+            batch.append((reader.line_num, row))
+            if len(batch) == BATCH_SIZE:
+                self.import_batch(batch, result, seen, dry_run)
+                batch = []
+        if batch:
+            self.import_batch(batch, result, seen, dry_run)
+        return result
+
+
+class PersonImporter(Importer):
+    form_class = PersonDataImportForm
+    model = PersonData
+    references = {'type': 'name'}
+
+    def get_unique_values(self, instance):
+        return [('pk', instance.pk), ('ucab_email', instance.ucab_email)]
+
+    def prepare(self, person, form):
+        # Store a missing UCAB email as NULL so it doesn't collide with the other ones in the unique index
+        person.ucab_email = person.ucab_email or None
+
+
+class ProposalImporter(Importer):
+    form_class = ProposalImportForm
+    model = Proposal
+    references = {
+        'student1': 'pk',
+        'student2': 'pk',
+        'academic_tutor': 'pk',
+        'industry_tutor': 'pk',
+        'term': 'period',
+        'proposal_status': 'name',
+    }
+
+    def after_create(self, instances):
+        # What Proposal.save does for a single proposal
+        statuses = [HistoricProposalStatus(proposal=proposal, status=proposal.proposal_status)
+                    for proposal in instances]
+        HistoricProposalStatus.objects.bulk_create(statuses)
+        versions.bump_version(HistoricProposalStatus)
+        fulltext.index_proposals([proposal.code for proposal in instances])
+
+
+class ThesisImporter(Importer):
+    form_class = ThesisImportForm
+    model = Thesis
+    references = {
+        'proposal': 'pk',
+        'status': 'name',
+        'delivery_term': 'period',
+    }
+
+    def prepare(self, thesis, form):
+        # What Thesis.save and ThesisForm.save do for a single thesis
+        thesis.code = 'TG{}'.format(thesis.proposal.code)
+        if not thesis.title:
+            thesis.title = thesis.proposal.title
+        thesis.current_status = form.cleaned_data['status']
+
+    def after_create(self, instances):
+        statuses = [HistoricThesisStatus(thesis=thesis, status=thesis.current_status) for thesis in instances]
+        HistoricThesisStatus.objects.bulk_create(statuses)
+        versions.bump_version(HistoricThesisStatus)
+        fulltext.index_theses([thesis.code for thesis in instances])
+
+
+IMPORTERS = {
+    'persons': PersonImporter,
+    'proposals': ProposalImporter,
+    'theses': ThesisImporter,
+}
@@ -0,0 +1,136 @@
+"""
+Everything a person took part in: proposals (as a student or tutor), their theses and defences, and juries.
+
+The rows come from one UNION ALL query with a branch per foreign key of Proposal to PersonData (student1,
+student2, academic_tutor, industry_tutor) and one for Jury, each filtered on an indexed column and joined to
+the thesis and defence of the proposal. Its cost depends on the rows of the person, not on the size of the
+tables, and the grouped result is cached per person until one of the INVOLVEMENT_MODELS changes, so the pages of
+tutors with hundreds of theses are built once.
+"""
+from collections import OrderedDict, namedtuple
+from django.db.models import Case, CharField, Value, When
+
+from . import versions
+from .caching import LRUCache
+from .models import Defence, Jury, Proposal, ProposalStatus, Term, Thesis, ThesisStatus
+
+# Models whose writes can change the involvement of a person, the person detail page is versioned on them
+INVOLVEMENT_MODELS = (Proposal, ProposalStatus, Term, Thesis, ThesisStatus, Defence, Jury)
+
+ROLES = OrderedDict([
+    ('student1', 'Estudiante'),
+    ('student2', 'Estudiante'),
+    ('academic_tutor', 'Tutor académico'),
+    ('industry_tutor', 'Tutor empresarial'),
+    ('judge', 'Jurado principal'),
+    ('backup_judge', 'Jurado suplente'),
+])
+
+_FIELDS = ('code', 'title', 'term__period', 'proposal_status__name', 'thesis__code', 'thesis__delivery_term__period',
+           'thesis__current_status__name', 'thesis__defence__code', 'thesis__defence__date_time',
+           'thesis__defence__grade')
+
+_SECTIONS = (('proposals', 'Propuestas'), ('theses', 'Trabajos de grado'), ('defences', 'Defensas'),
+             ('juries', 'Jurados'))
+
+# One row of the query: a proposal, its thesis and defence (None when they don't exist yet) and the role of the
+# person in it
+class Involvement(namedtuple('Involvement', ('proposal', 'title', 'proposal_term', 'proposal_status', 'thesis',
+                                             'thesis_term', 'thesis_status', 'defence', 'date_time', 'grade',
+                                             'role'))):
+
+    def get_role_display(self):
+        return ROLES[self.role]
+
+
+class TermInvolvement:
+    """
+    What a person did in one term. Proposals belong to the term they were submitted in, theses, defences and
+    juries to the delivery term of the thesis.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.proposals = []
+        self.theses = []
+        self.defences = []
+        self.juries = []
+
+    def get_counts(self):
+        return [(label, len(getattr(self, section))) for section, label in _SECTIONS]
+
+
+class PersonInvolvement:
+
+    def __init__(self, rows):
+        terms = {}
+
+        def get_term(period):
+            if period not in terms:
+                terms[period] = TermInvolvement(period)
+            return terms[period]
+
+        for row in rows:
+            if row.role in ('judge', 'backup_judge'):
+                get_term(row.thesis_term).juries.append(row)
+                continue
+            get_term(row.proposal_term).proposals.append(row)
+            if row.thesis:
+                get_term(row.thesis_term).theses.append(row)
+            if row.defence:
+                get_term(row.thesis_term).defences.append(row)
+        for term in terms.values():
+            term.proposals.sort(key=lambda row: row.proposal)
+            term.theses.sort(key=lambda row: row.thesis)
+            term.defences.sort(key=lambda row: row.date_time)
+            term.juries.sort(key=lambda row: row.date_time)
+        # The latest term first
+        self.terms = [terms[period] for period in sorted(terms, reverse=True)]
+
+    def get_totals(self):
+        return [(label, sum(len(getattr(term, section)) for term in self.terms)) for section, label in _SECTIONS]
+
+
+_involvement = LRUCache(maxsize=256)
+
+
+def _role(name):
+    return Value(name, output_field=CharField())
+
+
+def involvement_queryset(person):
+    """
+    UNION ALL of the proposals and juries of a person (id card number), rows in the Involvement order.
+    """
+    branches = [Proposal.objects.filter(**{field: person}).annotate(role=_role(field)).values_list(
+        *_FIELDS, 'role') for field in ('student1', 'student2', 'academic_tutor', 'industry_tutor')]
+    judge_fields = ['defence__thesis__proposal__' + field for field in _FIELDS[:4]]
+    judge_fields += ['defence__thesis__code', 'defence__thesis__delivery_term__period',
+                     'defence__thesis__current_status__name', 'defence__code', 'defence__date_time', 'defence__grade']
+    role = Case(When(is_backup_jury=True, then=_role('backup_judge')), default=_role('judge'))
+    branches.append(Jury.objects.filter(person=person).annotate(role=role).values_list(*judge_fields, 'role'))
+    # Each branch returns different rows, UNION ALL saves the duplicate elimination
+    return branches[0].union(*branches[1:], all=True)
+
+
+def load_involvement(person):
+    """
+    Involvement rows of a person (id card number), with a single query.
+    """
+    return [Involvement(*row) for row in involvement_queryset(person)]
+
+
+def get_involvement(person):
+    """
+    PersonInvolvement of a person (id card number), cached until one of the INVOLVEMENT_MODELS changes.
+    """
+    key = (person, versions.get_versions(*INVOLVEMENT_MODELS))
+    involvement = _involvement.get(key)
+    if involvement is None:
+        involvement = PersonInvolvement(load_involvement(person))
+        _involvement.set(key, involvement)
+    return involvement
+
+
+def clear_cache():
+    _involvement.clear()
@@ -0,0 +1,364 @@
+import operator
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import F, Prefetch, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.functional import cached_property
+from functools import reduce
+
+from . import counting, fulltext
+from .models import Defence, Jury, Proposal, ProposalStatus, SearchDocument, Thesis
+
+DEFAULT_PAGE_LENGTH = 15
+MAX_PAGE_LENGTH = 100
+_KEYSET_SALT = 'web.listing.keyset'
+
+
+def get_page_length(request):
+    """
+    Rows per page asked for with the page_length parameter, between 1 and MAX_PAGE_LENGTH.
+    """
+    try:
+        page_length = int(request.GET.get('page_length', DEFAULT_PAGE_LENGTH))
+    except ValueError:
+        return DEFAULT_PAGE_LENGTH
+    return max(1, min(page_length, MAX_PAGE_LENGTH))
+
+
+def is_keyset_request(request):
+    return request.GET.get('pagination') == 'keyset' or 'after' in request.GET or 'before' in request.GET
+
+
+def _is_nullable(model, path):
+    """
+    Whether the field at the end of the lookup ``path`` can be NULL, through a nullable relation included.
+    Anything that isn't a concrete field (annotations, extra selects, reverse relations) counts as nullable.
+    """
+    for name in path.split(LOOKUP_SEP):
+        if name == 'pk':
+            field = model._meta.pk
+        else:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return True
+        if not field.concrete or field.null:
+            return True
+        if field.is_relation:
+            model = field.related_model
+    return False
+
+
+class KeysetPage:
+    """
+    Page of a KeysetPaginator. There is no page number nor count, only the tokens of the neighbour pages.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, next_token=None, previous_token=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+
+class KeysetPaginator:
+    """
+    Seek pagination: a page starts right after (or ends right before) the ordering key of a row, given as an
+    opaque signed token, so reaching any page costs the same as the first one and no COUNT is run.
+
+    The queryset must be ordered by plain non-null fields, ``supported`` is False otherwise: NULL keys can't be
+    compared, rows would be skipped or repeated between pages. The primary key is added to the ordering when it
+    isn't there, to keep the key of every row unique.
+    """
+
+    def __init__(self, queryset, page_length):
+        self.page_length = page_length
+        ordering = list(queryset.query.order_by)
+        self.supported = all(isinstance(field, str) and not _is_nullable(queryset.model, field.lstrip('-'))
+                             for field in ordering)
+        if not any(field.lstrip('-') in ('pk', queryset.model._meta.pk.name) for field in ordering
+                   if isinstance(field, str)):
+            ordering.append('pk')
+        self.ordering = ordering
+        self.queryset = queryset
+        if self.supported:
+            self.queryset = queryset.order_by(*ordering).annotate(**{
+                'keyset_%d' % index: F(field.lstrip('-')) for index, field in enumerate(ordering)})
+
+    def _row_key(self, row):
+        return [getattr(row, 'keyset_%d' % index) for index in range(len(self.ordering))]
+
+    def _encode(self, row):
+        return signing.dumps(self._row_key(row), salt=_KEYSET_SALT, compress=True)
+
+    def _decode(self, token):
+        try:
+            key = signing.loads(token, salt=_KEYSET_SALT)
+        except signing.BadSignature:
+            return None
+        return key if isinstance(key, list) and len(key) == len(self.ordering) else None
+
+    def _seek(self, key, forward):
+        """
+        Rows after the key in the ordering (or before it, when not ``forward``), as a lexicographic comparison
+        of the ordering fields: a > x OR (a = x AND b > y) OR ...
+        """
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            ascending = (not field.startswith('-')) == forward
+            condition = Q(**{'%s__%s' % (name, 'gt' if ascending else 'lt'): key[index]})
+            for previous_index, previous_field in enumerate(self.ordering[:index]):
+                condition &= Q(**{previous_field.lstrip('-'): key[previous_index]})
+            conditions.append(condition)
+        return self.queryset.filter(reduce(operator.or_, conditions))
+
+    def get_page(self, after=None, before=None):
+        after_key = self._decode(after) if after else None
+        before_key = self._decode(before) if before and not after_key else None
+        if before_key:
+            reverse_ordering = [field[1:] if field.startswith('-') else '-' + field for field in self.ordering]
+            rows = list(self._seek(before_key, forward=False).order_by(*reverse_ordering)[:self.page_length + 1])
+            has_previous = len(rows) > self.page_length
+            rows = rows[:self.page_length][::-1]
+            has_next = True
+        else:
+            queryset = self._seek(after_key, forward=True) if after_key else self.queryset
+            rows = list(queryset[:self.page_length + 1])
+            has_next = len(rows) > self.page_length
+            rows = rows[:self.page_length]
+            has_previous = after_key is not None
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(rows, next_token=self._encode(rows[-1]) if has_next else None,
+                          previous_token=self._encode(rows[0]) if has_previous else None)
+
+
+class CountedPage(Page):
+    """
+    Page of a CountedPaginator whose total is unknown, has_next comes from fetching one row more than the page.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator that takes its count from web.counting: cached while the data doesn't change, and only up to
+    COUNT_LIMIT rows. Past that, ``count_is_estimate`` is True, the count is a lower bound and pages are served
+    without knowing how many there are.
+    """
+
+    def __init__(self, object_list, per_page, count_limit=counting.COUNT_LIMIT, **kwargs):
+        self.count_limit = count_limit
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def _count(self):
+        return counting.count_queryset(self.object_list, self.count_limit)
+
+    @cached_property
+    def count(self):
+        return self._count[0]
+
+    @property
+    def count_is_estimate(self):
+        return not self._count[1]
+
+    def validate_number(self, number):
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer') from None
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return CountedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Past the end of a set bigger than the count limit, its first count_limit rows are known to exist
+            return self.page(self.num_pages)
+
+
+def paginate(request, queryset, keyset=False):
+    """
+    Page of the queryset asked for in the request: a KeysetPage when the view offers it (``keyset``), the request
+    opts in with the pagination, after or before parameters and the ordering allows it, a CountedPaginator page
+    otherwise.
+    """
+    page_length = get_page_length(request)
+    if keyset and is_keyset_request(request):
+        paginator = KeysetPaginator(queryset, page_length)
+        if paginator.supported:
+            return paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    return CountedPaginator(queryset, page_length).get_page(request.GET.get('page'))
+
+
+class ListQuery:
+    """
+    Builds the queryset of a list view (search, ordering and joins all in SQL) and paginates it
+    before any Python-side work, so only the rows of the visible page are loaded and decorated.
+    """
+
+    def __init__(self, queryset, search_lookups=(), search_kind=None, ordering=(), select_related=(), decorate=None):
+        self.queryset = queryset
+        self.search_lookups = search_lookups
+        # SearchDocument kind of the rows, when set the full-text index is used instead of the lookups
+        self.search_kind = search_kind
+        self.ordering = ordering
+        self.select_related = select_related
+        self.decorate = decorate
+
+    def get_queryset(self, search=None):
+        queryset = self.queryset.all()
+        ordering = self.ordering
+        if search and self.search_kind and fulltext.is_available():
+            # Best matches first, the regular ordering only breaks ties
+            queryset = fulltext.filter_queryset(queryset, search, self.search_kind)
+            ordering = ('search_rank',) + tuple(ordering)
+        elif search and self.search_lookups:
+            # Every term received in the search parameters must be found in at least one of the searchable columns
+            search_args = []
+            for term in search.split():
+                search_args.append(reduce(operator.or_, (Q(**{query: term}) for query in self.search_lookups)))
+            queryset = queryset.filter(reduce(operator.and_, search_args))
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def decorate_rows(self, rows):
+        rows = list(rows)
+        if self.decorate:
+            for row in rows:
+                self.decorate(row)
+        return rows
+
+    def paginate(self, request, queryset, keyset=False):
+        page = paginate(request, queryset, keyset=keyset)
+        # Page slices the queryset lazily, evaluate it once here so the decorated rows are the rendered ones
+        page.object_list = self.decorate_rows(page.object_list)
+        return page
+
+
+def add_full_names(thesis):
+    thesis.status = thesis.current_status
+    thesis.proposal.academic_tutor.full_name = "{} {}".format(thesis.proposal.academic_tutor.name,
+                                                              thesis.proposal.academic_tutor.last_name)
+    if thesis.proposal.industry_tutor:
+        thesis.proposal.industry_tutor.full_name = "{} {}".format(thesis.proposal.industry_tutor.name,
+                                                                  thesis.proposal.industry_tutor.last_name)
+    thesis.proposal.student1.full_name = "{} {}".format(thesis.proposal.student1.name,
+                                                        thesis.proposal.student1.last_name)
+    if thesis.proposal.student2:
+        thesis.proposal.student2.full_name = "{} {}".format(thesis.proposal.student2.name,
+                                                            thesis.proposal.student2.last_name)
+    return thesis
+
+
+THESIS_LIST = ListQuery(
+    Thesis.objects.all(),
+    search_lookups=(
+        'code__icontains', 'NRC__icontains', 'title__icontains', 'current_status__name__icontains',
+        'thematic_category__icontains', 'proposal__title__icontains',
+        'proposal__student1__name__icontains', 'proposal__student1__last_name__icontains',
+        'proposal__student1__id_card_number__icontains', 'proposal__student2__name__icontains',
+        'proposal__student2__last_name__icontains', 'proposal__student2__id_card_number__icontains',
+        'proposal__academic_tutor__name__icontains', 'proposal__academic_tutor__last_name__icontains',
+        'proposal__academic_tutor__id_card_number__icontains',
+        'proposal__industry_tutor__name__icontains', 'proposal__industry_tutor__last_name__icontains',
+        'proposal__industry_tutor__id_card_number__icontains', 'delivery_term__period__icontains',
+    ),
+    search_kind=SearchDocument.THESIS,
+    ordering=('proposal__student1__id_card_number', 'code'),
+    select_related=('proposal__student1', 'proposal__student2', 'proposal__academic_tutor',
+                    'proposal__industry_tutor', 'delivery_term', 'current_status'),
+    decorate=add_full_names,
+)
+
+
+PROPOSAL_LIST = ListQuery(
+    Proposal.objects.all(),
+    search_lookups=('code__icontains', 'title__icontains',),
+    search_kind=SearchDocument.PROPOSAL,
+    ordering=('code',),
+    select_related=('student1', 'student2', 'term', 'proposal_status'),
+)
+
+
+def proposals_not_approved():
+    """
+    Proposals in any status other than approved, by first student. Filtering on the other statuses (instead of
+    excluding the approved one) lets SQLite read them from the (proposal_status, student1) index.
+    """
+    other_statuses = ProposalStatus.objects.exclude(name='Aprobada')
+    return Proposal.objects.filter(proposal_status__in=other_statuses).order_by('student1')
+
+
+def defence_queryset(filter_completed, search):
+    """
+    Defences of the defence lists and exports, only the ones without a grade when ``filter_completed``.
+    """
+    order_params = [
+        'thesis__proposal__student1__id_card_number',
+        'thesis__proposal__student2__id_card_number',
+    ]
+    if search:
+        # Append a query for each term received in the search parameters so that if we receive multiple
+        # parameters, we crosscheck every single one with the colums id_card_number, name and last_name
+        search_args = []
+        for term in search.split():
+            for query in ('code__icontains', 'grade__icontains', 'thesis__title__icontains'):
+                search_args.append(Q(**{query: term}))
+        queryset = Defence.objects.filter(reduce(operator.or_, search_args))
+    else:
+        # If we don't receive a search parameter, don't apply any filters
+        queryset = Defence.objects.all()
+
+    if filter_completed:
+        queryset = queryset.filter(grade__isnull=True)
+
+    # Everything the defence list renders per row: the thesis/proposal/person chain is joined and the whole
+    # jury (principal and backup judges, read through Defence.get_jury_members and get_backup_judge) is
+    # loaded with a single extra query for the page
+    return queryset.select_related(
+        'thesis__delivery_term',
+        'thesis__proposal__student1',
+        'thesis__proposal__student2',
+        'thesis__proposal__academic_tutor',
+    ).prefetch_related(
+        Prefetch('jury_set', queryset=Jury.objects.select_related('person').order_by('pk'), to_attr='prefetched_jury'),
+    ).order_by(*order_params)
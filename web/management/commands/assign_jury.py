@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from web.assignment import commit_plan, plan_jury
+from web.models import Term
+
+
+class Command(BaseCommand):
+    help = ('Assigns judges and a backup judge to the pending defences of a term, balancing the juries of the '
+            'professors. Only shows the plan unless --commit is given')
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', help='Period of the term')
+        parser.add_argument('--commit', action='store_true', help='Write the assignment')
+
+    def handle(self, *args, **options):
+        try:
+            term = Term.objects.get(period=options['term'])
+        except Term.DoesNotExist:
+            raise CommandError('Term "%s" does not exist' % options['term'])
+        plan = plan_jury(term)
+        if options['commit']:
+            plan = commit_plan(term, plan.versions)
+        for defence_plan in plan.defences:
+            self.stdout.write('%s %s: %s; backup %s%s' % (
+                defence_plan.defence.code, defence_plan.defence.date_time.strftime('%Y-%m-%d %H:%M'),
+                ', '.join(defence_plan.judges) or '-', defence_plan.backup or '-',
+                ' (%d without candidate)' % defence_plan.missing if defence_plan.missing else ''))
+        loads = [after for _, _, after in plan.get_loads()]
+        if loads:
+            self.stdout.write('Juries per professor: %d to %d' % (min(loads), max(loads)))
+        self.stdout.write(self.style.SUCCESS('%s %d judges for %d defences, %d slots without candidate' % (
+            'Assigned' if options['commit'] else 'Planned', len(plan.assignments), len(plan.defences),
+            plan.get_missing())))
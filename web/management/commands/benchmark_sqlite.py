@@ -0,0 +1,153 @@
+import io
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+
+from web.listing import DEFAULT_PAGE_LENGTH, THESIS_LIST
+from web.models import Defence, Thesis
+
+# Options of Django's own SQLite backend: rollback journal, no busy_timeout pragma (the driver waits 5 seconds)
+# and deferred transactions
+STOCK_OPTIONS = {
+    'pragmas': {},
+    'transaction_mode': 'DEFERRED',
+    'begin_retries': 0,
+}
+
+
+class _Stats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.read_times = []
+        self.writes = 0
+        self.errors = 0
+
+    def add_read(self, duration):
+        with self.lock:
+            self.read_times.append(duration)
+
+    def add_write(self):
+        with self.lock:
+            self.writes += 1
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+
+class Command(BaseCommand):
+    help = ('Measures the read throughput of the thesis list while other threads load grades, with the stock '
+            'SQLite settings and with the configured ones')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--theses', type=int, default=2_000, help='Theses of the generated dataset')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark is only meaningful for SQLite')
+        directory = tempfile.mkdtemp()
+        database = os.path.join(directory, 'benchmark.sqlite3')
+        settings_dict = connections.databases['default']
+        configured_options = settings_dict['OPTIONS']
+        settings_dict['TEST']['NAME'] = database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            theses = options['theses']
+            call_command('generate_dataset', seed=options['seed'], theses=theses, proposals=theses * 3 // 2,
+                         persons=theses * 2, defences=theses, terms=8, stdout=io.StringIO())
+            self.defence_codes = list(Defence.objects.values_list('code', flat=True))
+            self.thesis_count = Thesis.objects.count()
+            runs = (
+                ('stock', STOCK_OPTIONS, 'DELETE'),
+                ('configured', configured_options, configured_options.get('pragmas', {}).get('journal_mode',
+                                                                                              'DELETE')),
+            )
+            for name, database_options, journal_mode in runs:
+                connection.close()
+                # The journal mode is stored in the file and can only change while nobody else is connected
+                with sqlite3.connect(database) as raw_connection:
+                    raw_connection.execute('PRAGMA journal_mode = %s' % journal_mode)
+                raw_connection.close()
+                settings_dict['OPTIONS'] = database_options
+                try:
+                    stats = self.run(options)
+                finally:
+                    settings_dict['OPTIONS'] = configured_options
+                self.report(name, stats, options['seconds'])
+        finally:
+            connection.close()
+            settings_dict['OPTIONS'] = configured_options
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, options):
+        stats = _Stats()
+        deadline = time.perf_counter() + options['seconds']
+        threads = [threading.Thread(target=self.read, args=(stats, deadline, seed))
+                   for seed in range(options['readers'])]
+        threads += [threading.Thread(target=self.write, args=(stats, deadline, seed))
+                    for seed in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def read(self, stats, deadline, seed):
+        generator = random.Random(seed)
+        queryset = THESIS_LIST.get_queryset()
+        try:
+            while time.perf_counter() < deadline:
+                offset = generator.randrange(max(1, self.thesis_count - DEFAULT_PAGE_LENGTH))
+                start = time.perf_counter()
+                try:
+                    list(queryset[offset:offset + DEFAULT_PAGE_LENGTH])
+                except OperationalError:
+                    stats.add_error()
+                    continue
+                stats.add_read(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def write(self, stats, deadline, seed):
+        generator = random.Random(-1 - seed)
+        try:
+            while time.perf_counter() < deadline:
+                code = generator.choice(self.defence_codes)
+                try:
+                    # Like loading a grade from the form: read the defence, then write it
+                    with transaction.atomic():
+                        grade = Defence.objects.values_list('grade', flat=True).get(pk=code)
+                        time.sleep(0.002)
+                        Defence.objects.filter(pk=code).update(grade=F('grade') if grade is not None else None)
+                except OperationalError:
+                    stats.add_error()
+                    continue
+                stats.add_write()
+        finally:
+            connections.close_all()
+
+    def report(self, name, stats, seconds):
+        reads = stats.read_times
+        if reads:
+            ordered = sorted(reads)
+            latency = 'median %.1f ms, p95 %.1f ms, max %.1f ms' % (
+                statistics.median(ordered) * 1000, ordered[int(len(ordered) * 0.95)] * 1000, ordered[-1] * 1000)
+        else:
+            latency = 'no reads'
+        self.stdout.write('%-10s %8.1f reads/s (%s), %6.1f writes/s, %d "database is locked" errors' % (
+            name, len(reads) / seconds, latency, stats.writes / seconds, stats.errors))
@@ -0,0 +1,136 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from web import benchmarks, conflicts, counting, exports, involvement, timeline, views
+from web.autocomplete_index import person_search_index
+from web.models import ExportJob, User
+
+
+class Command(BaseCommand):
+    help = ('Measures the time and SQL queries of the main views on generated datasets of several sizes, '
+            'failing when a view goes over its query budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated numbers of theses of the generated datasets')
+        parser.add_argument('--repeat', type=int, default=3, help='Measured requests per view, after a cold one')
+        parser.add_argument('--case', action='append', dest='cases', help='Only run the cases with this name')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--render-pdfs', action='store_true',
+                            help='Also time the rendering of the PDF exports queued by the PDF views')
+        parser.add_argument('--output', default='benchmark-results.json', help='JSON file for the results')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of numbers')
+        cases = [case for case in benchmarks.CASES if not options['cases'] or case.name in options['cases']]
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results': [],
+        }
+        failures = []
+        # Rendered exports are named after the data versions, which would collide with the real ones
+        export_root = tempfile.mkdtemp()
+        database_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            # Nothing here needs the configured database: point the connection away from it before anything
+            # opens it, so neither this thread nor a background one (the autocomplete index builds) creates or
+            # writes it, between the test databases or after the last one is destroyed
+            connection.close()
+            connection.settings_dict['NAME'] = os.path.join(export_root, 'unused.sqlite3')
+            # A file instead of the shared in-memory database, which outlives destroy_test_db and is a poor
+            # stand-in for the real one
+            connection.settings_dict['TEST']['NAME'] = os.path.join(export_root, 'benchmark.sqlite3')
+        setup_test_environment()
+        try:
+            for size in sizes:
+                with override_settings(EXPORT_ROOT=export_root, SQL_INSTRUMENTATION=False):
+                    results = self.run_size(size, cases, options)
+                for result in results:
+                    row = dict(result._asdict(), size=size)
+                    row['over_budget'] = result.budget is not None and result.queries > result.budget
+                    report['results'].append(row)
+                    if row['over_budget']:
+                        failures.append('%s with %d theses: %d queries, budget %d' % (
+                            result.name, size, result.queries, result.budget))
+                    elif result.status is not None and result.status >= 400:
+                        failures.append('%s with %d theses: HTTP %d' % (result.name, size, result.status))
+        finally:
+            teardown_test_environment()
+            connection.close()
+            connection.settings_dict['NAME'] = database_name
+            shutil.rmtree(export_root, ignore_errors=True)
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write('Results written to %s' % options['output'])
+        if failures:
+            raise CommandError('Benchmark failures:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All views within their query budgets'))
+
+    def run_size(self, size, cases, options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Generating a dataset with %d theses' % size)
+            start = time.perf_counter()
+            call_command('generate_dataset', seed=options['seed'], theses=size, proposals=size * 3 // 2,
+                         persons=size * 2, defences=size * 3 // 4, terms=12, stdout=io.StringIO())
+            self.stdout.write('  generated in %.1fs' % (time.perf_counter() - start))
+            person_search_index.build()
+            # The in-process caches are keyed on data versions, which start over with every test database
+            conflicts.clear_cache()
+            counting.clear_cache()
+            involvement.clear_cache()
+            timeline.clear_cache()
+            cache.clear()
+            views.ProposalAutocomplete.results_cache.clear()
+            # Errors are reported as the status of the case instead of stopping the run
+            client = Client(raise_request_exception=False)
+            client.force_login(User.objects.create_user('benchmark', is_manager=True))
+            results = []
+            for case in cases:
+                result = benchmarks.run_case(client, case, options['repeat'])
+                self.write_result(result)
+                results.append(result)
+            if options['render_pdfs']:
+                results.extend(self.render_pdfs())
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def render_pdfs(self):
+        results = []
+        for job_id in exports.claim_pending_jobs(limit=len(exports.REPORTS)):
+            report = ExportJob.objects.values_list('report', flat=True).get(pk=job_id)
+            start = time.perf_counter()
+            exports.run_job(job_id)
+            elapsed = round((time.perf_counter() - start) * 1000, 2)
+            result = benchmarks.CaseResult('render_%s' % report, None, None, None, elapsed, elapsed, elapsed,
+                                           elapsed)
+            self.write_result(result)
+            results.append(result)
+        return results
+
+    def write_result(self, result):
+        line = '  %-28s %8.1f ms (cold %8.1f ms)' % (result.name, result.median_ms, result.cold_ms)
+        if result.queries is None:
+            self.stdout.write(line)
+        elif result.queries > result.budget:
+            self.stdout.write(self.style.ERROR('%s %4d queries, budget %d' % (line, result.queries, result.budget)))
+        else:
+            self.stdout.write('%s %4d queries' % (line, result.queries))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from web import queryplans
+
+
+class Command(BaseCommand):
+    help = 'Checks that the hot queries of the views use an index instead of scanning whole tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The plans are only checked on SQLite')
+        failures = []
+        for hot_query in queryplans.get_hot_queries():
+            plan = queryplans.explain(hot_query.queryset)
+            scans = queryplans.find_scans(plan, hot_query.allowed_scans)
+            if scans:
+                failures.append(hot_query.name)
+                self.stdout.write(self.style.ERROR('%s: full scan of %s' % (hot_query.name, ', '.join(scans))))
+            else:
+                self.stdout.write(self.style.SUCCESS('%s: OK' % hot_query.name))
+            if options['verbose_plans'] or scans:
+                for _, _, detail in plan:
+                    self.stdout.write('    %s' % detail)
+        if failures:
+            raise CommandError('%d queries scan whole tables: %s' % (len(failures), ', '.join(failures)))
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from faker import Faker
 
 from web.models import Thesis, ThesisStatus, Term, Proposal, HistoricThesisStatus
@@ -28,10 +29,11 @@ class Command(BaseCommand):
                 submission_date=loc_faker.date_time_between(start_date=proposal.submission_date, end_date='now'),
                 company_name=loc_faker.company()
             )
-            thesis.save()
-
-            HistoricThesisStatus(
-                thesis=thesis,
-                status=faker.random.choice(list(thesis_statuses))
-            ).save()
+            # Saving the status history also updates Thesis.current_status
+            with transaction.atomic():
+                thesis.save()
+                HistoricThesisStatus(
+                    thesis=thesis,
+                    status=faker.random.choice(list(thesis_statuses))
+                ).save()
         self.stdout.write(self.style.SUCCESS('Successfully created Thesis'))
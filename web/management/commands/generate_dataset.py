@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import itertools
+import random
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from web import fulltext, grades, versions
+from web.models import (Defence, HistoricProposalStatus, HistoricThesisStatus, Jury, PersonData, PersonType,
+                        Proposal, ProposalStatus, Term, Thesis, ThesisStatus)
+
+# Rows handed to each bulk_create call, every chunk is written in its own transaction
+CHUNK_SIZE = 5_000
+# Fraction of the generated persons of each type
+PERSON_TYPE_WEIGHTS = (('Estudiante', 80), ('Profesor', 15), ('Externo', 5))
+# Faker is slow compared to the inserts, names are combined from pools generated once
+NAME_POOL_SIZE = 500
+
+
+def _chunks(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bulk_insert(model, objects):
+    count = 0
+    for chunk in _chunks(objects):
+        with transaction.atomic():
+            model.objects.bulk_create(chunk)
+        count += len(chunk)
+    return count
+
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError('Expected a date as YYYY-MM-DD')
+
+
+def _start_of(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+class Command(BaseCommand):
+    help = 'Generates a consistent fake dataset of the given size, for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--persons', type=int, default=1_000)
+        parser.add_argument('--proposals', type=int, default=300)
+        parser.add_argument('--theses', type=int, default=200)
+        parser.add_argument('--defences', type=int, default=100)
+        parser.add_argument('--terms', type=int, default=8)
+        parser.add_argument('--seed', type=int,
+                            help='Seed of the generator, the same seed and --today build the same data')
+        parser.add_argument('--today', type=_parse_date, default=None,
+                            help='Reference date (YYYY-MM-DD) of the terms and defences, by default the current one')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        # Every date is relative to the start of the reference day, so a seed builds the same data on any day
+        self.today = _start_of(options['today'] or timezone.localdate())
+        self.faker = Faker('es_ES')
+        self.faker.seed_instance(options['seed'])
+        self.first_names = [self.faker.first_name() for _ in range(NAME_POOL_SIZE)]
+        self.last_names = [self.faker.last_name() for _ in range(NAME_POOL_SIZE)]
+        self.words = sorted({word for _ in range(NAME_POOL_SIZE) for word in self.faker.words(nb=4)})
+
+        terms = self.create_terms(options['terms'])
+        persons_by_type = self.create_persons(options['persons'])
+        if options['proposals'] and not terms:
+            raise CommandError('Proposals need at least one term')
+        for type_name in ('Estudiante', 'Profesor'):
+            if options['proposals'] and not persons_by_type.get(type_name):
+                raise CommandError('Proposals need at least one generated person of type %s' % type_name)
+        proposals = self.create_proposals(options['proposals'], persons_by_type, terms)
+        theses = self.create_theses(options['theses'], proposals, terms)
+        defences = self.create_defences(options['defences'], theses, persons_by_type.get('Profesor', []))
+
+        self.stdout.write('Rebuilding derived data')
+        fulltext.rebuild()
+        grades.rebuild()
+        for model in (Term, PersonData, Proposal, HistoricProposalStatus, Thesis, HistoricThesisStatus, Defence,
+                      Jury):
+            versions.bump_version(model)
+        self.stdout.write(self.style.SUCCESS(
+            'Successfully created %d terms, %d persons, %d proposals, %d theses and %d defences' % (
+                len(terms), sum(len(persons) for persons in persons_by_type.values()), len(proposals),
+                len(theses), len(defences))))
+
+    def _sentence(self, words):
+        return ' '.join(self.random.choice(self.words) for _ in range(words)).capitalize() + '.'
+
+    def create_terms(self, count):
+        """
+        Consecutive periods (15 and 25 of every year) ending in the reference year, reusing the existing ones.
+        """
+        first_year = self.today.year - (count + 1) // 2
+        periods = [int('%d%d5' % (first_year + number // 2, number % 2 + 1)) for number in range(count)]
+        existing = set(Term.objects.filter(period__in=periods).values_list('period', flat=True))
+        _bulk_insert(Term, (Term(period=period) for period in periods if period not in existing))
+        return list(Term.objects.filter(period__in=periods).order_by('period'))
+
+    def create_persons(self, count):
+        person_types = dict(PersonType.objects.values_list('name', 'id'))
+        weights = [(person_types[name], weight) for name, weight in PERSON_TYPE_WEIGHTS if name in person_types]
+        if count and not weights:
+            raise CommandError('The default person types are missing')
+        existing = set(PersonData.objects.values_list('id_card_number', flat=True))
+        numbers = self.random.sample(range(1_000_000, 30_000_000), count + len(existing))
+        id_card_numbers = [card for card in ('V%d' % number for number in numbers) if card not in existing][:count]
+        type_ids = self.random.choices([type_id for type_id, _ in weights], [weight for _, weight in weights],
+                                       k=count)
+
+        def build():
+            for id_card_number, type_id in zip(id_card_numbers, type_ids):
+                name = self.random.choice(self.first_names)
+                last_name = self.random.choice(self.last_names)
+                user = '%s.%s.%s' % (name.split()[0], last_name.split()[0], id_card_number[1:])
+                yield PersonData(
+                    type_id=type_id,
+                    id_card_number=id_card_number,
+                    name=name,
+                    last_name=last_name,
+                    ucab_email='%s@ucab.edu.ve' % user.lower(),
+                    email='%s@example.com' % user.lower(),
+                    primary_phone_number='+58 4%02d %07d' % (self.random.randint(12, 26),
+                                                            self.random.randint(0, 9_999_999)),
+                )
+
+        _bulk_insert(PersonData, build())
+        names = {type_id: name for name, type_id in person_types.items()}
+        persons_by_type = {}
+        for id_card_number, type_id in zip(id_card_numbers, type_ids):
+            persons_by_type.setdefault(names[type_id], []).append(id_card_number)
+        return persons_by_type
+
+    def create_proposals(self, count, persons_by_type, terms):
+        statuses = dict(ProposalStatus.objects.values_list('name', 'id'))
+        status_ids = list(statuses.values())
+        approved_id = statuses.get('Aprobada', status_ids[0] if status_ids else None)
+        existing = set(Proposal.objects.values_list('code', flat=True))
+        codes = [code for code in ('P%07d' % number for number in range(1, count + len(existing) + 1))
+                 if code not in existing][:count]
+        students = persons_by_type.get('Estudiante', [])
+        teachers = persons_by_type.get('Profesor', [])
+        externals = persons_by_type.get('Externo', [])
+        rows = []
+        for code in codes:
+            pair = self.random.sample(students, min(2, len(students)))
+            term = self.random.choice(terms)
+            rows.append({
+                'code': code,
+                'submission_date': datetime.date(term.period // 100, 1, 1) + datetime.timedelta(
+                    days=self.random.randint(0, 300)),
+                'title': self._sentence(6),
+                'student1_id': pair[0],
+                'student2_id': pair[1] if len(pair) > 1 and self.random.random() < 0.3 else None,
+                'academic_tutor_id': self.random.choice(teachers),
+                'industry_tutor_id': self.random.choice(externals) if externals and self.random.random() < 0.5
+                else None,
+                'term_id': term.pk,
+                # Most proposals end up approved, the theses are generated from those
+                'proposal_status_id': approved_id if self.random.random() < 0.7 else self.random.choice(status_ids),
+            })
+        _bulk_insert(Proposal, (Proposal(**row) for row in rows))
+        _bulk_insert(HistoricProposalStatus, (HistoricProposalStatus(proposal_id=row['code'],
+                                                                     status_id=row['proposal_status_id'],
+                                                                     date=_start_of(row['submission_date']))
+                                              for row in rows))
+        return rows
+
+    def create_theses(self, count, proposals, terms):
+        statuses = list(ThesisStatus.objects.values_list('id', flat=True))
+        candidates = list(proposals)
+        self.random.shuffle(candidates)
+        # Approved proposals first, they are the ones that normally become theses
+        approved_id = ProposalStatus.objects.filter(name='Aprobada').values_list('id', flat=True).first()
+        candidates.sort(key=lambda row: row['proposal_status_id'] != approved_id)
+        term_by_id = {term.pk: term for term in terms}
+        rows = []
+        for proposal in candidates[:count]:
+            proposal_term = term_by_id[proposal['term_id']]
+            later_terms = [term for term in terms if term.period >= proposal_term.period]
+            # Status history of one to three entries, the last one is the current status
+            history = self.random.sample(statuses, self.random.randint(1, min(3, len(statuses))))
+            rows.append({
+                'code': 'TG%s' % proposal['code'],
+                'proposal_id': proposal['code'],
+                'title': proposal['title'],
+                'delivery_term_id': self.random.choice(later_terms).pk,
+                'NRC': str(self.random.randint(10_000, 99_999)),
+                'description': self._sentence(20),
+                'thematic_category': self._sentence(2),
+                'submission_date': proposal['submission_date'] + datetime.timedelta(
+                    days=self.random.randint(30, 200)),
+                'company_name': self.faker.company() if proposal['industry_tutor_id'] else None,
+                'current_status_id': history[-1],
+                'history': history,
+            })
+        _bulk_insert(Thesis, (Thesis(**{key: value for key, value in row.items() if key != 'history'})
+                              for row in rows))
+        _bulk_insert(HistoricThesisStatus, (HistoricThesisStatus(thesis_id=row['code'], status_id=status_id, date=date)
+                                            for row in rows for status_id, date in self._history_dates(row)))
+        return rows
+
+    def _history_dates(self, thesis):
+        # The first status from the submission date, each of the next ones some weeks after the previous one
+        date = _start_of(thesis['submission_date'])
+        for status_id in thesis['history']:
+            yield status_id, date
+            date += datetime.timedelta(days=self.random.randint(10, 120))
+
+    def create_defences(self, count, theses, teachers):
+        academic_tutors = dict(Proposal.objects.filter(
+            code__in=[row['proposal_id'] for row in theses]).values_list('code', 'academic_tutor'))
+        rows = []
+        for thesis in self.random.sample(theses, min(count, len(theses))):
+            date_time = self.today + datetime.timedelta(days=self.random.randint(-720, 60),
+                                                   hours=self.random.randint(8, 17))
+            tutor = academic_tutors[thesis['proposal_id']]
+            # Two more principal judges and a backup one, none of them the tutor
+            judges = [teacher for teacher in self.random.sample(teachers, min(4, len(teachers)))
+                      if teacher != tutor][:3]
+            rows.append({
+                'code': 'D%s' % thesis['code'],
+                'thesis_id': thesis['code'],
+                'date_time': date_time,
+                # Only the defences before the reference day are graded
+                'grade': min(20, max(0, round(self.random.gauss(15, 3)))) if date_time < self.today else None,
+                'was_grade_loaded': date_time < self.today,
+                'jury': [(tutor, False)] + [(judge, False) for judge in judges[:2]] + [
+                    (judge, True) for judge in judges[2:]],
+            })
+        _bulk_insert(Defence, (Defence(**{key: value for key, value in row.items() if key != 'jury'})
+                               for row in rows))
+        _bulk_insert(Jury, (Jury(defence_id=row['code'], person_id=person, is_backup_jury=is_backup,
+                                 confirmed_assistance=row['grade'] is not None)
+                            for row in rows for person, is_backup in row['jury']))
+        return rows
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from web.importer import IMPORTERS
+
+
+class Command(BaseCommand):
+    help = 'Imports persons, proposals or theses from a CSV file whose columns are the fields of their forms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='CSV file, UTF-8 encoded, with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as csv_file:
+                result = IMPORTERS[options['kind']]().run(csv_file, dry_run=options['dry_run'])
+        except OSError as error:
+            raise CommandError(error)
+        for error in result.errors:
+            self.stderr.write('Line %d: %s' % (error.line, error.message))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('%d valid rows, %d errors' % (result.created, len(result.errors))))
+        else:
+            self.stdout.write(self.style.SUCCESS('Successfully imported %d rows, %d errors' %
+                                                 (result.created, len(result.errors))))
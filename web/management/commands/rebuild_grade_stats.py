@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from web import grades
+from web.models import TermGradeStats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per term defence grade aggregates used by the statistics page'
+
+    def handle(self, *args, **options):
+        grades.rebuild()
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt the grades of %d terms' %
+                                             TermGradeStats.objects.count()))
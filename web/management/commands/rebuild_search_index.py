@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from web import fulltext
+from web.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Regenerates the full-text search index of theses and proposals'
+
+    def handle(self, *args, **options):
+        fulltext.rebuild()
+        self.stdout.write(self.style.SUCCESS('Successfully indexed %d documents' % SearchDocument.objects.count()))
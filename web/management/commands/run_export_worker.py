@@ -0,0 +1,65 @@
+import datetime
+import django
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from web import exports
+
+# Jobs running for longer than this were left behind by a worker that died, they are queued again
+STALE_AFTER = datetime.timedelta(minutes=30)
+# Seconds between the checks for stale jobs while the worker runs
+STALE_CHECK_INTERVAL = 60
+
+
+def _init_worker():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Renders the queued PDF exports in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between checks for new jobs')
+        parser.add_argument('--once', action='store_true', help='Render the queued jobs and exit')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        self.requeue_stale_jobs()
+        # The worker processes must not share the parent's database connection
+        connections.close_all()
+        running = {}
+        checked_at = time.monotonic()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            try:
+                while True:
+                    if time.monotonic() - checked_at > STALE_CHECK_INTERVAL:
+                        # Another worker may have died since, its own jobs are still being rendered
+                        self.requeue_stale_jobs(exclude=running.values())
+                        checked_at = time.monotonic()
+                    free = workers - len(running)
+                    if free:
+                        for job_id in exports.claim_pending_jobs(free):
+                            running[pool.submit(exports.run_job, job_id)] = job_id
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job_id = running.pop(future)
+                        if future.exception() is None and future.result():
+                            self.stdout.write(self.style.SUCCESS('Rendered export %s' % job_id))
+                        else:
+                            self.stdout.write(self.style.ERROR('Export %s failed' % job_id))
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping, waiting for the running exports to finish')
+
+    def requeue_stale_jobs(self, exclude=()):
+        requeued = exports.requeue_stale_jobs(STALE_AFTER, exclude=list(exclude))
+        if requeued:
+            self.stdout.write('Queued again %d stale jobs' % requeued)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from web.scheduling import schedule_defences
+
+
+class Command(BaseCommand):
+    help = ('Schedules the defences of a CSV file with the columns thesis, date_time, jury (space separated '
+            'cédulas) and backup_jury, all of them or none')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file, UTF-8 encoded, with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as csv_file:
+                result = schedule_defences(csv_file, dry_run=options['dry_run'])
+        except OSError as error:
+            raise CommandError(error)
+        for error in result.errors:
+            self.stderr.write('Line %d: %s' % (error.line, error.message))
+        if result.errors:
+            raise CommandError('No defences were scheduled, %d errors' % len(result.errors))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('%d valid defences' % result.created))
+        else:
+            self.stdout.write(self.style.SUCCESS('Successfully scheduled %d defences' % result.created))
@@ -0,0 +1,189 @@
+"""
+Per-request SQL instrumentation.
+
+SQLInstrumentationMiddleware records every query run while handling a request: how many, how long they took and
+their shape (the SQL with the literals and the length of IN lists taken out). Queries with the same shape run
+from the same place several times are reported as N+1 suspects, with the template line or the Python call site
+that ran them. The summary is added to the response headers and logged to the ``web.sql`` logger.
+
+It is enabled with the SQL_INSTRUMENTATION setting: True for every request, 'managers' for the requests of
+managers and administrators, False to disable it.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('web.sql')
+
+# Times a query shape must be repeated from the same place to be reported
+N_PLUS_ONE_THRESHOLD = 3
+# Suspects listed in the X-SQL-N-Plus-One header, the log entry has all of them
+HEADER_SUSPECTS = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?|\$\d+)\s*,)*\s*(?:%s|\?|\$\d+)\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+QueryRecord = namedtuple('QueryRecord', ('shape', 'duration', 'site'))
+Suspect = namedtuple('Suspect', ('site', 'shape', 'count', 'duration'))
+
+
+def normalize_sql(sql):
+    """
+    Shape of a query: the same statement with any parameters gives the same shape.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip().replace('%s', '?')
+
+
+def _template_site(frame):
+    # Template nodes are rendered through Node.render_annotated, the innermost one is the tag or variable
+    # that ran the query
+    node = frame.f_locals.get('self')
+    token = getattr(node, 'token', None)
+    origin = getattr(node, 'origin', None)
+    if token is None or origin is None:
+        return None
+    return '%s:%d' % (origin.template_name or origin.name, token.lineno)
+
+
+def find_call_site():
+    """
+    Innermost template line or project function (outside the installed packages) of the current stack.
+    """
+    frame = sys._getframe(1)
+    code_site = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            site = _template_site(frame)
+            if site:
+                return site
+        elif code_site is None:
+            filename = os.path.abspath(code.co_filename)
+            if (filename.startswith(_PROJECT_ROOT) and filename != _THIS_FILE and 'site-packages' not in filename
+                    and os.sep + 'migrations' + os.sep not in filename):
+                code_site = '%s:%d %s' % (os.path.relpath(filename, _PROJECT_ROOT), frame.f_lineno, code.co_name)
+        frame = frame.f_back
+    return code_site or '?'
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that keeps a record of the queries of one request.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append(QueryRecord(normalize_sql(sql), duration, find_call_site()))
+
+    @property
+    def total_time(self):
+        return sum(query.duration for query in self.queries)
+
+    def n_plus_one_suspects(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """
+        Shapes run ``threshold`` or more times from the same call site, the most repeated first.
+        """
+        counts = Counter((query.site, query.shape) for query in self.queries)
+        durations = Counter()
+        for query in self.queries:
+            durations[query.site, query.shape] += query.duration
+        suspects = [Suspect(site, shape, count, durations[site, shape])
+                    for (site, shape), count in counts.items() if count >= threshold]
+        return sorted(suspects, key=lambda suspect: (-suspect.count, suspect.site))
+
+
+def _is_enabled(request):
+    setting = getattr(settings, 'SQL_INSTRUMENTATION', False)
+    if setting == 'managers':
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_authenticated and user.is_manager_or_admin())
+    return bool(setting)
+
+
+def _header_value(value):
+    # Header values must be latin-1 and a single line
+    return _SPACES.sub(' ', value).encode('latin-1', 'replace').decode('latin-1')
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Must be placed after AuthenticationMiddleware, the 'managers' setting needs request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _is_enabled(request):
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+        if response.streaming:
+            # The queries of a streamed response run while it's consumed, they are logged at the end
+            self.add_headers(response, recorder)
+            response.streaming_content = self.wrap_streaming(response.streaming_content, stack, request, recorder,
+                                                             start)
+        else:
+            stack.close()
+            self.add_headers(response, recorder)
+            self.log(request, response, recorder, start)
+        return response
+
+    def wrap_streaming(self, content, stack, request, recorder, start):
+        try:
+            yield from content
+        finally:
+            stack.close()
+            self.log(request, None, recorder, start)
+
+    def add_headers(self, response, recorder):
+        suspects = recorder.n_plus_one_suspects()
+        response['X-SQL-Queries'] = str(len(recorder.queries))
+        response['X-SQL-Time'] = '%.1fms' % (recorder.total_time * 1000)
+        if suspects:
+            response['X-SQL-N-Plus-One'] = _header_value('; '.join(
+                '%s x%d' % (suspect.site, suspect.count) for suspect in suspects[:HEADER_SUSPECTS]))
+
+    def log(self, request, response, recorder, start):
+        suspects = recorder.n_plus_one_suspects()
+        message = '%s %s: %d queries, %.1f ms in SQL, %.1f ms total' % (
+            request.method, request.get_full_path(), len(recorder.queries), recorder.total_time * 1000,
+            (time.perf_counter() - start) * 1000)
+        if response is None:
+            message += ' (streamed)'
+        for suspect in suspects:
+            message += '\n  N+1 suspect: %d x at %s (%.1f ms): %s' % (
+                suspect.count, suspect.site, suspect.duration * 1000, suspect.shape)
+        if suspects:
+            logger.warning(message)
+        else:
+            logger.info(message)
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.2 on 2026-10-18 17:09
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+# noinspection PyPep8Naming
+def backfill_current_status(apps, schema_editor):
+    Thesis = apps.get_model('web', 'Thesis')
+    HistoricThesisStatus = apps.get_model('web', 'HistoricThesisStatus')
+    latest_status = HistoricThesisStatus.objects.filter(thesis=OuterRef('pk')).order_by('-date', '-pk').values('status')
+    Thesis.objects.update(current_status=Subquery(latest_status[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0009_auto_20200110_0413'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thesis',
+            name='current_status',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='web.ThesisStatus'),
+        ),
+        migrations.RunPython(backfill_current_status, migrations.RunPython.noop),
+    ]
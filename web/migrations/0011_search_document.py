@@ -0,0 +1,54 @@
+# Generated by Django 3.0.2 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+# The columns of the SearchDocument created here
+FTS_COLUMNS = ('code', 'nrc', 'title', 'thematic_category', 'proposal_title', 'people')
+
+
+def create_fts_index(apps, schema_editor):
+    from web import fulltext
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in fulltext.create_index_sql(FTS_COLUMNS):
+            schema_editor.execute(statement)
+
+
+def drop_fts_index(apps, schema_editor):
+    from web import fulltext
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in fulltext.drop_index_sql():
+            schema_editor.execute(statement)
+
+
+def build_search_documents(apps, schema_editor):
+    from web import fulltext
+    fulltext.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0010_thesis_current_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('thesis', 'Thesis'), ('proposal', 'Proposal')], max_length=16)),
+                ('key', models.CharField(max_length=68)),
+                ('code', models.CharField(max_length=68)),
+                ('nrc', models.CharField(blank=True, max_length=32)),
+                ('title', models.CharField(blank=True, max_length=512)),
+                ('thematic_category', models.CharField(blank=True, max_length=50)),
+                ('proposal_title', models.CharField(blank=True, max_length=512)),
+                ('people', models.TextField(blank=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
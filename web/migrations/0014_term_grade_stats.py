@@ -0,0 +1,34 @@
+# Generated by Django 3.0.2 on 2026-10-18 17:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_grade_stats(apps, schema_editor):
+    from web import grades
+    grades.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0013_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermGradeStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('total_squares', models.PositiveIntegerField(default=0)),
+                ('histogram', models.CharField(default='0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0', max_length=256)),
+                ('term', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='grade_stats', to='web.Term')),
+            ],
+            options={
+                'verbose_name_plural': 'Term grade stats',
+            },
+        ),
+        migrations.RunPython(build_grade_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.2 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0015_row_modified'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='defence',
+            index=models.Index(fields=['grade'], name='defence_grade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defence',
+            index=models.Index(fields=['date_time'], name='defence_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicthesisstatus',
+            index=models.Index(fields=['thesis', 'date'], name='thesis_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jury',
+            index=models.Index(fields=['defence', 'is_backup_jury'], name='jury_defence_backup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='persondata',
+            index=models.Index(fields=['type', 'last_name', 'name'], name='person_type_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['proposal_status', 'student1'], name='proposal_status_student_idx'),
+        ),
+    ]
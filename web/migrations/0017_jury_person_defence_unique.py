@@ -0,0 +1,30 @@
+# Generated by Django 3.0.2 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# noinspection PyPep8Naming
+def remove_duplicate_judges(apps, schema_editor):
+    # Keep the first row of each person in a jury: a principal judge over a later backup one
+    Jury = apps.get_model('web', 'Jury')
+    duplicates = Jury.objects.values('person', 'defence').annotate(rows=Count('pk')).filter(rows__gt=1).order_by()
+    for duplicate in duplicates:
+        judges = Jury.objects.filter(person=duplicate['person'], defence=duplicate['defence'])
+        kept = judges.order_by('is_backup_jury', 'pk').values_list('pk', flat=True)[0]
+        judges.exclude(pk=kept).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0016_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_judges, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='jury',
+            constraint=models.UniqueConstraint(fields=('person', 'defence'), name='jury_person_defence_unique'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.0.2 on 2026-10-18 18:12
+
+import datetime
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# noinspection PyPep8Naming
+def add_initial_proposal_statuses(apps, schema_editor):
+    # The proposal history wasn't written before, start it with the current status from the submission date
+    HistoricProposalStatus = apps.get_model('web', 'HistoricProposalStatus')
+    Proposal = apps.get_model('web', 'Proposal')
+    proposals = Proposal.objects.filter(historicproposalstatus__isnull=True).values_list(
+        'code', 'proposal_status', 'submission_date')
+    HistoricProposalStatus.objects.bulk_create((
+        HistoricProposalStatus(proposal_id=code, status_id=status, date=django.utils.timezone.make_aware(
+            datetime.datetime.combine(submission_date, datetime.time.min)))
+        for code, status, submission_date in proposals.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0017_jury_person_defence_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historicproposalstatus',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='historicthesisstatus',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='historicproposalstatus',
+            index=models.Index(fields=['proposal', 'date'], name='proposal_status_date_idx'),
+        ),
+        migrations.RunPython(add_initial_proposal_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.2 on 2026-10-18 18:42
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0018_status_history_dates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='defence',
+            name='grade',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(20)]),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.0.2 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+# The columns of the SearchDocument before and after this migration
+PREVIOUS_FTS_COLUMNS = ('code', 'nrc', 'title', 'thematic_category', 'proposal_title', 'people')
+FTS_COLUMNS = PREVIOUS_FTS_COLUMNS + ('status', 'term')
+
+
+def _create_fts_index(schema_editor, fts_columns):
+    from web import fulltext
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in fulltext.create_index_sql(fts_columns):
+            schema_editor.execute(statement)
+        # Load the existing documents into the new table
+        schema_editor.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild');".format(fts=fulltext.FTS_TABLE))
+
+
+def _drop_fts_index(schema_editor):
+    from web import fulltext
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in fulltext.drop_index_sql():
+            schema_editor.execute(statement)
+
+
+def drop_fts_index(apps, schema_editor):
+    _drop_fts_index(schema_editor)
+
+
+def create_fts_index(apps, schema_editor):
+    _create_fts_index(schema_editor, FTS_COLUMNS)
+
+
+def create_previous_fts_index(apps, schema_editor):
+    _create_fts_index(schema_editor, PREVIOUS_FTS_COLUMNS)
+
+
+def build_search_documents(apps, schema_editor):
+    from web import fulltext
+    fulltext.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0019_defence_grade_max'),
+    ]
+
+    operations = [
+        # The FTS5 table and its triggers list the columns, they are created again with the new ones
+        migrations.RunPython(drop_fts_index, create_previous_fts_index),
+        migrations.AddField(
+            model_name='searchdocument',
+            name='status',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='searchdocument',
+            name='term',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
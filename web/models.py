@@ -1,6 +1,12 @@
+import logging
+import uuid
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.validators import MaxValueValidator
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
 
 
 class User(AbstractUser):
@@ -39,6 +45,10 @@ class PersonData(models.Model):
 
     class Meta:
         verbose_name_plural = 'Person data'
+        indexes = [
+            # Persons of a type in name order (person autocompletes)
+            models.Index(fields=['type', 'last_name', 'name'], name='person_type_name_idx'),
+        ]
 
 
 class ProposalStatus(models.Model):
@@ -71,6 +81,22 @@ class Proposal(models.Model):
     industry_tutor = models.ForeignKey(PersonData, models.PROTECT, null=True, blank=True, related_name='industry_tutor')
     term = models.ForeignKey(Term, models.PROTECT, related_name='term')
     proposal_status = models.ForeignKey(ProposalStatus, models.PROTECT, related_name='proposal_status')
+    # Changes with the proposal or the rows shown with it in the lists, it versions the cached list rows
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Proposals by status in the order of the lists (proposals not approved)
+            models.Index(fields=['proposal_status', 'student1'], name='proposal_status_student_idx'),
+        ]
+
+    def save(self, **kwargs):
+        with transaction.atomic():
+            previous_status = Proposal.objects.filter(pk=self.pk).values_list('proposal_status', flat=True).first()
+            super().save(**kwargs)
+            # Every change of status, the first one included, goes to the history
+            if previous_status != self.proposal_status_id:
+                HistoricProposalStatus.objects.create(proposal=self, status_id=self.proposal_status_id)
 
     def __str__(self):
         return '%s (%s)' % (self.title, self.code)
@@ -80,12 +106,17 @@ class Proposal(models.Model):
 
 
 class HistoricProposalStatus(models.Model):
-    date = models.DateTimeField(auto_now=True)
+    # When the proposal got the status, it lasts until the next row of the proposal (see web.timeline)
+    date = models.DateTimeField(default=timezone.now)
     proposal = models.ForeignKey(Proposal, models.CASCADE)
     status = models.ForeignKey(ProposalStatus, models.PROTECT)
 
     class Meta:
         verbose_name_plural = 'Historic proposal statuses'
+        indexes = [
+            # Status history of a proposal in date order
+            models.Index(fields=['proposal', 'date'], name='proposal_status_date_idx'),
+        ]
 
 
 class ThesisStatus(models.Model):
@@ -108,12 +139,32 @@ class Thesis(models.Model):
     thematic_category = models.CharField(max_length=50)
     submission_date = models.DateField()
     company_name = models.CharField(max_length=128, null=True, blank=True)
+    # Denormalized copy of the status of the latest HistoricThesisStatus, maintained by that model.
+    current_status = models.ForeignKey(ThesisStatus, models.PROTECT, null=True, blank=True, editable=False)
+    # Changes with the thesis or the rows shown with it in the lists, it versions the cached list rows
+    modified = models.DateTimeField(auto_now=True)
 
     def save(self, **kwargs):
         self.code = 'TG{}'.format(self.proposal.code)
         if not self.title:
             self.title = self.proposal.title
-        super().save(*kwargs)
+        with transaction.atomic():
+            previous_term_id = Thesis.objects.filter(pk=self.code).values_list('delivery_term', flat=True).first()
+            super().save(*kwargs)
+            if previous_term_id is not None and previous_term_id != self.delivery_term_id:
+                # The grades of its defences count for the new delivery term now
+                grades = Defence.objects.filter(thesis=self, grade__isnull=False).values_list('grade', flat=True)
+                for grade in grades:
+                    TermGradeStats.add_grade(previous_term_id, grade, -1)
+                    TermGradeStats.add_grade(self.delivery_term_id, grade, 1)
+
+    def refresh_current_status(self):
+        """
+        Recompute the current status pointer from the status history.
+        """
+        latest = HistoricThesisStatus.objects.filter(thesis=self).order_by('-date', '-pk').first()
+        self.current_status_id = latest.status_id if latest else None
+        Thesis.objects.filter(pk=self.pk).update(current_status=self.current_status_id, modified=timezone.now())
 
     def __str__(self):
         return '%s (%s)' % (self.title, self.code)
@@ -123,33 +174,76 @@ class Thesis(models.Model):
 
 
 class HistoricThesisStatus(models.Model):
-    date = models.DateTimeField(auto_now=True)
+    # When the thesis got the status, it lasts until the next row of the thesis (see web.timeline)
+    date = models.DateTimeField(default=timezone.now)
     thesis = models.ForeignKey(Thesis, models.CASCADE)
     status = models.ForeignKey(ThesisStatus, models.PROTECT)
 
+    def save(self, **kwargs):
+        # A row dated in the past (e.g. a correction from the admin) isn't necessarily the latest one, the current
+        # status of the thesis is the status of whichever is
+        latest = HistoricThesisStatus.objects.filter(thesis=self.thesis_id).order_by('-date', '-pk')
+        with transaction.atomic():
+            super().save(**kwargs)
+            Thesis.objects.filter(pk=self.thesis_id).update(
+                current_status=models.Subquery(latest.values('status')[:1]), modified=timezone.now())
+
     class Meta:
         verbose_name_plural = 'Historic thesis statuses'
+        indexes = [
+            # Latest status of a thesis
+            models.Index(fields=['thesis', 'date'], name='thesis_status_date_idx'),
+        ]
 
 
 class Defence(models.Model):
     MAX_JUDGES = 3
+    MAX_GRADE = 20
     thesis = models.ForeignKey(Thesis, models.PROTECT)
     code = models.CharField(max_length=68, primary_key=True)
     date_time = models.DateTimeField()
-    grade = models.PositiveSmallIntegerField(null=True, blank=True)
+    grade = models.PositiveSmallIntegerField(null=True, blank=True, validators=[MaxValueValidator(MAX_GRADE)])
     is_publication_mention = models.BooleanField(default=False)
     is_honorific_mention = models.BooleanField(default=False)
     corrections_submission_date = models.DateField(null=True, blank=True)
     was_grade_loaded = models.BooleanField(default=False)
     observations = models.TextField(null=True, blank=True)
+    # Changes with the defence or the rows shown with it in the lists (jury included), it versions the cached
+    # list rows
+    modified = models.DateTimeField(auto_now=True)
 
     def save(self, **kwargs):
         self.code = 'D{}'.format(self.thesis.code)
-        super().save(*kwargs)
-        try:
-            self.get_jury_members().get(person=self.get_academic_tutor(), defence=self)
-        except Jury.DoesNotExist:
-            Jury(person=self.get_academic_tutor(), defence=self).save()
+        with transaction.atomic():
+            previous = Defence.objects.filter(pk=self.code).values_list('grade', 'thesis__delivery_term').first()
+            super().save(*kwargs)
+            self._update_grade_stats(previous)
+            Jury.objects.get_or_create(person=self.get_academic_tutor(), defence=self)
+
+    @classmethod
+    def free_judge_slots(cls, tutor, judges):
+        """
+        Principal judges a defence can still take (negative when it has too many) with the academic tutor
+        ``tutor`` and the principal judges ``judges`` (person ids). The tutor is always part of the principal jury,
+        backup judges don't count toward MAX_JUDGES.
+        """
+        principal = set(judges)
+        if tutor is not None:
+            principal.add(tutor)
+        return cls.MAX_JUDGES - len(principal)
+
+    def _update_grade_stats(self, previous):
+        """
+        Move this defence's grade in the per term aggregates. ``previous`` is the (grade, term id) stored before
+        the save, or None for a new defence.
+        """
+        current = (self.grade, self.thesis.delivery_term_id)
+        if previous == current:
+            return
+        if previous and previous[0] is not None:
+            TermGradeStats.add_grade(previous[1], previous[0], -1)
+        if self.grade is not None:
+            TermGradeStats.add_grade(current[1], self.grade, 1)
 
     def get_students(self):
         return self.thesis.proposal.student1, self.thesis.proposal.student2
@@ -157,22 +251,38 @@ class Defence(models.Model):
     def get_academic_tutor(self):
         return self.thesis.proposal.academic_tutor
 
+    def _get_prefetched_jury(self):
+        """
+        Jury rows loaded by a Prefetch('jury_set', to_attr='prefetched_jury'), or None if they weren't prefetched.
+        """
+        return getattr(self, 'prefetched_jury', None)
+
     def get_complete_jury(self):
+        prefetched_jury = self._get_prefetched_jury()
+        if prefetched_jury is not None:
+            return prefetched_jury
         return Jury.objects.filter(defence=self)
 
     def get_jury_members(self):
         """
         Get the principal jury members for this defence, excluding the backup Judge.
         """
+        prefetched_jury = self._get_prefetched_jury()
+        if prefetched_jury is not None:
+            return [judge for judge in prefetched_jury if not judge.is_backup_jury]
         return Jury.objects.filter(defence=self, is_backup_jury=False)
 
     def get_backup_judge(self):
         """
         Get the backup judge for this defence.
         """
-        backup_juries = Jury.objects.filter(defence=self, is_backup_jury=True)
+        prefetched_jury = self._get_prefetched_jury()
+        if prefetched_jury is not None:
+            backup_juries = [judge for judge in prefetched_jury if judge.is_backup_jury]
+        else:
+            backup_juries = Jury.objects.filter(defence=self, is_backup_jury=True)
         if len(backup_juries) > 1:
-            print('More than one backup jury for defence %s.' % self.code)
+            logger.warning('More than one backup jury for defence %s', self.code)
         elif len(backup_juries) == 0:
             return None
         else:
@@ -184,9 +294,153 @@ class Defence(models.Model):
     def __str__(self):
         return self.code
 
+    class Meta:
+        indexes = [
+            # Defences not graded yet and the grade statistics
+            models.Index(fields=['grade'], name='defence_grade_idx'),
+            # Defences in a time window
+            models.Index(fields=['date_time'], name='defence_date_time_idx'),
+        ]
+
 
 class Jury(models.Model):
     person = models.ForeignKey(PersonData, models.PROTECT)
     defence = models.ForeignKey(Defence, models.PROTECT)
     confirmed_assistance = models.BooleanField(default=False)
     is_backup_jury = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Principal and backup judges of a defence
+            models.Index(fields=['defence', 'is_backup_jury'], name='jury_defence_backup_idx'),
+        ]
+        constraints = [
+            # A person sits at most once in the jury of a defence, principal or backup
+            models.UniqueConstraint(fields=['person', 'defence'], name='jury_person_defence_unique'),
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalized text of a thesis or proposal, mirrored into the SQLite FTS5 table used by the list searches.
+    Maintained by web.fulltext, don't edit it by hand.
+    """
+    THESIS = 'thesis'
+    PROPOSAL = 'proposal'
+    KIND_CHOICES = (
+        (THESIS, 'Thesis'),
+        (PROPOSAL, 'Proposal'),
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    key = models.CharField(max_length=68)
+    code = models.CharField(max_length=68)
+    nrc = models.CharField(max_length=32, blank=True)
+    title = models.CharField(max_length=512, blank=True)
+    thematic_category = models.CharField(max_length=50, blank=True)
+    proposal_title = models.CharField(max_length=512, blank=True)
+    people = models.TextField(blank=True)
+    # Current status and delivery term period of a thesis
+    status = models.CharField(max_length=64, blank=True)
+    term = models.CharField(max_length=16, blank=True)
+
+    class Meta:
+        unique_together = ('kind', 'key')
+
+
+class DataVersion(models.Model):
+    """
+    Counter bumped on every write to a table (see web.versions), used to invalidate in-process caches
+    across workers with a single cheap query.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return '%s v%d' % (self.name, self.version)
+
+
+class ExportJob(models.Model):
+    """
+    A report rendered in the background by the run_export_worker command (see web.exports).
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'En cola'),
+        (RUNNING, 'Generando'),
+        (DONE, 'Listo'),
+        (FAILED, 'Fallido'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report = models.CharField(max_length=64)
+    # Hash of the versions of the data the report reads, equal keys produce the same file
+    data_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '%s (%s)' % (self.report, self.get_status_display())
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['report', 'data_key']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class TermGradeStats(models.Model):
+    """
+    Aggregates of the defence grades of the theses delivered in a term, kept up to date by Defence.save (see
+    web.grades). Statistics over several terms are computed by merging their rows.
+    """
+    MAX_GRADE = Defence.MAX_GRADE
+    term = models.OneToOneField(Term, models.CASCADE, related_name='grade_stats')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    total_squares = models.PositiveIntegerField(default=0)
+    # Number of defences with each grade from 0 to MAX_GRADE, comma separated
+    histogram = models.CharField(max_length=256, default=','.join(['0'] * (MAX_GRADE + 1)))
+
+    def get_histogram(self):
+        return [int(count) for count in self.histogram.split(',')]
+
+    def set_histogram(self, counts):
+        self.histogram = ','.join(str(count) for count in counts)
+
+    @classmethod
+    def add_grade(cls, term_id, grade, delta):
+        """
+        Add (delta=1) or remove (delta=-1) a grade from the aggregates of a term. Must run inside a transaction.
+        Grades outside the histogram (saved without the form's validation) are left out, as rebuild does.
+        """
+        if not cls.is_valid_grade(grade):
+            return
+        changes = {
+            'count': models.F('count') + delta,
+            'total': models.F('total') + delta * grade,
+            'total_squares': models.F('total_squares') + delta * grade * grade,
+        }
+        # The UPDATE locks the row, so the histogram can be read and written back safely afterwards
+        if not cls.objects.filter(term_id=term_id).update(**changes):
+            cls.objects.get_or_create(term_id=term_id)
+            cls.objects.filter(term_id=term_id).update(**changes)
+        stats = cls.objects.select_for_update().get(term_id=term_id)
+        histogram = stats.get_histogram()
+        histogram[grade] += delta
+        stats.set_histogram(histogram)
+        stats.save(update_fields=['histogram'])
+
+    @classmethod
+    def is_valid_grade(cls, grade):
+        return 0 <= grade <= cls.MAX_GRADE
+
+    def __str__(self):
+        return 'Grades of %s' % self.term
+
+    class Meta:
+        verbose_name_plural = 'Term grade stats'
@@ -0,0 +1,85 @@
+"""
+Query plans of the hot query shapes.
+
+Each HotQuery is a queryset with the shape the views run on every request (the latest status of a thesis, the
+jury of a defence, the proposals not approved, ...). ``find_scans`` reads the SQLite plan of the query and reports
+the tables read with a full scan instead of an index, which is what the check_query_plans command fails on.
+"""
+import re
+from collections import namedtuple
+from datetime import timedelta
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .involvement import involvement_queryset
+from .listing import defence_queryset, proposals_not_approved
+from .models import Defence, HistoricThesisStatus, Jury, PersonData, PersonType, Proposal, Thesis
+from .timeline import proposals_as_of, theses_as_of
+
+# allowed_scans: tables that may be scanned, e.g. lookup tables with a handful of rows
+HotQuery = namedtuple('HotQuery', ('name', 'queryset', 'allowed_scans'))
+
+# "SCAN web_defence" or "SCAN TABLE web_defence AS T1" (SQLite < 3.36), without "USING (COVERING) INDEX"
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def get_hot_queries():
+    # The querysets are built on demand with values from the database, a None would turn the lookups into
+    # IS NULL tests with a different plan
+    thesis = _first(Thesis, 'pk')
+    defence = _first(Defence, 'pk')
+    person = _first(PersonData, 'pk')
+    person_type = _first(PersonType, 'name')
+    now = timezone.now()
+    return [
+        HotQuery('thesis_current_status',
+                 HistoricThesisStatus.objects.filter(thesis=thesis).order_by('-date', '-pk')[:1], ()),
+        HotQuery('jury_members', Jury.objects.filter(defence=defence, is_backup_jury=False), ()),
+        HotQuery('backup_judge', Jury.objects.filter(defence=defence, is_backup_jury=True), ()),
+        HotQuery('jury_of_defences', Jury.objects.filter(defence__in=[defence]), ()),
+        HotQuery('pending_defences', defence_queryset(True, None), ()),
+        HotQuery('proposals_not_approved', proposals_not_approved().select_related(),
+                 # The plan names the subquery of the statuses other than approved by its alias
+                 ('U0',)),
+        HotQuery('persons_of_type',
+                 PersonData.objects.filter(type__name=person_type).order_by('last_name', 'name', 'id_card_number'),
+                 ('web_persontype',)),
+        HotQuery('person_proposals', Proposal.objects.filter(student1=person), ()),
+        HotQuery('person_involvement', involvement_queryset(person), ()),
+        # The status of every thesis or proposal as of a date reads all of them, one index search each
+        HotQuery('thesis_status_as_of', theses_as_of(now), ('web_thesis',)),
+        HotQuery('proposal_status_as_of', proposals_as_of(now), ('web_proposal',)),
+        HotQuery('graded_defences',
+                 Defence.objects.filter(grade__isnull=False).values('grade').annotate(count=Count('pk')).order_by(),
+                 ()),
+        HotQuery('defences_in_window',
+                 Defence.objects.filter(date_time__range=(now - timedelta(days=7), now + timedelta(days=7))), ()),
+    ]
+
+
+def _first(model, field):
+    value = model.objects.order_by('pk').values_list(field, flat=True).first()
+    return '' if value is None else value
+
+
+def explain(queryset):
+    """
+    The rows of ``EXPLAIN QUERY PLAN`` for the queryset, as (id, parent, detail).
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [(row[0], row[1], row[-1]) for row in cursor.fetchall()]
+
+
+def find_scans(plan, allowed_scans=()):
+    """
+    Tables of the plan read with a full table scan, except ``allowed_scans``.
+    """
+    scans = []
+    for _, _, detail in plan:
+        match = _SCAN.match(detail)
+        if match and match.group(1) not in allowed_scans:
+            scans.append(match.group(1))
+    return scans
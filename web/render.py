@@ -5,11 +5,18 @@ from django.template.loader import get_template
 from xhtml2pdf import pisa
 
 
-def render_to_pdf(template_src, context_dict={}):
+def render_pdf_bytes(template_src, context_dict={}):
     template = get_template(template_src)
     html  = template.render(context_dict)
     result = BytesIO()
     pdf = pisa.pisaDocument(BytesIO(html.encode("ISO-8859-1")), result)
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
-    return None
\ No newline at end of file
+        return result.getvalue()
+    return None
+
+
+def render_to_pdf(template_src, context_dict={}):
+    pdf = render_pdf_bytes(template_src, context_dict)
+    if pdf is not None:
+        return HttpResponse(pdf, content_type='application/pdf')
+    return None
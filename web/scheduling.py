@@ -0,0 +1,159 @@
+"""
+Bulk scheduling of defences from a CSV file.
+
+Each row schedules the defence of a thesis: thesis (code), date_time, jury (cédulas of the principal judges,
+separated by spaces) and backup_jury (cédula, optional). The academic tutor of the thesis joins the principal
+jury as DefenceForm does. Every row is checked in memory against the theses, persons and defences loaded with
+one query each (missing references, theses already defended or repeated, repeated judges, more than
+Defence.MAX_JUDGES principal judges, judges in two overlapping defences), and the schedule is only written when
+every row is valid: all the Defence and Jury rows are inserted with bulk_create in a single transaction.
+"""
+import csv
+from collections import namedtuple
+from datetime import datetime
+from django.db import transaction
+from django.utils import timezone
+
+from . import conflicts, versions
+from .importer import ImportResult
+from .models import Defence, Jury, PersonData, Thesis
+
+DATE_TIME_FORMATS = ('%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M')
+
+ScheduleEntry = namedtuple('ScheduleEntry', ('line', 'thesis', 'date_time', 'judges', 'backup'))
+
+
+def read_entries(lines):
+    """
+    ScheduleEntry of each row of a CSV file given as an iterable of text lines. Values are kept as text.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield ScheduleEntry(
+            line=reader.line_num,
+            thesis=(row.get('thesis') or '').strip(),
+            date_time=(row.get('date_time') or '').strip(),
+            judges=(row.get('jury') or '').split(),
+            backup=(row.get('backup_jury') or '').strip() or None,
+        )
+
+
+def _parse_date_time(value):
+    for date_time_format in DATE_TIME_FORMATS:
+        try:
+            return timezone.make_aware(datetime.strptime(value, date_time_format))
+        except ValueError:
+            pass
+    return None
+
+
+class DefenceScheduler:
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        codes = {entry.thesis for entry in self.entries}
+        id_card_numbers = {number for entry in self.entries for number in entry.judges}
+        id_card_numbers.update(entry.backup for entry in self.entries if entry.backup)
+        self.theses = Thesis.objects.select_related('proposal').in_bulk(codes)
+        self.persons = PersonData.objects.in_bulk(id_card_numbers)
+        self.defended = set(Defence.objects.filter(thesis__in=codes).values_list('thesis_id', flat=True))
+
+    def _check(self, entry, scheduled):
+        """
+        Error messages of an entry, ``scheduled`` are the theses of the earlier entries.
+        """
+        errors = []
+        thesis = self.theses.get(entry.thesis)
+        if thesis is None:
+            errors.append('No existe el trabajo de grado "%s"' % entry.thesis)
+        elif thesis.pk in self.defended:
+            errors.append('El trabajo de grado "%s" ya tiene una defensa' % thesis.pk)
+        elif thesis.pk in scheduled:
+            errors.append('El trabajo de grado "%s" está repetido en el archivo' % thesis.pk)
+
+        date_time = _parse_date_time(entry.date_time)
+        if date_time is None:
+            errors.append('Fecha y hora inválida "%s"' % entry.date_time)
+        elif date_time < timezone.now():
+            errors.append('La fecha debe ser en el futuro.')
+
+        for number in dict.fromkeys(entry.judges + ([entry.backup] if entry.backup else [])):
+            if number not in self.persons:
+                errors.append('No existe la persona "%s"' % number)
+        if len(set(entry.judges)) < len(entry.judges):
+            errors.append('Hay jueces repetidos en el jurado')
+        if entry.backup and entry.backup in entry.judges:
+            errors.append('El jurado suplente ya es parte del jurado')
+
+        if thesis is not None:
+            tutor = thesis.proposal.academic_tutor_id
+            if Defence.free_judge_slots(tutor, entry.judges) < 0:
+                errors.append('Límite de jueces superado (Máximo %d, incluido el tutor académico).' %
+                              Defence.MAX_JUDGES)
+            if entry.backup == tutor:
+                errors.append('El tutor académico no puede ser el jurado suplente')
+        return errors, date_time
+
+    def run(self, dry_run=False):
+        """
+        Validate the entries and, if all of them are valid, create their defences. Returns an ImportResult.
+        """
+        result = ImportResult()
+        defences = []
+        jury = []
+        lines = []
+        scheduled = set()
+        for entry in self.entries:
+            errors, date_time = self._check(entry, scheduled)
+            for message in errors:
+                result.add_error(entry.line, message)
+            if errors:
+                continue
+            thesis = self.theses[entry.thesis]
+            scheduled.add(thesis.pk)
+            # What Defence.save and DefenceForm.save do for a single defence
+            defence = Defence(code='D{}'.format(thesis.code), thesis=thesis, date_time=date_time)
+            defences.append(defence)
+            lines.append((defence, entry.line))
+            principal = [thesis.proposal.academic_tutor_id] + [number for number in entry.judges
+                                                               if number != thesis.proposal.academic_tutor_id]
+            jury.extend(Jury(person_id=number, defence=defence) for number in principal)
+            if entry.backup:
+                jury.append(Jury(person_id=entry.backup, defence=defence, is_backup_jury=True))
+
+        self._check_double_booking({defence.code: line for defence, line in lines}, jury, result)
+        if result.errors or dry_run:
+            # A schedule is written as a whole, a dry run counts the defences that would be created
+            result.created = 0 if result.errors else len(defences)
+            return result
+        with transaction.atomic():
+            Defence.objects.bulk_create(defences)
+            Jury.objects.bulk_create(jury)
+        if defences:
+            versions.bump_version(Defence)
+            versions.bump_version(Jury)
+        result.created = len(defences)
+        return result
+
+    def _check_double_booking(self, lines, jury, result):
+        """
+        Add an error for the new defences (``lines`` maps their codes to their lines) where a person overlaps
+        another of their defences in the same terms, stored or new.
+        """
+        if not lines:
+            return
+        terms = {self.theses[code[1:]].delivery_term_id for code in lines}
+        intervals, names = conflicts.load_intervals(terms)
+        intervals.extend((judge.person_id, judge.defence.code, judge.defence.date_time) for judge in jury)
+        for conflict in conflicts.sweep(intervals, names):
+            for code, other in ((conflict.first, conflict.second), (conflict.second, conflict.first)):
+                if code in lines:
+                    result.add_error(lines[code], '%s (%s) también participa en la defensa %s' % (
+                        conflict.name, conflict.person, other))
+
+
+def schedule_defences(lines, dry_run=False):
+    """
+    Schedule the defences of a CSV file given as an iterable of text lines, returns an ImportResult.
+    """
+    return DefenceScheduler(read_entries(lines)).run(dry_run=dry_run)
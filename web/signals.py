@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import fulltext, versions
+from .autocomplete_index import person_search_index
+from .models import (Defence, HistoricProposalStatus, HistoricThesisStatus, Jury, PersonData, PersonType, Proposal,
+                     ProposalStatus, SearchDocument, Term, TermGradeStats, Thesis, ThesisStatus)
+
+
+@receiver(post_delete, sender=HistoricThesisStatus)
+def refresh_thesis_current_status(sender, instance, **kwargs):
+    """
+    Deleting a history row (e.g. from the admin) may change which one is the latest.
+    """
+    thesis = Thesis.objects.filter(pk=instance.thesis_id).first()
+    if thesis:
+        thesis.refresh_current_status()
+        fulltext.index_theses([thesis.pk])
+
+
+@receiver(post_save, sender=HistoricThesisStatus)
+def reindex_thesis_status(sender, instance, raw=False, **kwargs):
+    # The current status is part of the thesis document, but HistoricThesisStatus.save moves it after this
+    # signal, inside its transaction: the document is rebuilt once that commits
+    if not raw:
+        transaction.on_commit(lambda: fulltext.index_theses([instance.thesis_id]))
+
+
+@receiver(post_save, sender=Thesis)
+def index_thesis(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fulltext.index_theses([instance.pk])
+
+
+@receiver(post_delete, sender=Thesis)
+def unindex_thesis(sender, instance, **kwargs):
+    fulltext.remove_documents(SearchDocument.THESIS, [instance.pk])
+
+
+@receiver(post_save, sender=Proposal)
+def index_proposal(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fulltext.index_proposals([instance.pk])
+
+
+@receiver(post_delete, sender=Proposal)
+def unindex_proposal(sender, instance, **kwargs):
+    fulltext.remove_documents(SearchDocument.PROPOSAL, [instance.pk])
+
+
+@receiver(post_save, sender=PersonData)
+def reindex_person_proposals(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Names and cédulas are part of the proposal and thesis documents, refresh the ones this person appears in.
+    """
+    if raw or created:
+        return
+    proposals = Proposal.objects.filter(
+        Q(student1=instance) | Q(student2=instance) | Q(academic_tutor=instance) | Q(industry_tutor=instance))
+    fulltext.index_proposals(proposals.values_list('code', flat=True))
+
+
+@receiver(post_save, sender=ThesisStatus)
+def reindex_thesis_status_name(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        fulltext.index_theses(Thesis.objects.filter(current_status=instance).values_list('code', flat=True))
+
+
+@receiver(post_save, sender=Term)
+def reindex_term_theses(sender, instance, created=False, raw=False, **kwargs):
+    # The delivery term period is part of the thesis documents
+    if not (raw or created):
+        fulltext.index_theses(Thesis.objects.filter(delivery_term=instance).values_list('code', flat=True))
+
+
+@receiver(post_save, sender=PersonData)
+def update_person_index(sender, instance, **kwargs):
+    # The index is shared by the whole process: it only takes a write once its transaction commits, so a rollback
+    # (which also undoes the version bump) leaves it as it was
+    version = versions.bump_version(PersonData)
+    transaction.on_commit(lambda: person_search_index.update(instance, version))
+
+
+@receiver(post_delete, sender=PersonData)
+def remove_from_person_index(sender, instance, **kwargs):
+    version = versions.bump_version(PersonData)
+    transaction.on_commit(lambda: person_search_index.delete(instance.pk, version))
+
+
+@receiver([post_save, post_delete], sender=PersonType)
+def invalidate_person_index(sender, **kwargs):
+    # The index is split by type, so renaming or adding one requires rebuilding it
+    versions.bump_version(PersonData)
+
+
+def bump_data_version(sender, **kwargs):
+    versions.bump_version(sender)
+
+
+# PersonData is bumped above, together with the autocomplete index update
+for model in (PersonType, ProposalStatus, Term, Proposal, HistoricProposalStatus, ThesisStatus, Thesis,
+              HistoricThesisStatus, Defence, Jury):
+    for signal in (post_save, post_delete):
+        signal.connect(bump_data_version, sender=model, dispatch_uid='bump_data_version_%s' % model.__name__)
+
+
+@receiver([post_save, post_delete], sender=HistoricThesisStatus)
+def bump_thesis_version(sender, **kwargs):
+    # The history row updates the current status of its thesis with a queryset update, which sends no signals
+    versions.bump_version(Thesis)
+
+
+def _touch(queryset):
+    """
+    Mark the rows as modified so their cached list rows are rendered again.
+    """
+    queryset.update(modified=timezone.now())
+
+
+@receiver(post_save, sender=PersonData)
+def touch_person_rows(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    proposals = Proposal.objects.filter(
+        Q(student1=instance) | Q(student2=instance) | Q(academic_tutor=instance) | Q(industry_tutor=instance))
+    _touch(proposals)
+    _touch(Thesis.objects.filter(proposal__in=proposals))
+    _touch(Defence.objects.filter(Q(thesis__proposal__in=proposals) | Q(jury__person=instance)))
+
+
+@receiver(post_save, sender=Proposal)
+def touch_proposal_rows(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        _touch(Thesis.objects.filter(proposal=instance))
+        _touch(Defence.objects.filter(thesis__proposal=instance))
+
+
+@receiver(post_save, sender=Thesis)
+def touch_thesis_rows(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        _touch(Defence.objects.filter(thesis=instance))
+
+
+@receiver([post_save, post_delete], sender=Jury)
+def touch_jury_defence(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch(Defence.objects.filter(pk=instance.defence_id))
+
+
+@receiver(post_save, sender=Term)
+def touch_term_rows(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        _touch(Proposal.objects.filter(term=instance))
+        _touch(Thesis.objects.filter(delivery_term=instance))
+        _touch(Defence.objects.filter(thesis__delivery_term=instance))
+
+
+@receiver(post_save, sender=ProposalStatus)
+def touch_proposal_status_rows(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        _touch(Proposal.objects.filter(proposal_status=instance))
+
+
+@receiver(post_save, sender=ThesisStatus)
+def touch_thesis_status_rows(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        _touch(Thesis.objects.filter(current_status=instance))
+
+
+@receiver(post_delete, sender=Defence)
+def remove_defence_grade(sender, instance, **kwargs):
+    if instance.grade is not None:
+        TermGradeStats.add_grade(instance.thesis.delivery_term_id, instance.grade, -1)
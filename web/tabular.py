@@ -0,0 +1,160 @@
+"""
+Streaming CSV and XLSX exports of the list views.
+
+Rows are read with queryset.iterator(), so only one chunk of model instances is alive at a time. CSV lines are
+sent to the client as they are produced; XLSX workbooks are written by xlsxwriter in constant memory mode into a
+temporary file, which is then streamed.
+"""
+import csv
+import tempfile
+from collections import namedtuple
+from django.db.models import prefetch_related_objects
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+CHUNK_SIZE = 2_000
+
+# ``value`` receives a row and returns the cell content
+Column = namedtuple('Column', ('header', 'value'))
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def _full_name(person):
+    if person is None:
+        return ''
+    return '%s %s' % (person.name, person.last_name)
+
+
+def _card(person):
+    return person.id_card_number if person else ''
+
+
+def _related_columns(header, get_person):
+    return [
+        Column(header, lambda row: _full_name(get_person(row))),
+        Column('Cédula %s' % header.lower(), lambda row: _card(get_person(row))),
+    ]
+
+
+PERSON_COLUMNS = [
+    Column('Cédula', lambda person: person.id_card_number),
+    Column('Nombre', lambda person: person.name),
+    Column('Apellido', lambda person: person.last_name),
+    Column('Tipo', lambda person: person.type.name),
+    Column('Correo UCAB', lambda person: person.ucab_email or ''),
+    Column('Correo', lambda person: person.email),
+    Column('Teléfono', lambda person: person.primary_phone_number),
+    Column('Teléfono secundario', lambda person: person.secondary_phone_number or ''),
+]
+
+PROPOSAL_COLUMNS = [
+    Column('Código', lambda proposal: proposal.code),
+    Column('Título', lambda proposal: proposal.title),
+    Column('Estatus', lambda proposal: proposal.proposal_status.name),
+    Column('Term', lambda proposal: proposal.term.period),
+    Column('Fecha de entrega', lambda proposal: proposal.submission_date.isoformat()),
+    *_related_columns('Estudiante 1', lambda proposal: proposal.student1),
+    *_related_columns('Estudiante 2', lambda proposal: proposal.student2),
+    *_related_columns('Tutor académico', lambda proposal: proposal.academic_tutor),
+    *_related_columns('Tutor empresarial', lambda proposal: proposal.industry_tutor),
+]
+
+THESIS_COLUMNS = [
+    Column('Código', lambda thesis: thesis.code),
+    Column('NRC', lambda thesis: thesis.NRC),
+    Column('Título', lambda thesis: thesis.title),
+    Column('Estatus', lambda thesis: thesis.current_status.name if thesis.current_status else ''),
+    Column('Categoría temática', lambda thesis: thesis.thematic_category),
+    Column('Term de entrega', lambda thesis: thesis.delivery_term.period),
+    Column('Empresa', lambda thesis: thesis.company_name or ''),
+    *_related_columns('Estudiante 1', lambda thesis: thesis.proposal.student1),
+    *_related_columns('Estudiante 2', lambda thesis: thesis.proposal.student2),
+    *_related_columns('Tutor académico', lambda thesis: thesis.proposal.academic_tutor),
+    *_related_columns('Tutor empresarial', lambda thesis: thesis.proposal.industry_tutor),
+]
+
+DEFENCE_COLUMNS = [
+    Column('Código', lambda defence: defence.code),
+    Column('TG', lambda defence: defence.thesis.code),
+    Column('Título', lambda defence: defence.thesis.title),
+    # In the local time zone, as the lists show it
+    Column('Fecha', lambda defence: timezone.localtime(defence.date_time).strftime('%Y-%m-%d %H:%M')),
+    Column('Nota', lambda defence: '' if defence.grade is None else defence.grade),
+    *_related_columns('Estudiante 1', lambda defence: defence.thesis.proposal.student1),
+    *_related_columns('Estudiante 2', lambda defence: defence.thesis.proposal.student2),
+    Column('Jurado', lambda defence: ', '.join(_full_name(judge.person) for judge in defence.get_jury_members())),
+    Column('Suplente', lambda defence: _full_name(getattr(defence.get_backup_judge(), 'person', None))),
+]
+
+
+def iterate_rows(queryset):
+    """
+    Iterate over a queryset in chunks. iterator() skips prefetch_related, so the lookups of the queryset are
+    applied to each chunk instead.
+    """
+    lookups = queryset._prefetch_related_lookups
+    if not lookups:
+        yield from queryset.iterator(chunk_size=CHUNK_SIZE)
+        return
+    chunk = []
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            prefetch_related_objects(chunk, *lookups)
+            yield from chunk
+            chunk = []
+    prefetch_related_objects(chunk, *lookups)
+    yield from chunk
+
+
+class _Echo:
+    """
+    File-like object for csv.writer that hands back each line instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(queryset, columns):
+    writer = csv.writer(_Echo())
+    # The BOM makes Excel open the file as UTF-8
+    yield '\ufeff' + writer.writerow([column.header for column in columns])
+    for row in iterate_rows(queryset):
+        yield writer.writerow([column.value(row) for column in columns])
+
+
+def _write_xlsx(output, queryset, columns):
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+    header_format = workbook.add_format({'bold': True})
+    for column_number, column in enumerate(columns):
+        worksheet.write(0, column_number, column.header, header_format)
+    for row_number, row in enumerate(iterate_rows(queryset), start=1):
+        worksheet.write_row(row_number, 0, [column.value(row) for column in columns])
+    workbook.close()
+
+
+def export_response(queryset, columns, export_format, filename):
+    """
+    Response with the rows of ``queryset`` as a CSV or XLSX attachment named ``filename`` plus the extension.
+    """
+    if export_format == 'csv':
+        response = StreamingHttpResponse(_csv_lines(queryset, columns), content_type='text/csv; charset=utf-8')
+    elif export_format == 'xlsx' and xlsxwriter is not None:
+        # The temporary file is removed once the response closes it
+        output = tempfile.TemporaryFile()
+        _write_xlsx(output, queryset, columns)
+        output.seek(0)
+        response = FileResponse(
+            output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    else:
+        raise Http404('Formato de exportación no disponible: %s' % export_format)
+    response['Content-Disposition'] = "attachment; filename='%s.%s'" % (filename, export_format)
+    return response
@@ -0,0 +1,28 @@
+import datetime
+import io
+from django.core.cache import cache
+from django.core.management import call_command
+
+from web import conflicts, counting, involvement, timeline, views
+
+# Fixed reference date of the generated datasets, so the terms and defence dates don't move with the day the tests
+# run on
+TODAY = datetime.date(2020, 1, 15)
+
+
+def generate_dataset(theses=40):
+    call_command('generate_dataset', seed=1, theses=theses, proposals=theses * 3 // 2, persons=theses * 2,
+                 defences=theses * 3 // 4, terms=4, today=TODAY, stdout=io.StringIO())
+
+
+def clear_caches():
+    """
+    Empty the in-process caches. They are keyed on data versions, which go back to the same numbers when the
+    transaction of a test is rolled back.
+    """
+    conflicts.clear_cache()
+    counting.clear_cache()
+    involvement.clear_cache()
+    timeline.clear_cache()
+    cache.clear()
+    views.ProposalAutocomplete.results_cache.clear()
@@ -0,0 +1,36 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+
+from web import assignment
+from web.models import Defence, Jury, Thesis
+from web.tests import clear_caches, generate_dataset
+
+
+class PlanJuryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset()
+
+    def setUp(self):
+        clear_caches()
+
+    def test_only_defences_to_come(self):
+        # An ungraded defence that already took place and one to come, in the same term
+        past = Defence.objects.filter(date_time__lt=timezone.now()).select_related('thesis__proposal').first()
+        Defence.objects.filter(pk=past.pk).update(grade=None)
+        Jury.objects.filter(defence=past).exclude(person=past.thesis.proposal.academic_tutor_id).delete()
+        term = past.thesis.delivery_term
+        thesis = Thesis.objects.filter(defence__isnull=True).first()
+        Thesis.objects.filter(pk=thesis.pk).update(delivery_term=term)
+        upcoming = Defence(thesis=Thesis.objects.get(pk=thesis.pk),
+                           date_time=timezone.now() + datetime.timedelta(days=7))
+        upcoming.save()
+        past_jury = set(Jury.objects.filter(defence=past).values_list('pk', flat=True))
+
+        plan = assignment.plan_jury(term)
+        self.assertEqual({item.defence for item in plan.assignments}, {upcoming.code})
+        assignment.commit_plan(term, plan.versions)
+        self.assertEqual(set(Jury.objects.filter(defence=past).values_list('pk', flat=True)), past_jury)
+        self.assertTrue(Jury.objects.filter(defence=upcoming).count() > 1)
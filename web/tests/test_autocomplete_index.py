@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from web.autocomplete_index import person_search_index
+from web.models import PersonData, PersonType
+
+
+class PersonIndexTests(TransactionTestCase):
+    """
+    Not wrapped in a transaction, so the writes commit (or roll back) like in a request.
+    """
+    # The flush at the end also deletes the default data of the migrations, the later tests need it back
+    serialized_rollback = True
+
+    def setUp(self):
+        self.student_type = PersonType.objects.get(name='Estudiante')
+        person_search_index.build()
+
+    def create_person(self, id_card_number, last_name):
+        return PersonData.objects.create(id_card_number=id_card_number, name='Ana', last_name=last_name,
+                                         email='ana@example.com', primary_phone_number='0212-5551234',
+                                         type=self.student_type)
+
+    def found(self, query):
+        page, _ = person_search_index.search(query, 'Estudiante')
+        return [pk for pk, _ in page]
+
+    def test_committed_writes(self):
+        person = self.create_person('V1', 'Zambrano')
+        self.assertEqual(self.found('zambrano'), ['V1'])
+        person.last_name = 'Yépez'
+        person.save()
+        self.assertEqual(self.found('zambrano'), [])
+        self.assertEqual(self.found('yepez'), ['V1'])
+        person.delete()
+        self.assertEqual(self.found('yepez'), [])
+
+    def test_rolled_back_writes(self):
+        self.create_person('V1', 'Zambrano')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.create_person('V2', 'Zambrano')
+            PersonData.objects.filter(pk='V1').delete()
+            raise RuntimeError()
+        self.assertEqual(self.found('zambrano'), ['V1'])
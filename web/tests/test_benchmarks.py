@@ -0,0 +1,35 @@
+import tempfile
+from django.test import TransactionTestCase, override_settings
+
+from web import benchmarks
+from web.autocomplete_index import person_search_index
+from web.models import User
+from web.tests import clear_caches, generate_dataset
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """
+    The cases of benchmark_views on a small dataset: bigger than a page, so an N+1 goes over the budget. Not
+    wrapped in a transaction, which would turn the transactions of the views into counted savepoints.
+    """
+    # The flush at the end also deletes the default data of the migrations, the later tests need it back
+    serialized_rollback = True
+
+    def setUp(self):
+        generate_dataset()
+        clear_caches()
+        # Warm, so the autocompletes don't build it in a background thread
+        person_search_index.build()
+        self.client.force_login(User.objects.create_user('manager', is_manager=True))
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        settings = override_settings(EXPORT_ROOT=export_root.name, SQL_INSTRUMENTATION=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_views_within_budget(self):
+        for case in benchmarks.CASES:
+            with self.subTest(case.name):
+                result = benchmarks.run_case(self.client, case, repeat=1)
+                self.assertLess(result.status, 400)
+                self.assertLessEqual(result.queries, result.budget)
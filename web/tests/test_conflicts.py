@@ -0,0 +1,83 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+
+from web import conflicts
+from web.models import Defence, Jury, PersonData, Thesis
+from web.tests import clear_caches, generate_dataset
+
+HOUR = datetime.timedelta(hours=1)
+
+
+class SweepTests(TestCase):
+
+    def setUp(self):
+        self.start = timezone.now()
+
+    def test_overlapping_defences(self):
+        intervals = [('V1', 'D3', self.start + 2 * HOUR), ('V1', 'D1', self.start), ('V1', 'D2', self.start + HOUR)]
+        found = conflicts.sweep(intervals, {'V1': 'Pérez Ana'}, duration=2 * HOUR)
+        self.assertEqual(found, [conflicts.Conflict('V1', 'Pérez Ana', 'D1', self.start, 'D2', self.start + HOUR),
+                                 conflicts.Conflict('V1', 'Pérez Ana', 'D2', self.start + HOUR, 'D3',
+                                                    self.start + 2 * HOUR)])
+
+    def test_back_to_back_defences(self):
+        intervals = [('V1', 'D1', self.start), ('V1', 'D2', self.start + 2 * HOUR)]
+        self.assertEqual(conflicts.sweep(intervals, duration=2 * HOUR), [])
+
+    def test_different_persons(self):
+        intervals = [('V1', 'D1', self.start), ('V2', 'D2', self.start)]
+        self.assertEqual(conflicts.sweep(intervals, duration=2 * HOUR), [])
+
+    def test_same_defence_twice(self):
+        # A tutor who is also in the jury of the defence
+        intervals = [('V1', 'D1', self.start), ('V1', 'D1', self.start)]
+        self.assertEqual(conflicts.sweep(intervals, duration=2 * HOUR), [])
+
+
+class FindConflictsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset()
+
+    def setUp(self):
+        clear_caches()
+        # Two theses of the same term without a defence, and a judge who isn't the tutor of either
+        self.first, self.second = Thesis.objects.filter(defence__isnull=True).select_related('proposal').order_by(
+            'code')[:2]
+        self.term = self.first.delivery_term_id
+        Thesis.objects.filter(pk=self.second.pk).update(delivery_term=self.term)
+        self.second.refresh_from_db()
+        tutors = {self.first.proposal.academic_tutor_id, self.second.proposal.academic_tutor_id}
+        self.judge = PersonData.objects.filter(type__name='Profesor').exclude(pk__in=tutors).first()
+        self.start = timezone.now().replace(microsecond=0) + datetime.timedelta(days=7)
+
+    def schedule(self, thesis, date_time):
+        defence = Defence(thesis=thesis, date_time=date_time)
+        defence.save()
+        Jury.objects.create(person=self.judge, defence=defence)
+        return defence
+
+    def test_overlap_found(self):
+        first = self.schedule(self.first, self.start)
+        second = self.schedule(self.second, self.start + HOUR)
+        found = [(conflict.person, conflict.first, conflict.second) for conflict in
+                 conflicts.find_conflicts([self.term])]
+        self.assertIn((self.judge.pk, first.code, second.code), found)
+
+    def test_cache_follows_the_defences(self):
+        self.schedule(self.first, self.start)
+        second = self.schedule(self.second, self.start + HOUR)
+        self.assertTrue(any(conflict.person == self.judge.pk for conflict in conflicts.find_conflicts([self.term])))
+        second.date_time = self.start + 3 * HOUR
+        second.save()
+        self.assertFalse(any(conflict.person == self.judge.pk
+                             for conflict in conflicts.find_conflicts([self.term])))
+
+    def test_find_busy(self):
+        first = self.schedule(self.first, self.start)
+        busy = conflicts.find_busy([self.judge.pk], self.start + HOUR)
+        self.assertEqual(busy, [(self.judge.pk, first.code, self.start)])
+        self.assertEqual(conflicts.find_busy([self.judge.pk], self.start + HOUR, exclude=first.code), [])
+        self.assertEqual(conflicts.find_busy([self.judge.pk], self.start + 2 * HOUR), [])
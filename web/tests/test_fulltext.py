@@ -0,0 +1,47 @@
+from django.test import TestCase
+
+from web.listing import THESIS_LIST
+from web.models import HistoricThesisStatus, SearchDocument, Term, Thesis, ThesisStatus
+from web.tests import clear_caches, generate_dataset
+
+
+class ThesisSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset()
+
+    def setUp(self):
+        clear_caches()
+
+    def search(self, text):
+        return set(THESIS_LIST.get_queryset(text).values_list('code', flat=True))
+
+    def test_current_status(self):
+        status = ThesisStatus.objects.get(name='Diferido')
+        expected = set(Thesis.objects.filter(current_status=status).values_list('code', flat=True))
+        self.assertTrue(expected)
+        self.assertEqual(self.search('Diferido'), expected)
+
+        status.name = 'Pospuesto'
+        status.save()
+        self.assertEqual(self.search('Pospuesto'), expected)
+        self.assertEqual(self.search('Diferido'), set())
+
+    def test_status_history_deleted(self):
+        thesis = Thesis.objects.filter(historicthesisstatus__isnull=False).first()
+        status = thesis.current_status.name
+        self.assertIn(thesis.code, self.search(status))
+        HistoricThesisStatus.objects.filter(thesis=thesis).delete()
+        self.assertNotIn(thesis.code, self.search(status))
+        self.assertEqual(SearchDocument.objects.get(kind=SearchDocument.THESIS, key=thesis.code).status, '')
+
+    def test_delivery_term(self):
+        term = Term.objects.order_by('period').first()
+        expected = set(Thesis.objects.filter(delivery_term=term).values_list('code', flat=True))
+        self.assertTrue(expected)
+        self.assertTrue(expected <= self.search(str(term.period)))
+
+        term.period = 190015
+        term.save()
+        self.assertEqual(self.search('190015'), expected)
@@ -0,0 +1,75 @@
+import statistics
+from django.test import TestCase
+
+from web import grades
+from web.models import Defence, Jury, Term, TermGradeStats
+from web.tests import generate_dataset
+
+
+class GradeSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset()
+
+    def setUp(self):
+        self.terms = list(Term.objects.filter(thesis__defence__grade__isnull=False).distinct().values_list(
+            'pk', flat=True))
+
+    def assertSummaryMatches(self, terms):
+        summary = grades.summarize(terms)
+        values = list(Defence.objects.filter(thesis__delivery_term__in=terms, grade__isnull=False).values_list(
+            'grade', flat=True))
+        self.assertEqual(summary.count, len(values))
+        self.assertAlmostEqual(summary.mean, statistics.mean(values))
+        self.assertEqual(summary.median, statistics.median(values))
+        self.assertEqual(summary.mode, min(statistics.multimode(values)))
+        self.assertAlmostEqual(summary.stdev, statistics.stdev(values))
+        self.assertEqual(sum(summary.histogram), len(values))
+
+    def test_summary_of_the_defences(self):
+        self.assertTrue(self.terms)
+        self.assertSummaryMatches(self.terms)
+        self.assertSummaryMatches(self.terms[:1])
+
+    def test_no_grades(self):
+        summary = grades.summarize([])
+        self.assertEqual(summary, grades.GradeSummary(0, None, None, None, None,
+                                                      [0] * (TermGradeStats.MAX_GRADE + 1)))
+
+    def test_saving_a_defence_moves_its_grade(self):
+        defence = Defence.objects.filter(grade__isnull=False).select_related('thesis').first()
+        defence.grade = (defence.grade + 5) % (TermGradeStats.MAX_GRADE + 1)
+        defence.save()
+        self.assertSummaryMatches(self.terms)
+
+        ungraded = Defence.objects.filter(grade__isnull=True).select_related('thesis').first()
+        ungraded.grade = 20
+        ungraded.save()
+        self.assertSummaryMatches(self.terms + [ungraded.thesis.delivery_term_id])
+
+        # The jury protects its defence
+        Jury.objects.filter(defence=defence).delete()
+        defence.delete()
+        self.assertSummaryMatches(self.terms)
+
+    def test_rebuild(self):
+        before = {stats.term_id: (stats.count, stats.total, stats.total_squares, stats.histogram)
+                  for stats in TermGradeStats.objects.all()}
+        TermGradeStats.objects.all().delete()
+        grades.rebuild()
+        after = {stats.term_id: (stats.count, stats.total, stats.total_squares, stats.histogram)
+                 for stats in TermGradeStats.objects.all()}
+        self.assertEqual(after, before)
+
+    def test_grade_outside_the_histogram(self):
+        # Saved without the validation of the form, it is left out of the statistics instead of failing
+        defence = Defence.objects.filter(grade__isnull=True).select_related('thesis').first()
+        defence.grade = TermGradeStats.MAX_GRADE + 5
+        defence.save()
+        summary = grades.summarize([defence.thesis.delivery_term_id])
+        grades.rebuild()
+        self.assertEqual(grades.summarize([defence.thesis.delivery_term_id]), summary)
+        defence.grade = 10
+        defence.save()
+        self.assertEqual(grades.summarize([defence.thesis.delivery_term_id]).count, summary.count + 1)
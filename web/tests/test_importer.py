@@ -0,0 +1,85 @@
+from unittest import mock
+from django.test import TestCase
+
+from web import importer, versions
+from web.models import HistoricProposalStatus, PersonData, PersonType, Proposal, Term
+
+PERSON_COLUMNS = 'id_card_number,name,last_name,primary_phone_number,email,ucab_email,type\n'
+
+
+def person_row(id_card_number, ucab_email='', person_type='Estudiante', email=None):
+    email = email or '%s@example.com' % id_card_number.lower()
+    return '%s,Ana,Pérez,0212-5551234,%s,%s,%s\n' % (id_card_number, email, ucab_email, person_type)
+
+
+class PersonImporterTests(TestCase):
+
+    def test_valid_rows(self):
+        result = importer.PersonImporter().run([PERSON_COLUMNS, person_row('V1'), person_row('V2', 'v2@ucab.edu.ve'),
+                                                person_row('V3', person_type='Profesor')])
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.created, 3)
+        self.assertEqual(PersonData.objects.get(pk='V3').type.name, 'Profesor')
+        # A missing UCAB email is stored as NULL, so several of them fit in the unique index
+        self.assertEqual(PersonData.objects.filter(ucab_email__isnull=True).count(), 2)
+
+    def test_invalid_rows(self):
+        PersonData.objects.create(id_card_number='V1', name='Ana', last_name='Pérez', email='ana@example.com',
+                                  primary_phone_number='0212-5551234',
+                                  type=PersonType.objects.get(name='Estudiante'))
+        result = importer.PersonImporter().run([
+            PERSON_COLUMNS,
+            person_row('V1'),
+            person_row('V2', person_type='Astronauta'),
+            person_row('V3', email='no es un correo'),
+            person_row('V4', 'v4@ucab.edu.ve'),
+            person_row('V4'),
+            person_row('V5', 'v4@ucab.edu.ve'),
+        ])
+        self.assertEqual(result.created, 1)
+        self.assertEqual(sorted(line for line, _ in result.errors), [2, 3, 4, 6, 7])
+        self.assertIn('Ya existe un registro con id_card_number "V1"', dict(result.errors)[2])
+        self.assertIn('No existe "Astronauta"', dict(result.errors)[3])
+        self.assertIn('repetido en el archivo', dict(result.errors)[6])
+        self.assertIn('repetido en el archivo', dict(result.errors)[7])
+        self.assertEqual(list(PersonData.objects.exclude(pk='V1').values_list('pk', flat=True)), ['V4'])
+
+    def test_dry_run(self):
+        version = versions.get_version(PersonData)
+        result = importer.PersonImporter().run([PERSON_COLUMNS, person_row('V1'), person_row('V2')], dry_run=True)
+        self.assertEqual(result.created, 2)
+        self.assertFalse(PersonData.objects.exists())
+        self.assertEqual(versions.get_version(PersonData), version)
+
+    def test_version_bumped_per_batch(self):
+        version = versions.get_version(PersonData)
+        with mock.patch.object(importer, 'BATCH_SIZE', 2):
+            result = importer.PersonImporter().run([PERSON_COLUMNS] + [person_row('V%d' % number)
+                                                                       for number in range(5)])
+        self.assertEqual(result.created, 5)
+        self.assertEqual(versions.get_version(PersonData), version + 3)
+
+
+class ProposalImporterTests(TestCase):
+    columns = 'code,submission_date,title,student1,student2,academic_tutor,industry_tutor,term,proposal_status\n'
+
+    def setUp(self):
+        importer.PersonImporter().run([PERSON_COLUMNS, person_row('V1'), person_row('V2'),
+                                       person_row('V3', person_type='Profesor')])
+        Term.objects.create(period=201925)
+
+    def test_references(self):
+        result = importer.ProposalImporter().run([
+            self.columns,
+            'P1,2019-10-01,Primera,V1,V2,V3,,201925,Aprobada\n',
+            'P2,2019-10-01,Segunda,V9,,V3,,201925,Aprobada\n',
+            'P3,2019-10-01,Tercera,V1,,V3,,201915,Aprobada\n',
+            'P4,2019-10-01,Cuarta,V2,,V3,,201925,Inventada\n',
+        ])
+        self.assertEqual(result.created, 1)
+        self.assertEqual(sorted(line for line, _ in result.errors), [3, 4, 5])
+        proposal = Proposal.objects.get(pk='P1')
+        self.assertEqual((proposal.student2_id, proposal.term.period), ('V2', 201925))
+        # What Proposal.save would have written
+        self.assertEqual(list(HistoricProposalStatus.objects.filter(proposal=proposal).values_list(
+            'status__name', flat=True)), ['Aprobada'])
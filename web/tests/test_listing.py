@@ -0,0 +1,80 @@
+from django.core.paginator import Page
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from web.listing import CountedPaginator, KeysetPage, KeysetPaginator, paginate
+from web.models import PersonData, Thesis, User
+from web.tests import clear_caches, generate_dataset
+
+
+class PaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset()
+
+    def setUp(self):
+        clear_caches()
+        self.factory = RequestFactory()
+        self.persons = PersonData.objects.order_by('last_name', 'name', 'pk')
+
+    def test_counted_page(self):
+        page = paginate(self.factory.get('/', {'page': 2}), self.persons)
+        self.assertIsInstance(page, Page)
+        self.assertEqual(page.number, 2)
+        self.assertEqual(page.paginator.count, self.persons.count())
+        self.assertEqual(list(page), list(self.persons[15:30]))
+
+    def test_count_limit(self):
+        paginator = CountedPaginator(self.persons, 10, count_limit=25)
+        self.assertTrue(paginator.count_is_estimate)
+        self.assertEqual(paginator.count, 25)
+        page = paginator.page(3)
+        self.assertTrue(page.has_next())
+        self.assertEqual(list(page), list(self.persons[20:30]))
+        # Past the known rows, the last page of the count
+        self.assertEqual(paginator.get_page(100).number, 3)
+
+    def test_keyset_pages_cover_every_row(self):
+        rows = []
+        after = None
+        while True:
+            page = paginate(self.factory.get('/', {'pagination': 'keyset', 'after': after or ''}), self.persons,
+                            keyset=True)
+            self.assertIsInstance(page, KeysetPage)
+            rows.extend(page)
+            if not page.has_next():
+                break
+            after = page.next_token
+        self.assertEqual(rows, list(self.persons))
+
+        # And back from the last page
+        previous = paginate(self.factory.get('/', {'before': page.previous_token}), self.persons, keyset=True)
+        expected = list(self.persons)
+        end = len(expected) - len(page)
+        self.assertEqual(list(previous), expected[end - 15:end])
+
+    def test_keyset_only_when_offered(self):
+        page = paginate(self.factory.get('/', {'pagination': 'keyset'}), self.persons)
+        self.assertIsInstance(page, Page)
+
+    def test_nullable_ordering_not_supported(self):
+        for ordering in ('company_name', 'proposal__industry_tutor__last_name', '-current_status__name'):
+            with self.subTest(ordering):
+                theses = Thesis.objects.order_by(ordering)
+                self.assertFalse(KeysetPaginator(theses, 15).supported)
+                page = paginate(self.factory.get('/', {'pagination': 'keyset'}), theses, keyset=True)
+                self.assertIsInstance(page, Page)
+        self.assertTrue(KeysetPaginator(Thesis.objects.order_by('-delivery_term__period', 'code'), 15).supported)
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_views_offering_keyset(self):
+        self.client.force_login(User.objects.create_user('manager', is_manager=True))
+        for url_name, list_name, keyset in (('person_index', 'person_list', True),
+                                            ('thesis_historic_index', 'thesis_list', True),
+                                            ('thesis_index', 'thesis_list', False),
+                                            ('proposal_index', 'proposal_list', False)):
+            with self.subTest(url_name):
+                response = self.client.get(reverse(url_name), {'pagination': 'keyset'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(isinstance(response.context[list_name], KeysetPage), keyset)
@@ -0,0 +1,102 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+
+from web import scheduling, versions
+from web.forms import DefenceForm
+from web.models import Defence, Jury, PersonData, Thesis
+from web.tests import generate_dataset
+
+COLUMNS = 'thesis,date_time,jury,backup_jury\n'
+
+
+class ScheduleDefencesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset()
+
+    def setUp(self):
+        self.theses = list(Thesis.objects.filter(defence__isnull=True).select_related('proposal').order_by('code')[:3])
+        tutors = {thesis.proposal.academic_tutor_id for thesis in self.theses}
+        self.judges = list(PersonData.objects.filter(type__name='Profesor').exclude(pk__in=tutors).values_list(
+            'pk', flat=True).order_by('pk')[:4])
+        self.start = timezone.localtime().replace(second=0, microsecond=0) + datetime.timedelta(days=7)
+
+    def row(self, thesis, hours, judges, backup=''):
+        date_time = (self.start + datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M')
+        return '%s,%s,%s,%s\n' % (thesis.code, date_time, ' '.join(judges), backup)
+
+    def test_valid_schedule(self):
+        version = versions.get_version(Defence)
+        result = scheduling.schedule_defences([
+            COLUMNS,
+            self.row(self.theses[0], 0, self.judges[:1], self.judges[1]),
+            self.row(self.theses[1], 0, self.judges[2:4]),
+        ])
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.created, 2)
+        defence = Defence.objects.get(thesis=self.theses[0])
+        self.assertEqual(defence.date_time, self.start)
+        jury = set(Jury.objects.filter(defence=defence).values_list('person', 'is_backup_jury'))
+        # The academic tutor joins the principal jury
+        self.assertEqual(jury, {(self.theses[0].proposal.academic_tutor_id, False), (self.judges[0], False),
+                                (self.judges[1], True)})
+        self.assertEqual(versions.get_version(Defence), version + 1)
+
+    def test_invalid_row_writes_nothing(self):
+        result = scheduling.schedule_defences([
+            COLUMNS,
+            self.row(self.theses[0], 0, self.judges[:1]),
+            self.row(self.theses[1], 0, ['V0']),
+            self.row(self.theses[2], -24 * 30, self.judges[2:3]),
+        ])
+        self.assertEqual(result.created, 0)
+        self.assertEqual(sorted({line for line, _ in result.errors}), [3, 4])
+        self.assertFalse(Defence.objects.filter(thesis__in=self.theses).exists())
+
+    def test_limits_and_repetitions(self):
+        thesis = self.theses[0]
+        tutor = thesis.proposal.academic_tutor_id
+        cases = [
+            ([self.judges[0], self.judges[0]], '', 'Hay jueces repetidos en el jurado'),
+            (self.judges[:3], '', 'Límite de jueces superado'),
+            (self.judges[:1], self.judges[0], 'El jurado suplente ya es parte del jurado'),
+            (self.judges[:1], tutor, 'El tutor académico no puede ser el jurado suplente'),
+        ]
+        for judges, backup, message in cases:
+            with self.subTest(message):
+                result = scheduling.schedule_defences([COLUMNS, self.row(thesis, 0, judges, backup)])
+                self.assertEqual(result.created, 0)
+                self.assertTrue(any(error.startswith(message) for _, error in result.errors), result.errors)
+
+    def test_repeated_thesis(self):
+        result = scheduling.schedule_defences([COLUMNS, self.row(self.theses[0], 0, self.judges[:1]),
+                                               self.row(self.theses[0], 5, self.judges[1:2])])
+        self.assertEqual([line for line, _ in result.errors], [3])
+
+    def test_double_booking(self):
+        # The same judge in two defences an hour apart, one of them stored and the other in the file
+        scheduling.schedule_defences([COLUMNS, self.row(self.theses[0], 0, self.judges[:1])])
+        Thesis.objects.filter(pk=self.theses[1].pk).update(delivery_term=self.theses[0].delivery_term_id)
+        result = scheduling.schedule_defences([COLUMNS, self.row(self.theses[1], 1, self.judges[:1])])
+        self.assertEqual(result.created, 0)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('también participa en la defensa D%s' % self.theses[0].code, result.errors[0].message)
+
+    def test_dry_run(self):
+        result = scheduling.schedule_defences([COLUMNS, self.row(self.theses[0], 0, self.judges[:1])], dry_run=True)
+        self.assertEqual((result.created, result.errors), (1, []))
+        self.assertFalse(Defence.objects.filter(thesis=self.theses[0]).exists())
+
+    def test_same_judge_limit_as_the_form(self):
+        # The tutor and two judges fill the principal jury, the backup doesn't count
+        result = scheduling.schedule_defences([COLUMNS, self.row(self.theses[0], 0, self.judges[:2],
+                                                                 self.judges[2])])
+        self.assertEqual(result.errors, [])
+        defence = Defence.objects.get(thesis=self.theses[0])
+        data = {'thesis': self.theses[0].pk, 'date_time': self.start.strftime('%Y-%m-%dT%H:%M')}
+        self.assertTrue(DefenceForm(data=data, instance=defence).is_valid())
+        form = DefenceForm(data=dict(data, jury=[self.judges[3]]), instance=defence)
+        self.assertFalse(form.is_valid())
+        self.assertIn('jury', form.errors)
@@ -0,0 +1,14 @@
+import datetime
+from django.test import SimpleTestCase, override_settings
+
+from web import tabular
+from web.models import Defence
+
+
+class DefenceColumnsTests(SimpleTestCase):
+
+    @override_settings(TIME_ZONE='America/Caracas')
+    def test_date_in_the_local_time_zone(self):
+        defence = Defence(date_time=datetime.datetime(2020, 3, 2, 14, 30, tzinfo=datetime.timezone.utc))
+        column = next(column for column in tabular.DEFENCE_COLUMNS if column.header == 'Fecha')
+        self.assertEqual(column.value(defence), '2020-03-02 10:30')
@@ -0,0 +1,129 @@
+"""
+Status timelines of theses and proposals, from HistoricThesisStatus and HistoricProposalStatus.
+
+Every history row is the status an entity got at its date, which lasts until the next row of the same entity.
+The status as of a date is the latest row up to it, a correlated subquery answered from the (entity, date)
+index. The time spent in each status pairs every row with the date of the next one with the LEAD() window
+function and adds the spans up per term and status in the same SQL query, so the cost is a single pass over the
+history of the selected terms. The date arithmetic uses SQLite's julianday().
+
+get_status_report() puts both together for the statistics page, cached until the history or the statuses change.
+"""
+import datetime
+from collections import namedtuple
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery, Window
+from django.db.models.functions import Lead
+from django.utils import timezone
+
+from . import versions
+from .caching import LRUCache
+from .models import HistoricProposalStatus, HistoricThesisStatus, Proposal, ProposalStatus, Term, Thesis, ThesisStatus
+
+# ``entity``: the foreign key of the history rows to the model with the status, ``term``: the path from that
+# model to its Term (proposals belong to the term they were submitted in, theses to their delivery term)
+History = namedtuple('History', ('model', 'entity_model', 'entity', 'term'))
+
+THESIS_HISTORY = History(HistoricThesisStatus, Thesis, 'thesis', 'delivery_term')
+PROPOSAL_HISTORY = History(HistoricProposalStatus, Proposal, 'proposal', 'term')
+
+# Time spent in a status by the entities of a term: how many of them had it, and the days spent in it in total
+# and per entity
+StatusDuration = namedtuple('StatusDuration', ('term', 'status', 'entities', 'days', 'average_days'))
+
+# Status counts of count_as_of and durations of time_in_status, of the theses and the proposals
+StatusReport = namedtuple('StatusReport', ('thesis_counts', 'proposal_counts', 'thesis_durations',
+                                           'proposal_durations'))
+
+REPORT_MODELS = (HistoricThesisStatus, HistoricProposalStatus, Thesis, Proposal, ThesisStatus, ProposalStatus, Term)
+
+_reports = LRUCache(maxsize=64)
+
+
+def end_of_day(date):
+    """
+    The first moment after ``date``, to take every change made during that day.
+    """
+    return timezone.make_aware(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min))
+
+
+def _latest_status(history, date):
+    return Subquery(history.model.objects.filter(**{history.entity: OuterRef('pk'), 'date__lt': date}).order_by(
+        '-date', '-pk').values('status__name')[:1])
+
+
+def as_of(history, date, queryset=None):
+    """
+    The entities of ``queryset`` (all of them by default) annotated with ``status_as_of``, the name of the status
+    they had right before ``date`` (a datetime), None if they had none yet.
+    """
+    if queryset is None:
+        queryset = history.entity_model.objects.all()
+    return queryset.annotate(status_as_of=_latest_status(history, date))
+
+
+def theses_as_of(date, queryset=None):
+    return as_of(THESIS_HISTORY, date, queryset)
+
+
+def proposals_as_of(date, queryset=None):
+    return as_of(PROPOSAL_HISTORY, date, queryset)
+
+
+def count_as_of(history, date, terms):
+    """
+    (status name, entities) of the entities of ``terms`` (ids) right before ``date``, the ones without a status
+    yet under None.
+    """
+    entities = history.entity_model.objects.filter(**{history.term + '__in': terms})
+    counts = as_of(history, date, entities).values('status_as_of').annotate(count=Count('pk')).order_by()
+    return sorted(((row['status_as_of'], row['count']) for row in counts),
+                  key=lambda row: (row[0] is None, row[0] or ''))
+
+
+def time_in_status(history, terms, until=None):
+    """
+    StatusDuration of every term (ids in ``terms``) and status, counting the history up to ``until`` (now by
+    default). The latest status of each entity lasts until then.
+    """
+    until = until or timezone.now()
+    spans = history.model.objects.filter(**{
+        '%s__%s__in' % (history.entity, history.term): terms,
+        'date__lt': until,
+    }).annotate(
+        entity=F(history.entity),
+        period=F('%s__%s__period' % (history.entity, history.term)),
+        status_name=F('status__name'),
+        started=F('date'),
+        ended=Window(Lead('date'), partition_by=[F(history.entity)], order_by=[F('date').asc(), F('pk').asc()]),
+    ).values('entity', 'period', 'status_name', 'started', 'ended')
+    sql, params = spans.query.sql_with_params()
+    query = (
+        'SELECT period, status_name, COUNT(DISTINCT entity), '
+        'SUM(julianday(COALESCE(ended, %s)) - julianday(started)) '
+        'FROM ({}) spans GROUP BY period, status_name ORDER BY period, status_name'.format(sql)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query, (connection.ops.adapt_datetimefield_value(until),) + tuple(params))
+        return [StatusDuration(period, status, entities, days, days / entities)
+                for period, status, entities, days in cursor.fetchall()]
+
+
+def get_status_report(terms, date):
+    """
+    StatusReport of the theses and proposals of ``terms`` (ids) as of the end of ``date``.
+    """
+    terms = tuple(sorted(set(terms)))
+    until = end_of_day(date)
+    key = (terms, until, versions.get_versions(*REPORT_MODELS))
+    report = _reports.get(key)
+    if report is None:
+        report = StatusReport(count_as_of(THESIS_HISTORY, until, terms), count_as_of(PROPOSAL_HISTORY, until, terms),
+                              time_in_status(THESIS_HISTORY, terms, until),
+                              time_in_status(PROPOSAL_HISTORY, terms, until))
+        _reports.set(key, report)
+    return report
+
+
+def clear_cache():
+    _reports.clear()
@@ -8,6 +8,7 @@ urlpatterns = [
     path('accounts/logout/', views.logout_view, name='logout'),
     path('personas', views.person_index, name='person_index'),
     path('personas/agregar', views.PersonDataCreate.as_view(), name='create_person'),
+    path('importar', views.import_records, name='import_records'),
     path('personas/tipos', views.person_type_index, name='person_type_index'),
     path('tg/agregar', views.ThesisCreate.as_view(), name='create_thesis'),
     path('tg/estados', views.thesis_status_index, name='thesis_status_index'),
@@ -20,6 +21,8 @@ urlpatterns = [
     path('defensas/', views.defence_index, name='defence_index'),
     path('defensas/pendientes', views.pending_defence_index, name='pending_defence_index'),
     path('defensas/agregar', views.DefenceCreate.as_view(), name='create_defence'),
+    path('defensas/programar', views.schedule_defences, name='schedule_defences'),
+    path('defensas/asignar-jurado', views.assign_jury, name='assign_jury'),
     path('jurado/agregar', views.JuryCreate.as_view(), name='create_jury'),
     path('jurado/<int:pk>/editar', views.JuryUpdate.as_view(), name='update_jury'),
     path('jurado/<int:pk>/eliminar', views.JuryDelete.as_view(), name='delete_jury'),
@@ -54,4 +57,14 @@ urlpatterns = [
     path('personas-pdf', views.PersonsListPdf.as_view(), name='person_pdf'),
     path('TG-pdf', views.ThesisListPdf.as_view(), name='thesis_pdf'),
     path('TG-historico-pdf', views.ThesisHistoricListPdf.as_view(), name='thesis_historic_pdf'),
+    path('personas-exportar/<str:export_format>', views.person_export, name='person_export'),
+    path('propuestas-exportar/<str:export_format>', views.proposal_export, name='proposal_export'),
+    path('TG-exportar/<str:export_format>', views.thesis_export, name='thesis_export'),
+    path('TG-historico-exportar/<str:export_format>', views.thesis_historic_export, name='thesis_historic_export'),
+    path('defensas-exportar/<str:export_format>', views.defence_export, name='defence_export'),
+    path('defensas-pendientes-exportar/<str:export_format>', views.pending_defence_export,
+         name='pending_defence_export'),
+    path('exportaciones/<uuid:pk>', views.export_job, name='export_job'),
+    path('exportaciones/<uuid:pk>/estado', views.export_job_status, name='export_job_status'),
+    path('exportaciones/<uuid:pk>/descargar', views.export_job_download, name='export_job_download'),
 ]
@@ -0,0 +1,63 @@
+"""
+Per-table data version counters.
+
+Every write to a tracked model bumps its counter (see web.signals). Caches store the version they were built
+at and compare it with the current one, which is a single indexed query no matter how big the tables are.
+"""
+import threading
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+_local = threading.local()
+
+
+def version_name(model):
+    return model._meta.label_lower
+
+
+def get_versions(*models):
+    """
+    Current version of each model, in the same order.
+    """
+    names = [version_name(model) for model in models]
+    versions = getattr(_local, 'snapshot', None)
+    if versions is None:
+        versions = dict(DataVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def get_version(model):
+    return get_versions(model)[0]
+
+
+def bump_version(model):
+    """
+    Increment the version of a model and return the new value.
+    """
+    name = version_name(model)
+    with transaction.atomic():
+        DataVersion.objects.get_or_create(name=name)
+        DataVersion.objects.filter(name=name).update(version=F('version') + 1)
+        version = DataVersion.objects.values_list('version', flat=True).get(name=name)
+    if getattr(_local, 'snapshot', None) is not None:
+        _local.snapshot[name] = version
+    return version
+
+
+@contextmanager
+def snapshot():
+    """
+    Read every version with one query and answer get_versions() from that copy inside the block, so the checks
+    of a request (its ETag, the cached counts) share a single read.
+    """
+    if getattr(_local, 'snapshot', None) is not None:
+        yield
+        return
+    _local.snapshot = dict(DataVersion.objects.values_list('name', 'version'))
+    try:
+        yield
+    finally:
+        _local.snapshot = None
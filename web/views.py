@@ -1,23 +1,37 @@
+import csv
+import io
 import operator
-import statistics
+import os
 from dal import autocomplete
+from django.contrib import messages
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import login_required
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core import signing
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import HttpResponse
-from django.shortcuts import render, get_object_or_404
+from django.db.models import Exists, OuterRef, Q
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render, get_object_or_404
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
 from django.views.generic import View
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from functools import reduce
 
-from . import forms
+from . import (assignment, conflicts, exports, forms, grades, involvement, scheduling, tabular, timeline,
+               versions)
+from .conditional import row_modified, versioned
+from .autocomplete_index import person_search_index, search_queryset
+from .caching import LRUCache
 from .decorators import manager_required
-from .models import PersonData, PersonType, ThesisStatus, Thesis, Proposal, Term, Defence, ProposalStatus, HistoricThesisStatus, Jury
-from .render import render_to_pdf
+from .importer import IMPORTERS
+from .listing import (PROPOSAL_LIST, THESIS_LIST, add_full_names, defence_queryset, get_page_length, paginate,
+                      proposals_not_approved)
+from .models import (PersonData, PersonType, ThesisStatus, Thesis, Proposal, Term, Defence, ProposalStatus, Jury,
+                     ExportJob)
 
 login_view = auth_views.LoginView.as_view(authentication_form=forms.UserLoginForm)
 logout_view = auth_views.LogoutView.as_view()
@@ -27,39 +41,50 @@ def index(request):
     return render(request, 'web/landing.html')
 
 
+@versioned(PersonData, PersonType, *involvement.INVOLVEMENT_MODELS)
 def person_detail(request, pk):
-    person = get_object_or_404(PersonData, pk=pk)
+    person = get_object_or_404(PersonData.objects.select_related('type'), pk=pk)
     context = {
-        'person_data': person
+        'person_data': person,
+        'involvement': involvement.get_involvement(person.pk),
     }
     return render(request, 'web/persons/person_detail.html', context)
 
 
-def person_index(request):
-    search_param = request.GET.get('search')
-    if search_param:
+def _get_person_queryset(search):
+    if search:
         # Append a query for each term received in the search parameters so that if we receive multiple
         # parameters, we crosscheck every single one with the colums id_card_number, name and last_name
         search_args = []
-        for term in search_param.split():
+        for term in search.split():
             for query in ('id_card_number__icontains', 'name__icontains', 'last_name__icontains'):
                 search_args.append(Q(**{query: term}))
         person_list = PersonData.objects.filter(reduce(operator.or_, search_args))
     else:
         # If we don't receive a search parameter, don't apply any filters
-        person_list = PersonData.objects.all().order_by('id_card_number', 'name')
+        person_list = PersonData.objects.all()
+    # The list shows the type of every person
+    return person_list.select_related('type').order_by('id_card_number', 'name')
+
+
+@versioned(PersonData)
+def person_index(request):
+    search_param = request.GET.get('search')
+    person_list = _get_person_queryset(search_param)
 
-    paginator = Paginator(person_list, request.GET.get('page_length', 15))
-    page = request.GET.get('page')
-    persons_by_page = paginator.get_page(page)
     context = {
-        'person_list': persons_by_page,
+        'person_list': paginate(request, person_list, keyset=True),
         'search_form': forms.SearchForm(previous_search=search_param),
         'search_param': search_param
     }
     return render(request, 'web/persons/person_list.html', context)
 
 
+def person_export(request, export_format):
+    person_list = _get_person_queryset(request.GET.get('search'))
+    return tabular.export_response(person_list, tabular.PERSON_COLUMNS, export_format, 'Persons_list')
+
+
 @method_decorator([login_required, manager_required], name='dispatch')
 class PersonDataCreate(SuccessMessageMixin, CreateView):
     model = PersonData
@@ -94,6 +119,30 @@ class PersonDataUpdate(SuccessMessageMixin, UpdateView):
         )
 
 
+@login_required
+@manager_required
+def import_records(request):
+    """
+    Bulk load of persons, proposals or theses from a CSV file (see web.importer).
+    """
+    result = None
+    if request.method == 'POST':
+        form = forms.ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            csv_file = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+            try:
+                result = IMPORTERS[form.cleaned_data['kind']]().run(csv_file, dry_run=form.cleaned_data['dry_run'])
+            except (UnicodeDecodeError, csv.Error):
+                form.add_error('file', 'El archivo debe ser un CSV codificado en UTF-8')
+    else:
+        form = forms.ImportForm()
+    context = {
+        'import_form': form,
+        'result': result,
+    }
+    return render(request, 'web/imports/import_form.html', context)
+
+
 def person_type_index(request):
     search_param = request.GET.get('search')
     if search_param:
@@ -108,7 +157,7 @@ def person_type_index(request):
         # If we don't receive a search parameter, don't apply any filters
         person_type_list = PersonType.objects.all().order_by('name')
 
-    paginator = Paginator(person_type_list, request.GET.get('page_length', 15))
+    paginator = Paginator(person_type_list, get_page_length(request))
     page = request.GET.get('page')
     types_by_page = paginator.get_page(page)
     context = {
@@ -168,7 +217,7 @@ def thesis_status_index(request):
         # If we don't receive a search parameter, don't apply any filters
         thesis_status_list = ThesisStatus.objects.all().order_by('name')
 
-    paginator = Paginator(thesis_status_list, request.GET.get('page_length', 15))
+    paginator = Paginator(thesis_status_list, get_page_length(request))
     page = request.GET.get('page')
     types_by_page = paginator.get_page(page)
     context = {
@@ -213,82 +262,42 @@ class ThesisStatusUpdate(SuccessMessageMixin, UpdateView):
         )
 
 
+@versioned(Thesis, Proposal, PersonData, Term, ThesisStatus)
 def thesis_index(request):
     search_param = request.GET.get('search')
-    if search_param:
-        # Append a query for each term received in the search parameters so that if we receive multiple
-        # parameters, we crosscheck every single one with the colums id_card_number, name and last_name
-        search_args = []
-        for term in search_param.split():
-            for query in ('code__icontains', 'NRC__icontains', 'title__icontains', 'status__name__icontains',
-                          'thematic_category__icontains', 'proposal__title__icontains',
-                          'proposal__student1__name__icontains', 'proposal__student1__last_name__icontains',
-                          'proposal__student1__id_card_number__icontains', 'proposal__student2__name__icontains',
-                          'proposal__student2__last_name__icontains', 'proposal__student2__id_card_number__icontains',
-                          'proposal__academic_tutor__name__icontains', 'proposal__academic_tutor__last_name__icontains',
-                          'proposal__academic_tutor__id_card_number__icontains',
-                          'proposal__industry_tutor__name__icontains', 'proposal__industry_tutor__last_name__icontains',
-                          'proposal__industry_tutor__id_card_number__icontains', 'delivery_term__name__icontains',):
-                search_args.append(Q(**{query: term}))
-            thesis_list = Thesis.objects.filter(reduce(operator.or_, search_args)).order_by(
-                'proposal__student1__id_card_number').exclude(
-                code__in=HistoricThesisStatus.objects.filter(status__name='Aprobado'))
-    else:
-        # If we don't receive a search parameter, don't apply any filters
-        thesis_list = Thesis.objects.all().order_by('proposal__student1__id_card_number').exclude(
-            code__in=HistoricThesisStatus.objects.filter(status__name='Aprobado').values('thesis__code'))
-
-    for thesis in thesis_list:
-        thesis = add_full_names(thesis)
-
-    paginator = Paginator(thesis_list, request.GET.get('page_length', 15))
-    page = request.GET.get('page')
-    thesis_by_page = paginator.get_page(page)
+    thesis_list = THESIS_LIST.get_queryset(search_param).exclude(current_status__name='Aprobado')
     context = {
-        'thesis_list': thesis_by_page,
+        'thesis_list': THESIS_LIST.paginate(request, thesis_list),
         'search_form': forms.SearchForm(previous_search=search_param),
         'search_param': search_param
     }
 
     return render(request, 'web/thesis/thesis_list.html', context)
 
-def thesis_historic_index(request):
-    search_param = request.GET.get('search')
-    if search_param:
-        # Append a query for each term received in the search parameters so that if we receive multiple
-        # parameters, we crosscheck every single one with the colums id_card_number, name and last_name
-        search_args = []
-        for term in search_param.split():
-            for query in ('code__icontains', 'NRC__icontains', 'title__icontains', 'status__name__icontains',
-                          'thematic_category__icontains', 'proposal__title__icontains',
-                          'proposal__student1__name__icontains', 'proposal__student1__last_name__icontains',
-                          'proposal__student1__id_card_number__icontains', 'proposal__student2__name__icontains',
-                          'proposal__student2__last_name__icontains', 'proposal__student2__id_card_number__icontains',
-                          'proposal__academic_tutor__name__icontains', 'proposal__academic_tutor__last_name__icontains',
-                          'proposal__academic_tutor__id_card_number__icontains',
-                          'proposal__industry_tutor__name__icontains', 'proposal__industry_tutor__last_name__icontains',
-                          'proposal__industry_tutor__id_card_number__icontains', 'delivery_term__name__icontains',):
-                search_args.append(Q(**{query: term}))
-            thesis_list = Thesis.objects.filter(reduce(operator.or_, search_args)).order_by(
-                'proposal__student1__id_card_number')
-    else:
-        # If we don't receive a search parameter, don't apply any filters
-        thesis_list = Thesis.objects.all().order_by('proposal__student1__id_card_number')
 
-    for thesis in thesis_list:
-        thesis = add_full_names(thesis)
+def thesis_export(request, export_format):
+    thesis_list = THESIS_LIST.get_queryset(request.GET.get('search')).exclude(current_status__name='Aprobado')
+    return tabular.export_response(thesis_list, tabular.THESIS_COLUMNS, export_format, 'Thesis_list')
 
-    paginator = Paginator(thesis_list, request.GET.get('page_length', 15))
-    page = request.GET.get('page')
-    thesis_by_page = paginator.get_page(page)
+
+@versioned(Thesis, Proposal, PersonData, Term, ThesisStatus)
+def thesis_historic_index(request):
+    search_param = request.GET.get('search')
+    thesis_list = THESIS_LIST.get_queryset(search_param)
     context = {
-        'thesis_list': thesis_by_page,
+        'thesis_list': THESIS_LIST.paginate(request, thesis_list, keyset=True),
         'search_form': forms.SearchForm(previous_search=search_param),
         'search_param': search_param
     }
 
     return render(request, 'web/thesis/thesis_historic_list.html', context)
 
+
+def thesis_historic_export(request, export_format):
+    thesis_list = THESIS_LIST.get_queryset(request.GET.get('search'))
+    return tabular.export_response(thesis_list, tabular.THESIS_COLUMNS, export_format, 'Thesis_historic_list')
+
+
 @method_decorator([login_required, manager_required], name='dispatch')
 class PersonTypeAutoComplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
@@ -301,53 +310,78 @@ class PersonTypeAutoComplete(autocomplete.Select2QuerySetView):
 
 @method_decorator([login_required, manager_required], name='dispatch')
 class ProposalAutocomplete(autocomplete.Select2QuerySetView):
+    # Recent responses, keyed on the data versions of every table the results depend on
+    results_cache = LRUCache(maxsize=512)
+
+    def get(self, request, *args, **kwargs):
+        key = (versions.get_versions(Proposal, Thesis, PersonData), self.q, request.GET.get('page'))
+        content = self.results_cache.get(key)
+        if content is None:
+            content = super().get(request, *args, **kwargs).content
+            self.results_cache.set(key, content)
+        return HttpResponse(content, content_type='application/json')
+
     def get_queryset(self):
-        proposals_with_thesis = list(map(lambda thesis: thesis.proposal.code, Thesis.objects.all()))
-        qs = Proposal.objects.exclude(code__in=proposals_with_thesis)
+        # Proposals that don't have a thesis yet, as a NOT EXISTS anti-join
+        qs = Proposal.objects.filter(~Exists(Thesis.objects.filter(proposal=OuterRef('pk')))).order_by('code')
 
-        if self.q:
-            qs = qs.filter(title__icontains=self.q, code__icontains=self.q, student1__name__icontains=self.q,
-                           student1__last_name__icontains=self.q, student1__id_card_number__icontains=self.q,
-                           student2__name__icontains=self.q, student2__last_name__icontains=self.q,
-                           student2__id_card_number__icontains=self.q)
+        search_args = []
+        for term in self.q.split():
+            search_args.append(reduce(operator.or_, (Q(**{query: term}) for query in (
+                'title__icontains', 'code__icontains', 'student1__name__icontains',
+                'student1__last_name__icontains', 'student1__id_card_number__icontains',
+                'student2__name__icontains', 'student2__last_name__icontains',
+                'student2__id_card_number__icontains',
+            ))))
+        if search_args:
+            qs = qs.filter(reduce(operator.and_, search_args))
         return qs
 
 
 @method_decorator([login_required, manager_required], name='dispatch')
 class TermAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = Term.objects.all()
+        qs = Term.objects.order_by('-period')
 
         if self.q:
-            qs = qs.filter(name__icontains=self.q)
+            qs = qs.filter(period__icontains=self.q)
         return qs
 
 
 class PersonAutoComplete(autocomplete.Select2QuerySetView):
+    # Name of the PersonType the results are restricted to, None for every person
+    person_type = None
+
+    def get(self, request, *args, **kwargs):
+        # Answer from the in-memory index, the database is only queried while it is (re)building
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        results = person_search_index.search(self.q, person_type=self.person_type,
+                                             offset=(page - 1) * self.paginate_by, limit=self.paginate_by)
+        if results is None:
+            return super().get(request, *args, **kwargs)
+        persons, has_more = results
+        return JsonResponse({
+            'results': [{'id': str(pk), 'text': label, 'selected_text': label} for pk, label in persons],
+            'pagination': {'more': has_more},
+        })
+
     def get_queryset(self):
+        # The same matches and order as the index, which answers once it is built
         persons = PersonData.objects.all()
-        search_args = []
-        for term in self.q.split():
-            for query in ('id_card_number__icontains', 'name__icontains', 'last_name__icontains'):
-                search_args.append(Q(**{query: term}))
-
-        if search_args:
-            persons = persons.filter(reduce(operator.or_, search_args))
-        return persons
+        if self.person_type:
+            persons = persons.filter(type__name=self.person_type)
+        return search_queryset(persons, self.q)
 
 
 class TeacherAutoComplete(PersonAutoComplete):
-    def get_queryset(self):
-        qs = super().get_queryset()
-        teacher_type = PersonType.objects.get(name='Profesor')
-        return qs.filter(type=teacher_type)
+    person_type = 'Profesor'
 
 
 class StudentAutoComplete(PersonAutoComplete):
-    def get_queryset(self):
-        qs = super().get_queryset()
-        student_type = PersonType.objects.get(name='Estudiante')
-        return qs.filter(type=student_type)
+    person_type = 'Estudiante'
 
 
 @method_decorator([login_required, manager_required], name='dispatch')
@@ -384,8 +418,9 @@ class ThesisUpdate(SuccessMessageMixin, UpdateView):
         )
 
 
+@row_modified(Thesis)
 def thesis_detail(request, pk):
-    thesis = get_object_or_404(Thesis, pk=pk)
+    thesis = get_object_or_404(THESIS_LIST.get_queryset(), pk=pk)
     thesis = add_full_names(thesis)
 
     context = {
@@ -394,8 +429,9 @@ def thesis_detail(request, pk):
     return render(request, 'web/thesis/thesis_detail.html', context)
 
 
+@row_modified(Thesis)
 def thesis_historic_detail(request, pk):
-    thesis = get_object_or_404(Thesis, pk=pk)
+    thesis = get_object_or_404(THESIS_LIST.get_queryset(), pk=pk)
     thesis = add_full_names(thesis)
 
     context = {
@@ -404,76 +440,51 @@ def thesis_historic_detail(request, pk):
     return render(request, 'web/thesis/thesis_historic_detail.html', context)
 
 
-def add_full_names(thesis):
-    thesis.status = HistoricThesisStatus.objects.filter(thesis__code=thesis.code).order_by('-date')[0].status
-    thesis.proposal.academic_tutor.full_name = "{} {}".format(thesis.proposal.academic_tutor.name,
-                                                              thesis.proposal.academic_tutor.last_name)
-    if thesis.proposal.industry_tutor:
-        thesis.proposal.industry_tutor.full_name = "{} {}".format(thesis.proposal.industry_tutor.name,
-                                                                  thesis.proposal.industry_tutor.last_name)
-    thesis.proposal.student1.full_name = "{} {}".format(thesis.proposal.student1.name,
-                                                        thesis.proposal.student1.last_name)
-    if thesis.proposal.student2:
-        thesis.proposal.student2.full_name = "{} {}".format(thesis.proposal.student2.name,
-                                                            thesis.proposal.student2.last_name)
-    return thesis
-
-
-def _get_defence_queryset(filter_completed, search):
-    order_params = [
-        'thesis__proposal__student1__id_card_number',
-        'thesis__proposal__student2__id_card_number',
-    ]
-    if search:
-        # Append a query for each term received in the search parameters so that if we receive multiple
-        # parameters, we crosscheck every single one with the colums id_card_number, name and last_name
-        search_args = []
-        for term in search.split():
-            for query in ('code__icontains', 'grade__icontains', 'thesis__title__icontains'):
-                search_args.append(Q(**{query: term}))
-        queryset = Defence.objects.filter(reduce(operator.or_, search_args))
-    else:
-        # If we don't receive a search parameter, don't apply any filters
-        queryset = Defence.objects.all()
-
-    if filter_completed:
-        queryset = queryset.filter(grade__isnull=True)
-
-    return queryset.order_by(*order_params)
-
-
-def _generate_defence_index_context(defence_queryset, page_length, desired_page, search):
-    paginator = Paginator(defence_queryset, page_length)
-    defences_for_page = paginator.get_page(desired_page)
+def _generate_defence_index_context(request, defence_queryset, search):
+    defences = paginate(request, defence_queryset)
+    # Double-booked judges in the terms of the listed defences
+    terms = {defence.thesis.delivery_term_id for defence in defences}
     return {
-        'defences': defences_for_page,
+        'defences': defences,
+        'conflicts': conflicts.find_conflicts(terms),
         'search_form': forms.SearchForm(previous_search=search),
         'search_param': search
     }
 
 
+@versioned(Defence, Jury, Thesis, Proposal, PersonData, Term)
 def defence_index(request):
     """
     List of all the registered defences.
     """
     search_param = request.GET.get('search')
-    defence_list = _get_defence_queryset(False, search_param)
-    page = request.GET.get('page')
-    context = _generate_defence_index_context(defence_list, request.GET.get('page_length', 15), page, search_param)
+    defence_list = defence_queryset(False, search_param)
+    context = _generate_defence_index_context(request, defence_list, search_param)
     return render(request, 'web/defences/defence_list.html', context)
 
 
+@versioned(Defence, Jury, Thesis, Proposal, PersonData, Term)
 def pending_defence_index(request):
     """
     List of defences that haven't been graded yet.
     """
     search_param = request.GET.get('search')
-    defence_list = _get_defence_queryset(True, search_param)
-    page = request.GET.get('page')
-    context = _generate_defence_index_context(defence_list, request.GET.get('page_length', 15), page, search_param)
+    defence_list = defence_queryset(True, search_param)
+    context = _generate_defence_index_context(request, defence_list, search_param)
     return render(request, 'web/defences/defence_list.html', context)
 
 
+def defence_export(request, export_format):
+    defence_list = defence_queryset(False, request.GET.get('search'))
+    return tabular.export_response(defence_list, tabular.DEFENCE_COLUMNS, export_format, 'Defences')
+
+
+def pending_defence_export(request, export_format):
+    defence_list = defence_queryset(True, request.GET.get('search'))
+    return tabular.export_response(defence_list, tabular.DEFENCE_COLUMNS, export_format, 'Pending_defences')
+
+
+@row_modified(Proposal)
 def proposal_detail(request, pk):
     proposal = get_object_or_404(Proposal, pk=pk)
     context = {
@@ -482,31 +493,24 @@ def proposal_detail(request, pk):
     return render(request, 'web/proposal/proposal_detail.html', context)
 
 
+@versioned(Proposal, PersonData, Term, ProposalStatus)
 def proposal_index(request):
     search_param = request.GET.get('search')
-    if search_param:
-        # Append a query for each term received in the search parameters so that if we receive multiple
-        # parameters, we crosscheck every single one with the colums id_card_number, name and last_name
-        search_args = []
-        for term in search_param.split():
-            for query in ('code__icontains', 'title__icontains',):
-                search_args.append(Q(**{query: term}))
-        proposal_list = Proposal.objects.filter(reduce(operator.or_, search_args))
-    else:
-        # If we don't receive a search parameter, don't apply any filters
-        proposal_list = Proposal.objects.all().select_related().order_by('code')
-
-    paginator = Paginator(proposal_list, request.GET.get('page_length', 15))
-    page = request.GET.get('page')
-    proposal_by_page = paginator.get_page(page)
+    proposal_list = PROPOSAL_LIST.get_queryset(search_param)
     context = {
-        'proposal_list': proposal_by_page,
+        'proposal_list': PROPOSAL_LIST.paginate(request, proposal_list),
         'search_form': forms.SearchForm(previous_search=search_param),
         'search_param': search_param
     }
     return render(request, 'web/proposal/proposal_list.html', context)
 
 
+def proposal_export(request, export_format):
+    proposal_list = PROPOSAL_LIST.get_queryset(request.GET.get('search')).select_related(
+        'academic_tutor', 'industry_tutor')
+    return tabular.export_response(proposal_list, tabular.PROPOSAL_COLUMNS, export_format, 'Proposals')
+
+
 @method_decorator([login_required, manager_required], name='dispatch')
 class ProposalCreate(SuccessMessageMixin, CreateView):
     model = Proposal
@@ -543,7 +547,7 @@ class ProposalEdit(SuccessMessageMixin, UpdateView):
 
 def term_index(request):
     term_list = Term.objects.all()
-    paginator = Paginator(term_list, request.GET.get('page_length', 15))
+    paginator = Paginator(term_list, get_page_length(request))
     page = request.GET.get('page')
     terms_by_page = paginator.get_page(page)
     context = {
@@ -588,7 +592,7 @@ class TermUpdate(SuccessMessageMixin, UpdateView):
 
 def proposal_status_index(request):
     proposal_status_list = ProposalStatus.objects.all()
-    paginator = Paginator(proposal_status_list, request.GET.get('page_length', 15))
+    paginator = Paginator(proposal_status_list, get_page_length(request))
     page = request.GET.get('page')
     proposal_status_by_page = paginator.get_page(page)
     context = {
@@ -631,13 +635,11 @@ class ProposalStatusUpdate(SuccessMessageMixin, UpdateView):
         )
 
 
+@versioned(Proposal, PersonData, Term, ProposalStatus)
 def proposal_not_approved_list(request):
-    proposal_list = Proposal.objects.select_related().exclude(proposal_status__name="Aprobada").order_by('student1__id_card_number')
-    paginator = Paginator(proposal_list, request.GET.get('page_length', 15))
-    page = request.GET.get('page')
-    proposal_by_page = paginator.get_page(page)
+    proposal_list = proposals_not_approved().select_related()
     context = {
-        'proposal_list': proposal_by_page
+        'proposal_list': paginate(request, proposal_list)
     }
     return render(request, 'web/proposal/proposal_not_approved_list.html', context)
 
@@ -647,21 +649,26 @@ def stats_view(request):
         form = forms.StatsForm(request.POST)
         if form.is_valid():
             term_list = form.cleaned_data['terms']
-            thesis_for_terms = Thesis.objects.filter(delivery_term__in=term_list)
-            defences_for_thesis = Defence.objects.filter(thesis__in=thesis_for_terms).filter(grade__isnull=False)
-            grades = list(map(lambda defence: defence.grade, defences_for_thesis))
-            try:
-                mode = statistics.mode(grades)
-            except:
-                mode = '-'
+            summary = grades.summarize(term_list)
+            as_of = form.cleaned_data['as_of'] or timezone.localdate()
+            report = timeline.get_status_report([term.pk for term in term_list], as_of)
             context = {
                 'term_form': forms.StatsForm(),
                 'term_list': term_list,
-                'defence_list': defences_for_thesis,
-                'grade_mean': statistics.mean(grades) if len(grades) > 0 else '-',
-                'median_grade': statistics.median(grades) if len(grades) > 0 else '-',
-                'mode': mode,
-                'standard_deviation': statistics.stdev(grades) if len(grades) > 1 else '-',
+                'as_of': as_of,
+                'thesis_statuses': report.thesis_counts,
+                'proposal_statuses': report.proposal_counts,
+                'status_times': [
+                    ('Tiempo en cada estado de los trabajos de grado', 'Trabajos de grado',
+                     report.thesis_durations),
+                    ('Tiempo en cada estado de las propuestas', 'Propuestas', report.proposal_durations),
+                ],
+                'grade_count': summary.count,
+                'grade_histogram': [(grade, count) for grade, count in enumerate(summary.histogram) if count],
+                'grade_mean': summary.mean if summary.mean is not None else '-',
+                'median_grade': summary.median if summary.median is not None else '-',
+                'mode': summary.mode if summary.mode is not None else '-',
+                'standard_deviation': summary.stdev if summary.stdev is not None else '-',
             }
             return render(request, 'web/stats/stats.html', context)
     else:
@@ -674,21 +681,84 @@ def stats_view(request):
 @method_decorator([login_required, manager_required], name='dispatch')
 class ThesisAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        queryset = Thesis.objects.all()
-        if self.q:
-            queryset = queryset.filter(
-                title__icontains=self.q,
-                code__icontains=self.q,
-                proposal__code=self.q,
-                delivery_term__period__exact=self.q,
-                NRC__icontains=self.q,
-                thematic_category__icontains=self.q,
-                submission_date__exact=self.q,
-                company_name__icontains=self.q,
-            )
+        queryset = Thesis.objects.order_by('code')
+        # Every term must be found in at least one of the columns
+        search_args = []
+        for term in self.q.split():
+            search_args.append(reduce(operator.or_, (Q(**{query: term}) for query in (
+                'title__icontains', 'code__icontains', 'NRC__icontains', 'thematic_category__icontains',
+                'company_name__icontains', 'delivery_term__period__icontains',
+            ))))
+        if search_args:
+            queryset = queryset.filter(reduce(operator.and_, search_args))
         return queryset
 
 
+@login_required
+@manager_required
+def schedule_defences(request):
+    """
+    Bulk scheduling of the defences of a CSV file (see web.scheduling).
+    """
+    result = None
+    if request.method == 'POST':
+        form = forms.DefenceScheduleForm(request.POST, request.FILES)
+        if form.is_valid():
+            csv_file = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+            try:
+                result = scheduling.schedule_defences(csv_file, dry_run=form.cleaned_data['dry_run'])
+            except (UnicodeDecodeError, csv.Error):
+                form.add_error('file', 'El archivo debe ser un CSV codificado en UTF-8')
+    else:
+        form = forms.DefenceScheduleForm()
+    context = {
+        'schedule_form': form,
+        'result': result,
+    }
+    return render(request, 'web/defences/defence_schedule_form.html', context)
+
+
+_JURY_PLAN_SALT = 'web.views.assign_jury'
+
+
+@login_required
+@manager_required
+def assign_jury(request):
+    """
+    Preview of the automatic jury assignment of a term (see web.assignment), written when the manager confirms.
+    """
+    plan = None
+    token = None
+    if request.method == 'POST':
+        form = forms.JuryAssignmentForm(request.POST)
+        if form.is_valid():
+            term = form.cleaned_data['term']
+            try:
+                # The token is bound to the term it was previewed for, it can't confirm the plan of another one
+                signed_term, data_versions = signing.loads(request.POST.get('plan', ''), salt=_JURY_PLAN_SALT)
+                if signed_term != term.pk:
+                    raise assignment.StalePlan()
+                plan = assignment.commit_plan(term, data_versions)
+            except (signing.BadSignature, TypeError, ValueError, assignment.StalePlan):
+                messages.warning(request, 'Los datos cambiaron desde la vista previa, revisa la nueva asignación.')
+                return redirect('%s?term=%d' % (reverse('assign_jury'), term.pk))
+            messages.success(request, 'Se asignaron %d jueces a %d defensas.' % (
+                len(plan.assignments), len({item.defence for item in plan.assignments})))
+            return redirect('%s?term=%d' % (reverse('assign_jury'), term.pk))
+    else:
+        form = forms.JuryAssignmentForm(request.GET if 'term' in request.GET else None)
+        if form.is_bound and form.is_valid():
+            plan = assignment.plan_jury(form.cleaned_data['term'])
+            token = signing.dumps([form.cleaned_data['term'].pk, list(plan.versions)], salt=_JURY_PLAN_SALT)
+    context = {
+        'assignment_form': form,
+        'plan': plan,
+        'plan_token': token,
+        'max_judges': Defence.MAX_JUDGES,
+    }
+    return render(request, 'web/defences/jury_assignment.html', context)
+
+
 @method_decorator([login_required, manager_required], name='dispatch')
 class DefenceCreate(SuccessMessageMixin, CreateView):
     model = Defence
@@ -763,109 +833,86 @@ class JuryDelete(DeleteView):
     success_url = reverse_lazy('defence_index')
 
 
-class ProposalNotApprovedPdf(View):
+class ReportPdf(View):
+    """
+    Serve the PDF of ``report`` (see web.exports) if it was already rendered for the current data, otherwise
+    queue it for the export worker and send the user to the page that waits for it.
+    """
+    report = None
+
     def get(self, request, *args, **kwargs):
-        proposal_list = Proposal.objects.all().exclude(proposal_status__name="Aprobada").order_by('student1__id_card_number')
-        context = {
-            "proposal_list": proposal_list,
-        }
-        pdf = render_to_pdf('web/proposal/proposal_not_approved_pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = "ProposalsNotApproved.pdf"
-            content = "inline; filename='%s'" %(filename)
-            download = request.GET.get("download")
-            if download:
-                content = "attachment; filename='%s'" %(filename)
-            response['Content-Disposition'] = content
+        data_key = exports.get_data_key(self.report)
+        # The rendered file only changes with the data, an unchanged report is answered with the data versions
+        # query alone
+        etag = quote_etag('%s%s' % (data_key, '-download' if request.GET.get("download") else ''))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        job = exports.request_export(self.report, data_key)
+        if job.status == ExportJob.DONE:
+            response = _export_file_response(job, request.GET.get("download"))
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
             return response
-        return HttpResponse("Not found")
+        url = reverse('export_job', args=(job.pk,))
+        if request.GET.get("download"):
+            url += '?download=1'
+        return redirect(url)
 
 
-class ProposalPdf(View):
-    def get(self, request, *args, **kwargs):
-        proposal_list = Proposal.objects.all().select_related()
-        context = {
-            "proposal_list": proposal_list,
-        }
-        pdf = render_to_pdf('web/proposal/proposal_pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = "Proposals.pdf"
-            content = "inline; filename='%s'" %(filename)
-            download = request.GET.get("download")
-            if download:
-                content = "attachment; filename='%s'" %(filename)
-            response['Content-Disposition'] = content
-            return response
-        return HttpResponse("Not found")
+class ProposalNotApprovedPdf(ReportPdf):
+    report = 'proposals_not_approved'
 
 
-class PersonsListPdf(View):
-    def get(self, request, *args, **kwargs):
-        person_list = PersonData.objects.all().order_by('id_card_number', 'name')
-        context = {
-            "person_list": person_list,
-        }
-        pdf = render_to_pdf('web/persons/person_list_pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = "Persons_list.pdf"
-            content = "inline; filename='%s'" %(filename)
-            download = request.GET.get("download")
-            if download:
-                content = "attachment; filename='%s'" %(filename)
-            response['Content-Disposition'] = content
-            return response
-        return HttpResponse("Not found")
+class ProposalPdf(ReportPdf):
+    report = 'proposals'
 
 
-class ThesisListPdf(View):
+class PersonsListPdf(ReportPdf):
+    report = 'persons'
 
-    def get(self, request, *args, **kwargs):
-        thesis_list = Thesis.objects.all().order_by('id_card_number', 'name').order_by(
-                'proposal__student1__id_card_number').exclude(
-                code__in=HistoricThesisStatus.objects.filter(status__name='Aprobado').values('thesis__code'))
-        for thesis in thesis_list:
-            thesis = add_full_names(thesis)
 
-        context = {
-            "thesis_list": thesis_list,
-        }
-        pdf = render_to_pdf('web/thesis/thesis_list_pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = "Thesis_list.pdf"
-            content = "inline; filename='%s'" %(filename)
-            download = request.GET.get("download")
-            if download:
-                content = "attachment; filename='%s'" %(filename)
-            response['Content-Disposition'] = content
-            return response
-        return HttpResponse("Not found")
+class ThesisListPdf(ReportPdf):
+    report = 'thesis'
 
 
-class ThesisHistoricListPdf(View):
+class ThesisHistoricListPdf(ReportPdf):
+    report = 'thesis_historic'
 
-    def get(self, request, *args, **kwargs):
-        thesis_list = Thesis.objects.all().order_by('id_card_number', 'name').order_by(
-                'proposal__student1__id_card_number')
 
-        for thesis in thesis_list:
-            thesis = add_full_names(thesis)
+def _export_file_response(job, download=False):
+    filename = exports.REPORTS[job.report].filename
+    response = FileResponse(open(exports.get_file_path(job), 'rb'), content_type='application/pdf')
+    content = "inline; filename='%s'" % (filename)
+    if download:
+        content = "attachment; filename='%s'" % (filename)
+    response['Content-Disposition'] = content
+    return response
+
+
+def export_job(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk)
+    context = {
+        'job': job,
+        'download': request.GET.get("download"),
+    }
+    return render(request, 'web/exports/export_job.html', context)
+
+
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk)
+    data = {
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'error': job.error,
+        'url': reverse('export_job_download', args=(job.pk,)) if job.status == ExportJob.DONE else None,
+    }
+    return JsonResponse(data)
 
-        context = {
-            "thesis_list": thesis_list,
-        }
-        pdf = render_to_pdf('web/thesis/thesis_list_pdf.html', context)
-        if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = "Thesis_list.pdf"
-            content = "inline; filename='%s'" %(filename)
-            download = request.GET.get("download")
-            if download:
-                content = "attachment; filename='%s'" %(filename)
-            response['Content-Disposition'] = content
-            return response
-        return HttpResponse("Not found")
 
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, status=ExportJob.DONE)
+    if not os.path.exists(exports.get_file_path(job)):
+        # The file was cleaned up, render the report again
+        return redirect(reverse('export_job', args=(exports.request_export(job.report).pk,)))
+    return _export_file_response(job, request.GET.get("download"))